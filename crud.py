@@ -1,12 +1,85 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from models import User, Income, Expense, Budget, CategoryType, Category, Settings, MonthlySummary, Currency, Theme, Language, ChartType
+from sqlalchemy import event, inspect, func, select, union, union_all, update, insert, extract, and_, or_, bindparam, table, column, literal_column, literal
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.exc import IntegrityError
+from models import User, Income, Expense, Budget, CategoryType, Category, Settings, MonthlySummary, CategoryDailyRollup, Currency, Theme, Language, ChartType, normalize_category_name, NOTE_SEARCH_TABLES
 from auth import get_password_hash, verify_password, create_access_token
 from datetime import date, datetime
+from decimal import Decimal
+from collections import namedtuple
 import calendar
+from utils.importer import parse_statement
+import base64
+import binascii
+import os
+import re
+import threading
+import time
+
+DUPLICATE_INCOME_ERROR = "⚠️ Đã có khoản thu trong cùng ngày và danh mục này! Nếu bạn muốn sửa, vui lòng vào mục cập nhật."
+DUPLICATE_EXPENSE_ERROR = "⚠️ Đã có khoản chi trong cùng ngày và danh mục này! Nếu bạn muốn sửa, vui lòng vào mục cập nhật."
+
+# Lỗi vi phạm ràng buộc UNIQUE (MySQL: mã 1062, SQLite: "UNIQUE constraint failed")
+def _is_unique_violation(exc: IntegrityError) -> bool:
+    args = getattr(exc.orig, "args", ())
+    return (bool(args) and args[0] == 1062) or "UNIQUE constraint failed" in str(exc.orig)
+
+#---- PHÂN TRANG (KEYSET) ----
+# Danh sách giao dịch sắp theo (date, id) giảm dần; cursor là (date, id) của dòng cuối trang trước,
+# mã hóa base64 để client coi như chuỗi mờ
+TRANSACTION_PAGE_SIZE = 100
+TRANSACTION_PAGE_MAX = 1000
+INVALID_CURSOR_ERROR = "⚠️ Cursor phân trang không hợp lệ."
+
+# Danh sách gộp thu + chi (/transactions) thêm loại giao dịch vào cursor vì id của hai bảng có thể trùng
+def encode_cursor(day: date, id_: int, type_: str = None) -> str:
+    raw = f"{day.isoformat()}|{id_}" + (f"|{type_}" if type_ else "")
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, id_, *type_ = raw.split("|")
+        if len(type_) > 1:
+            return None
+        return date.fromisoformat(day), int(id_), (type_[0] if type_ else None)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
 
-from routers import expense
-
+# Lấy một trang từ query đã lọc; đọc dư một dòng để biết còn trang sau hay không
+def _paginate(query, date_col, id_col, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE):
+    limit = max(1, min(limit, TRANSACTION_PAGE_MAX))
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return {"error": INVALID_CURSOR_ERROR}
+        day, id_, _ = position
+        query = query.filter(or_(date_col < day, and_(date_col == day, id_col < id_)))
+    rows = query.order_by(date_col.desc(), id_col.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, getattr(rows[-1], id_col.key))
+    return {"rows": rows, "next_cursor": next_cursor}
+
+#---- LỌC GIAO DỊCH ----
+# Lọc theo khoảng ngày, tên danh mục và ghi chú (chứa chuỗi, không phân biệt hoa thường) ngay trong SQL.
+# query phải đã JOIN bảng categories (như _income_rows/_expense_rows)
+def _filter_transactions(query, model, start: date = None, end: date = None, category: str = None, note: str = None):
+    if start:
+        query = query.filter(model.date >= start)
+    if end:
+        query = query.filter(model.date <= end)
+    if category and category.strip():
+        query = query.filter(Category.normalized_name.contains(normalize_category_name(category), autoescape=True))
+    if note and note.strip():
+        query = query.filter(model.note.icontains(note.strip(), autoescape=True))
+    return query
+
+def _invalid_range(start: date = None, end: date = None):
+    if start and end and start > end:
+        return {"error": "⚠️ Ngày bắt đầu phải trước hoặc bằng ngày kết thúc."}
+    return None
 
 #---- USER ----
 # Lọc người dùng theo tên
@@ -33,14 +106,20 @@ def create_user(db: Session, username: str, email: str, password: str, confirm_p
 
     if password != confirm_password:
         return {"error": "Mật khẩu xác nhận không khớp."}
-    if get_user_by_username(db, username):
-        return {"error": "Username đã tồn tại."}
-    if get_user_by_email(db, email):
-        return {"error": "Email đã được đăng ký."}
 
+    # Ràng buộc UNIQUE của username/email trong CSDL thay cho 2 câu SELECT kiểm tra trước
     new_user = User(username=username, email=email, password_hash=get_password_hash(password))
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not _is_unique_violation(e):
+            raise
+        # Xác định cột bị trùng bằng một câu SELECT (không dựa vào nội dung thông báo lỗi của driver)
+        if get_user_by_username(db, username) is not None:
+            return {"error": "Username đã tồn tại."}
+        return {"error": "Email đã được đăng ký."}
     db.refresh(new_user)
     return new_user
 
@@ -97,39 +176,132 @@ def delete_user(db: Session, user_id: int):
     db.commit()
     return user
 
+# Phiên bản dữ liệu của user (0 nếu không tồn tại): đổi sau mỗi lần ghi nên dùng làm ETag
+def get_data_version(db: Session, user_id: int) -> int:
+    return db.query(User.data_version).filter(User.user_id == user_id).scalar() or 0
+
+#--------------------------
+#---- CATEGORY ----
+# Cache danh mục trong tiến trình: (normalized_name, type) -> (category_id, name) và danh sách theo loại.
+# Danh mục không bị sửa/xóa qua API nên id đã cache luôn đúng; TTL chỉ giới hạn thời gian danh sách
+# thiếu danh mục do worker khác vừa tạo. Danh mục mới tạo chỉ vào cache sau khi giao dịch commit
+CATEGORY_CACHE_TTL = float(os.getenv("CATEGORY_CACHE_TTL_SECONDS", "300"))
+CategoryRef = namedtuple("CategoryRef", "category_id name")
+
+_category_refs = {}
+_category_lists = {}
+_category_cache_lock = threading.Lock()
+
+def _cached_category(normalized_name: str, type_: CategoryType):
+    with _category_cache_lock:
+        entry = _category_refs.get((normalized_name, type_))
+    if entry is None or entry[1] < time.monotonic():
+        return None
+    return entry[0]
+
+def _cache_categories(refs, type_: CategoryType):
+    expires = time.monotonic() + CATEGORY_CACHE_TTL
+    with _category_cache_lock:
+        for normalized_name, ref in refs.items():
+            _category_refs[(normalized_name, type_)] = (ref, expires)
+
+# Danh mục vừa INSERT trong phiên: giữ trong session.info đến khi commit
+def _stage_categories(db: Session, refs, type_: CategoryType):
+    db.info.setdefault("new_categories", []).append((refs, type_))
+
+# Bỏ qua savepoint (begin_nested): chỉ commit/rollback của giao dịch ngoài cùng mới quyết định danh mục còn hay mất
+@event.listens_for(Session, "after_commit")
+def _publish_new_categories(session):
+    if session.in_nested_transaction():
+        return
+    staged = session.info.pop("new_categories", ())
+    for refs, type_ in staged:
+        _cache_categories(refs, type_)
+    if staged:
+        with _category_cache_lock:
+            _category_lists.clear()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_new_categories(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("new_categories", None)
+
+# locking=True: đọc có khóa (FOR SHARE) để thấy bản ghi request khác vừa commit; SELECT thường trên MySQL
+# (REPEATABLE READ) chỉ thấy snapshot từ đầu giao dịch
+def get_category_by_name(db: Session, category_name: str, type_: CategoryType, locking: bool = False):
+    query = db.query(Category).filter(
+        Category.normalized_name == normalize_category_name(category_name),
+        Category.type == type_
+    )
+    if locking:
+        query = query.with_for_update(read=True)
+    return query.first()
+
+# Lấy danh mục theo tên (không phân biệt hoa thường/khoảng trắng), chưa có thì tạo mới trong savepoint
+# (commit cùng bản ghi thu/chi). Trả về CategoryRef, thường lấy thẳng từ cache không cần truy vấn
+def get_or_create_category(db: Session, category_name: str, type_: CategoryType):
+    normalized_name = normalize_category_name(category_name)
+    ref = _cached_category(normalized_name, type_)
+    if ref:
+        return ref
+    category = get_category_by_name(db, category_name, type_)
+    if category:
+        ref = CategoryRef(category.category_id, category.name)
+        _cache_categories({normalized_name: ref}, type_)
+        return ref
+    try:
+        with db.begin_nested():
+            category = Category(
+                name=category_name.strip(),
+                type=type_,
+                description="Danh mục tự thêm",
+            )
+            db.add(category)
+    except IntegrityError as e:
+        # Request khác vừa tạo cùng danh mục -> dùng bản ghi đó
+        if not _is_unique_violation(e):
+            raise
+        category = get_category_by_name(db, category_name, type_, locking=True)
+        if category is None:
+            raise
+        ref = CategoryRef(category.category_id, category.name)
+        _cache_categories({normalized_name: ref}, type_)
+        return ref
+    ref = CategoryRef(category.category_id, category.name)
+    _stage_categories(db, {normalized_name: ref}, type_)
+    return ref
+
+# Danh sách danh mục (tùy chọn theo loại) cho client, lấy từ cache nếu còn hạn
+def get_categories(db: Session, type_: CategoryType = None):
+    type_ = CategoryType(type_) if type_ else None
+    now = time.monotonic()
+    with _category_cache_lock:
+        entry = _category_lists.get(type_)
+    if entry and entry[1] >= now:
+        return entry[0]
+
+    query = db.query(Category.category_id, Category.name, Category.normalized_name, Category.type)
+    if type_:
+        query = query.filter(Category.type == type_)
+    rows = query.order_by(Category.type, Category.name).all()
+    for t in CategoryType:
+        _cache_categories({r.normalized_name: CategoryRef(r.category_id, r.name) for r in rows if r.type == t}, t)
+
+    kq = [{"category_id": r.category_id, "name": r.name, "type": r.type.value} for r in rows]
+    with _category_cache_lock:
+        _category_lists[type_] = (kq, now + CATEGORY_CACHE_TTL)
+    return kq
+
 #--------------------------
 #---- INCOME ----
 # Lưu(tạo) khoản thu trg csdl
 def create_income(db: Session, user_id: int, category_name: str,  amount: float, date_: date, note: str = None):
     if not category_name or amount <=0:
         return {"error": "❌ Tên danh mục và số tiền phải hợp lệ."}
-    category = db.query(Category).filter(
-        func.lower(Category.name) == category_name.lower(),
-        Category.type == CategoryType.income
-    ).first()          # lọc xem để ktra danh mục đã tồn tại chưa
-
-    # Nếu chưa thì tạo mới
-    if not category:
-        category = Category(
-            name=category_name,
-            type=CategoryType.income,
-            description="Danh mục tự thêm",
-        )
-        db.add(category)
-        db.commit()
-        db.refresh(category)
-    existing_income = db.query(Income).filter(
-        Income.user_id == user_id,
-        Income.category_id == category.category_id,
-        Income.date == date_
-    ).first()
+    category = get_or_create_category(db, category_name, CategoryType.income)
 
-    # Ktra xem khoản thu này đã đc tạo trc đó chưa
-    if existing_income:
-        return {
-            "error": "⚠️ Đã có khoản thu trong cùng ngày và danh mục này! Nếu bạn muốn sửa, vui lòng vào mục cập nhật."}
-
-    # Nếu chưa thì tạo mới
+    # Chỉ INSERT một lần, ràng buộc UNIQUE (user_id, category_id, date) chặn khoản thu trùng ngày/danh mục
     income = Income(
         user_id=user_id,
         category_id=category.category_id,
@@ -138,9 +310,16 @@ def create_income(db: Session, user_id: int, category_name: str,  amount: float,
         note=note
     )
     db.add(income)
-    db.commit()
-    db.refresh(income)
-    return {
+    try:
+        db.flush()
+    except IntegrityError as e:
+        db.rollback()
+        if not _is_unique_violation(e):
+            raise
+        return {"error": DUPLICATE_INCOME_ERROR}
+    _apply_summary_delta(db, user_id, income.date, income=income.amount)
+    _apply_rollup_delta(db, user_id, CategoryType.income, category.category_id, income.date, income.amount, 1)
+    kq = {
         "message": "✅ Đã thêm khoản thu thành công!",
         "income_id": income.income_id,
         "category_id": category.category_id,
@@ -149,81 +328,77 @@ def create_income(db: Session, user_id: int, category_name: str,  amount: float,
         "date": income.date,
         "note": income.note
     }
+    db.commit()
+    return kq
 
-def get_incomes_by_user(db: Session, user_id: int):
-
-    incomes = db.query(Income).filter(Income.user_id == user_id).all()
-    return [
-        {
-            "income_id": i.income_id,
-            "username": i.user.username,
-            "category_name": i.category.name,
-            "amount": float(i.amount),
-            "date": i.date,
-            "note": i.note,
-        }
-        for i in incomes
-    ]
+# Lấy kèm username/tên danh mục bằng JOIN trong cùng một truy vấn
+# (tránh lazy load i.user/i.category cho từng dòng -> N+1 truy vấn)
+def _income_rows(db: Session):
+    return (
+        db.query(
+            Income.income_id,
+            User.username,
+            Category.name.label("category_name"),
+            Income.amount,
+            Income.date,
+            Income.note,
+        )
+        .join(User, Income.user_id == User.user_id)
+        .outerjoin(Category, Income.category_id == Category.category_id)
+    )
 
-def get_incomes_by_month(db: Session, user_id: int, year: int, month: int):
+def _income_to_dict(i):
+    return {
+        "income_id": i.income_id,
+        "username": i.username,
+        "category_name": i.category_name,
+        "amount": float(i.amount),
+        "date": i.date,
+        "note": i.note,
+    }
+
+# Trả về {"items": [...], "next_cursor": ...}; next_cursor = None khi đã hết dữ liệu
+def _income_page(query, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE):
+    page = _paginate(query, Income.date, Income.income_id, cursor, limit)
+    if "error" in page:
+        return page
+    return {"items": [_income_to_dict(i) for i in page["rows"]], "next_cursor": page["next_cursor"]}
+
+def get_incomes_by_user(db: Session, user_id: int, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE, **filters):
+    error = _invalid_range(filters.get("start"), filters.get("end"))
+    if error:
+        return error
+    query = _filter_transactions(_income_rows(db).filter(Income.user_id == user_id), Income, **filters)
+    return _income_page(query, cursor, limit)
+
+def get_incomes_by_month(db: Session, user_id: int, year: int, month: int, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE, **filters):
     last_day = calendar.monthrange(year, month)[1]
     start_date = date(year, month, 1)
     end_date = date(year, month, last_day)
 
-    incomes = db.query(Income).filter(
+    query = _income_rows(db).filter(
         Income.user_id == user_id,
         Income.date >= start_date,
         Income.date <= end_date,
-    ).order_by(Income.date.desc()).all()
-    return [
-        {
-            "income_id": i.income_id,
-            "username": i.user.username,
-            "category_name": i.category.name,
-            "amount": float(i.amount),
-            "date": i.date,
-            "note": i.note,
-        }
-        for i in incomes
-    ]
+    )
+    return _income_page(_filter_transactions(query, Income, **filters), cursor, limit)
 
-def get_incomes_by_year(db: Session, user_id: int, year: int):
+def get_incomes_by_year(db: Session, user_id: int, year: int, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE, **filters):
     start = date(year, 1, 1)
     end = date(year, 12, 31)
-    incomes = db.query(Income).filter(
+    query = _income_rows(db).filter(
         Income.user_id == user_id,
         Income.date >= start,
         Income.date <= end,
-    ).order_by(Income.date.desc()).all()
-    return [
-        {
-            "income_id": i.income_id,
-            "username": i.user.username,
-            "category_name": i.category.name,
-            "amount": float(i.amount),
-            "date": i.date,
-            "note": i.note,
-        }
-        for i in incomes
-    ]
+    )
+    return _income_page(_filter_transactions(query, Income, **filters), cursor, limit)
 
 def update_income(db: Session, income_id: int, category_name: str, amount: float = None, date_: date = None, note: str = None):
     income = db.query(Income).filter(Income.income_id == income_id).first()
     if not income:
         return None
-    category = db.query(Category).filter(
-        func.lower(Category.name) == category_name.lower(),
-        Category.type == CategoryType.income).first()
-
-    if not category:
-        category = Category(
-            name=category_name,
-            type=CategoryType.income,
-            description="Danh mục tự thêm",
-        )
-        db.add(category)
-        db.commit()
-        db.refresh(category)
+    category = get_or_create_category(db, category_name, CategoryType.income)
+    old_date, old_amount, old_category_id = income.date, income.amount, income.category_id
 
     income.category_id = category.category_id
     if amount is not None:
@@ -232,8 +407,21 @@ def update_income(db: Session, income_id: int, category_name: str, amount: float
         income.date = date_
     if note is not None:
         income.note = note
+    # Chuyển số tiền cũ ra khỏi tháng cũ, cộng số tiền mới vào tháng mới (có thể là cùng một tháng)
+    if (old_date, old_amount) != (income.date, income.amount):
+        _apply_summary_delta(db, income.user_id, old_date, income=-old_amount)
+        _apply_summary_delta(db, income.user_id, income.date, income=income.amount)
+    if (old_category_id, old_date, old_amount) != (income.category_id, income.date, income.amount):
+        _apply_rollup_delta(db, income.user_id, CategoryType.income, old_category_id, old_date, -old_amount, -1)
+        _apply_rollup_delta(db, income.user_id, CategoryType.income, income.category_id, income.date, income.amount, 1)
 
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not _is_unique_violation(e):
+            raise
+        return {"error": DUPLICATE_INCOME_ERROR}
     db.refresh(income)
 
     return {
@@ -250,6 +438,8 @@ def delete_income(db: Session, income_id: int):
     income = db.query(Income).filter(Income.income_id == income_id).first()
     if not income:
         return None
+    _apply_summary_delta(db, income.user_id, income.date, income=-income.amount)
+    _apply_rollup_delta(db, income.user_id, CategoryType.income, income.category_id, income.date, -income.amount, -1)
     db.delete(income)
     db.commit()
     return income
@@ -259,29 +449,8 @@ def delete_income(db: Session, income_id: int):
 def create_expense(db: Session, user_id: int, category_name: str, amount: float, date_: date, note: str = None):
     if not category_name or amount <=0:
         return {"error": "Tên danh mục và số tiền phải hợp lệ."}
-    category = db.query(Category).filter(
-        func.lower(Category.name) == category_name.lower(),
-        Category.type == CategoryType.expense
-    ).first()
-
-    if not category:
-        category = Category(
-            name=category_name,
-            type=CategoryType.expense,
-            description="Danh mục tự thêm",
-        )
-        db.add(category)
-        db.commit()
-        db.refresh(category)
-    existing_expense = db.query(Expense).filter(
-        Expense.user_id == user_id,
-        Expense.category_id == category.category_id,
-        Expense.date == date_
-    ).first()
+    category = get_or_create_category(db, category_name, CategoryType.expense)
 
-    if existing_expense:
-        return {
-            "error": "⚠️ Đã có khoản chi trong cùng ngày và danh mục này! Nếu bạn muốn sửa, vui lòng vào mục cập nhật."}
     expense = Expense(
         user_id=user_id,
         category_id=category.category_id,
@@ -290,94 +459,95 @@ def create_expense(db: Session, user_id: int, category_name: str, amount: float,
         note=note
     )
     db.add(expense)
-    db.commit()
-    db.refresh(expense)
-    return {
+    try:
+        db.flush()
+    except IntegrityError as e:
+        db.rollback()
+        if not _is_unique_violation(e):
+            raise
+        return {"error": DUPLICATE_EXPENSE_ERROR}
+    _apply_summary_delta(db, user_id, expense.date, expense=expense.amount)
+    _apply_rollup_delta(db, user_id, CategoryType.expense, category.category_id, expense.date, expense.amount, 1)
+    has_budget = _apply_budget_delta(db, user_id, category.category_id, expense.date, expense.amount)
+    kq = {
         "message": "💰 Đã thêm khoản chi thành công.",
         "expense_id": expense.expense_id,
         "category_id": category.category_id,
         "category_name": category_name,
         "amount": float(expense.amount),
         "date": expense.date,
-        "note": expense.note
+        "note": expense.note,
+        "budget_status": _budget_status_after_write(db, user_id, category, expense.date, has_budget),
     }
+    db.commit()
+    return kq
 
-def get_expenses_by_user(db: Session, user_id: int):
-    expenses = db.query(Expense).filter(Expense.user_id == user_id).all()
-    return [
-        {
-            "expense_id": e.expense_id,
-            "username": e.user.username,
-            "category_name": e.category.name,
-            "amount": float(e.amount),
-            "date": e.date,
-            "note": e.note,
-        }
-        for e in expenses
-    ]
+def _expense_rows(db: Session):
+    return (
+        db.query(
+            Expense.expense_id,
+            User.username,
+            Category.name.label("category_name"),
+            Expense.amount,
+            Expense.date,
+            Expense.note,
+        )
+        .join(User, Expense.user_id == User.user_id)
+        .outerjoin(Category, Expense.category_id == Category.category_id)
+    )
 
-def get_expenses_by_month(db: Session, user_id: int, year: int, month: int):
+def _expense_to_dict(e):
+    return {
+        "expense_id": e.expense_id,
+        "username": e.username,
+        "category_name": e.category_name,
+        "amount": float(e.amount),
+        "date": e.date,
+        "note": e.note,
+    }
+
+def _expense_page(query, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE):
+    page = _paginate(query, Expense.date, Expense.expense_id, cursor, limit)
+    if "error" in page:
+        return page
+    return {"items": [_expense_to_dict(e) for e in page["rows"]], "next_cursor": page["next_cursor"]}
+
+def get_expenses_by_user(db: Session, user_id: int, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE, **filters):
+    error = _invalid_range(filters.get("start"), filters.get("end"))
+    if error:
+        return error
+    query = _filter_transactions(_expense_rows(db).filter(Expense.user_id == user_id), Expense, **filters)
+    return _expense_page(query, cursor, limit)
+
+def get_expenses_by_month(db: Session, user_id: int, year: int, month: int, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE, **filters):
     last_day = calendar.monthrange(year, month)[1]
     start_date = date(year, month, 1)
     end_date = date(year, month, last_day)
 
-    expenses = db.query(Expense).filter(
+    query = _expense_rows(db).filter(
         Expense.user_id == user_id,
         Expense.date >= start_date,
         Expense.date <= end_date,
-    ).order_by(Expense.date.desc()).all()
-
-    return [
-        {
-            "expense_id": e.expense_id,
-            "username": e.user.username,
-            "category_name": e.category.name,
-            "amount": float(e.amount),
-            "date": e.date,
-            "note": e.note,
-        }
-        for e in expenses
-    ]
+    )
+    return _expense_page(_filter_transactions(query, Expense, **filters), cursor, limit)
 
-def get_expenses_by_year(db: Session, user_id: int, year: int):
+def get_expenses_by_year(db: Session, user_id: int, year: int, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE, **filters):
     start = date(year, 1, 1)
     end = date(year, 12, 31)
-    expenses = db.query(Expense).filter(
+    query = _expense_rows(db).filter(
         Expense.user_id == user_id,
         Expense.date >= start,
         Expense.date <= end,
-    ).order_by(Expense.date.desc()).all()
-
-    return [
-        {
-            "expense_id": e.expense_id,
-            "username": e.user.username,
-            "category_name": e.category.name,
-            "amount": float(e.amount),
-            "date": e.date,
-            "note": e.note,
-        }
-        for e in expenses
-    ]
+    )
+    return _expense_page(_filter_transactions(query, Expense, **filters), cursor, limit)
 
 def update_expense(db: Session, expense_id: int, category_name: str, amount: float = None, date_: date = None, note: str = None):
     expense = db.query(Expense).filter(Expense.expense_id == expense_id).first()
     if not expense:
         return None
 
-    category = db.query(Category).filter(
-        func.lower(Category.name) == category_name.lower(),
-        Category.type == CategoryType.expense).first()
-
-    if not category:
-        category = Category(
-            name=category_name,
-            type=CategoryType.income,
-            description="Danh mục tự thêm",
-        )
-        db.add(category)
-        db.commit()
-        db.refresh(category)
+    category = get_or_create_category(db, category_name, CategoryType.expense)
+    old_date, old_amount, old_category_id = expense.date, expense.amount, expense.category_id
 
     expense.category_id = category.category_id
 
@@ -389,8 +559,26 @@ def update_expense(db: Session, expense_id: int, category_name: str, amount: flo
         expense.date = date_
     if note is not None:
         expense.note = note
+    if (old_date, old_amount) != (expense.date, expense.amount):
+        _apply_summary_delta(db, expense.user_id, old_date, expense=-old_amount)
+        _apply_summary_delta(db, expense.user_id, expense.date, expense=expense.amount)
+    # Rollup: chuyển số tiền cũ ra khỏi (danh mục, ngày) cũ và cộng số tiền mới vào (danh mục, ngày) mới;
+    # ngân sách: tương tự theo (danh mục, tháng)
+    if (old_category_id, old_date, old_amount) != (expense.category_id, expense.date, expense.amount):
+        _apply_rollup_delta(db, expense.user_id, CategoryType.expense, old_category_id, old_date, -old_amount, -1)
+        _apply_rollup_delta(db, expense.user_id, CategoryType.expense, expense.category_id, expense.date, expense.amount, 1)
+    if (old_category_id, old_date.replace(day=1), old_amount) != (expense.category_id, expense.date.replace(day=1), expense.amount):
+        _apply_budget_delta(db, expense.user_id, old_category_id, old_date, -old_amount)
+        _apply_budget_delta(db, expense.user_id, expense.category_id, expense.date, expense.amount)
+    budget_status = _budget_status_after_write(db, expense.user_id, category, expense.date, has_budget=True)
 
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not _is_unique_violation(e):
+            raise
+        return {"error": DUPLICATE_EXPENSE_ERROR}
     db.refresh(expense)
 
     return {
@@ -400,22 +588,357 @@ def update_expense(db: Session, expense_id: int, category_name: str, amount: flo
         "category_name": category.name,
         "amount": float(expense.amount),
         "date": expense.date,
-        "note": expense.note
+        "note": expense.note,
+        "budget_status": budget_status,
     }
 
 def delete_expense(db: Session, expense_id: int):
     expense = db.query(Expense).filter(Expense.expense_id == expense_id).first()
     if not expense:
         return None
+    _apply_summary_delta(db, expense.user_id, expense.date, expense=-expense.amount)
+    _apply_rollup_delta(db, expense.user_id, CategoryType.expense, expense.category_id, expense.date, -expense.amount, -1)
+    _apply_budget_delta(db, expense.user_id, expense.category_id, expense.date, -expense.amount)
     db.delete(expense)
     db.commit()
     return expense
 
+#-----------------------
+#---- THU + CHI (DANH SÁCH GỘP) ----
+TRANSACTION_TYPES = ("income", "expense")
+
+def _transaction_rows(model, id_col, type_: str):
+    return (
+        select(
+            literal(type_).label("type"),
+            id_col.label("id"),
+            User.username,
+            Category.name.label("category_name"),
+            model.amount,
+            model.date,
+            model.note,
+        )
+        .join(User, model.user_id == User.user_id)
+        .outerjoin(Category, model.category_id == Category.category_id)
+    )
+
+# Thu và chi của user gộp bằng một câu UNION ALL, sắp theo (date, type, id) giảm dần.
+# Điều kiện cursor và LIMIT được đẩy vào từng nhánh để mỗi nhánh chỉ đọc một trang trên ix_<bảng>_user_date
+def get_transactions_by_user(db: Session, user_id: int, cursor: str = None, limit: int = TRANSACTION_PAGE_SIZE,
+                             type_: CategoryType = None, **filters):
+    error = _invalid_range(filters.get("start"), filters.get("end"))
+    if error:
+        return error
+    limit = max(1, min(limit, TRANSACTION_PAGE_MAX))
+    position = None
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None or position[2] not in TRANSACTION_TYPES:
+            return {"error": INVALID_CURSOR_ERROR}
+
+    models = {"income": (Income, Income.income_id), "expense": (Expense, Expense.expense_id)}
+    types = [CategoryType(type_).value] if type_ else list(models)
+    branches = []
+    for t in types:
+        model, id_col = models[t]
+        stmt = _filter_transactions(_transaction_rows(model, id_col, t).where(model.user_id == user_id), model, **filters)
+        if position:
+            day, id_, cursor_type = position
+            if t < cursor_type:         # cùng ngày, loại đứng sau trong thứ tự giảm dần -> lấy cả ngày đó
+                stmt = stmt.where(model.date <= day)
+            elif t == cursor_type:
+                stmt = stmt.where(or_(model.date < day, and_(model.date == day, id_col < id_)))
+            else:
+                stmt = stmt.where(model.date < day)
+        branches.append(select(stmt.order_by(model.date.desc(), id_col.desc()).limit(limit + 1).subquery()))
+
+    merged = union_all(*branches).subquery() if len(branches) > 1 else branches[0].subquery()
+    rows = db.execute(
+        select(merged).order_by(merged.c.date.desc(), merged.c.type.desc(), merged.c.id.desc()).limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id, rows[-1].type)
+    items = [{
+        "type": r.type,
+        "id": r.id,
+        "username": r.username,
+        "category_name": r.category_name,
+        "amount": float(r.amount),
+        "date": r.date,
+        "note": r.note,
+    } for r in rows]
+    return {"items": items, "next_cursor": next_cursor}
+
+#-----------------------
+#---- BATCH (THU/CHI) ----
+BATCH_MAX_ITEMS = 1000
+
+# Lấy/tạo nhiều danh mục cùng lúc: tên có trong cache không cần truy vấn, một SELECT cho các tên còn lại,
+# INSERT một lần cho các tên chưa có.
+# Trả về {normalized_name: category_id}
+def get_or_create_categories(db: Session, category_names, type_: CategoryType):
+    wanted = {}
+    for name in category_names:
+        wanted.setdefault(normalize_category_name(name), name.strip())
+
+    # locking=True sau khi tranh chấp: thấy cả danh mục request khác vừa commit (xem get_category_by_name)
+    def lookup(normalized_names, locking=False):
+        query = db.query(Category.normalized_name, Category.category_id, Category.name).filter(
+            Category.normalized_name.in_(normalized_names),
+            Category.type == type_,
+        )
+        if locking:
+            query = query.with_for_update(read=True)
+        rows = query.all()
+        return {r.normalized_name: CategoryRef(r.category_id, r.name) for r in rows}
+
+    found = {}
+    for normalized in wanted:
+        ref = _cached_category(normalized, type_)
+        if ref:
+            found[normalized] = ref
+    pending = [normalized for normalized in wanted if normalized not in found]
+    if pending:
+        existing = lookup(pending)
+        _cache_categories(existing, type_)
+        found.update(existing)
+    missing = [normalized for normalized in pending if normalized not in found]
+    if not missing:
+        return {normalized: ref.category_id for normalized, ref in found.items()}
+    conflict = False
+    try:
+        with db.begin_nested():
+            db.execute(insert(Category), [
+                {"name": wanted[normalized], "normalized_name": normalized, "type": type_,
+                 "description": "Danh mục tự thêm"}
+                for normalized in missing
+            ])
+    except IntegrityError as e:
+        # Request khác vừa tạo một phần các danh mục này -> tạo lần lượt phần còn thiếu
+        if not _is_unique_violation(e):
+            raise
+        conflict = True
+        for normalized in missing:
+            if not lookup([normalized], locking=True):
+                with db.begin_nested():
+                    db.add(Category(name=wanted[normalized], type=type_, description="Danh mục tự thêm"))
+    created = lookup(missing, locking=conflict)
+    _stage_categories(db, created, type_)
+    found.update(created)
+    return {normalized: ref.category_id for normalized, ref in found.items()}
+
+# Thêm nhiều khoản thu/chi (chưa commit): kiểm tra trùng import_hash (dòng sao kê) và trùng (user, danh mục, ngày)
+# (chỉ khoản nhập tay, sao kê có thể có nhiều khoản cùng ngày) mỗi loại bằng một truy vấn, INSERT hàng loạt một câu lệnh.
+# Trả về trạng thái từng phần tử: "created", "invalid", "duplicate" (trùng ngày/danh mục) hoặc "imported" (đã nhập trước đó)
+# kèm id bản ghi mới (chỉ khi fetch_ids=True) và category_id
+def _insert_transactions(db: Session, model, id_col, type_: CategoryType, user_id: int, items,
+                         fetch_ids: bool = True, retry: bool = True):
+    statuses = [("invalid", None, None)] * len(items)
+    valid = [
+        i for i, item in enumerate(items)
+        if item.category_name and item.category_name.strip() and item.amount > 0
+    ]
+
+    hashes = {i: getattr(items[i], "import_hash", None) or "" for i in valid}
+    imported = set()
+    if any(hashes.values()):
+        days = [items[i].date for i in valid if hashes[i]]
+        imported = {h for (h,) in db.query(model.import_hash).filter(
+            model.user_id == user_id,
+            model.date >= min(days),
+            model.date <= max(days),
+            model.import_hash.in_({h for h in hashes.values() if h}),
+        ).all()}
+    candidates = []
+    for i in valid:
+        if hashes[i] and hashes[i] in imported:
+            statuses[i] = ("imported", None, None)
+            continue
+        if hashes[i]:
+            imported.add(hashes[i])     # dòng lặp lại trong cùng một lô
+        candidates.append(i)
+
+    normalized = {}
+    for i in candidates:
+        name = items[i].category_name
+        if name not in normalized:
+            normalized[name] = normalize_category_name(name)
+    categories = get_or_create_categories(db, list(normalized), type_) if candidates else {}
+    keys = {i: (categories[normalized[items[i].category_name]], items[i].date) for i in candidates}
+
+    manual = {i: keys[i] for i in candidates if not hashes[i]}
+    existing = set()
+    if manual:
+        existing = set(db.query(model.category_id, model.date).filter(
+            model.user_id == user_id,
+            model.import_hash == "",
+            model.category_id.in_({c for c, _ in manual.values()}),
+            model.date.in_({d for _, d in manual.values()}),
+        ).all())
+
+    to_insert = []
+    for i in candidates:
+        if hashes[i]:
+            to_insert.append(i)
+            continue
+        if keys[i] in existing:
+            statuses[i] = ("duplicate", None, keys[i][0])
+            continue
+        existing.add(keys[i])       # trùng ngay trong cùng một lô
+        to_insert.append(i)
+
+    if not to_insert:
+        return statuses
+    try:
+        with db.begin_nested():
+            db.execute(insert(model.__table__), [
+                {"user_id": user_id, "category_id": keys[i][0], "amount": items[i].amount,
+                 "date": items[i].date, "note": items[i].note, "import_hash": hashes[i]}
+                for i in to_insert
+            ])
+    except IntegrityError as e:
+        # Request khác vừa thêm trùng sau bước kiểm tra -> chạy lại một lần để báo lỗi đúng phần tử
+        if not _is_unique_violation(e) or not retry:
+            raise
+        db.rollback()
+        return _insert_transactions(db, model, id_col, type_, user_id, items, fetch_ids, retry=False)
+
+    inserted = {}
+    if fetch_ids:
+        inserted = dict(
+            ((c, d, h), id_) for id_, c, d, h in db.query(id_col, model.category_id, model.date, model.import_hash).filter(
+                model.user_id == user_id,
+                model.category_id.in_({keys[i][0] for i in to_insert}),
+                model.date.in_({keys[i][1] for i in to_insert}),
+            ).all()
+        )
+    deltas, budget_deltas, rollup_deltas, counts = {}, {}, {}, {}
+    for i in to_insert:
+        month_start = items[i].date.replace(day=1)
+        amount = Decimal(str(items[i].amount))
+        deltas[month_start] = deltas.get(month_start, 0) + amount
+        budget_key = (keys[i][0], month_start)
+        budget_deltas[budget_key] = budget_deltas.get(budget_key, 0) + amount
+        rollup_deltas[keys[i]] = rollup_deltas.get(keys[i], 0) + amount
+        counts[keys[i]] = counts.get(keys[i], 0) + 1
+        statuses[i] = ("created", inserted.get(keys[i] + (hashes[i],)), keys[i][0])
+    _apply_summary_deltas(db, user_id, type_.value, deltas)
+    _apply_rollup_deltas(db, user_id, type_, rollup_deltas, counts)
+    if type_ == CategoryType.expense:
+        _apply_budget_deltas(db, user_id, budget_deltas)
+    # INSERT hàng loạt không đi qua flush của ORM nên tự ghi nhận user vừa ghi (read-your-writes)
+    db.info.setdefault("written_user_ids", set()).add(user_id)
+    return statuses
+
+# Thêm nhiều khoản thu/chi trong một giao dịch, kết quả báo thành công/thất bại cho từng phần tử
+def _create_transactions_batch(db: Session, model, id_col, type_: CategoryType, user_id: int, items,
+                               invalid_error: str, duplicate_error: str):
+    if len(items) > BATCH_MAX_ITEMS:
+        return {"error": f"⚠️ Mỗi lần chỉ được thêm tối đa {BATCH_MAX_ITEMS} giao dịch."}
+
+    statuses = _insert_transactions(db, model, id_col, type_, user_id, items)
+    db.commit()
+
+    results = []
+    for index, (status, id_, category_id) in enumerate(statuses):
+        if status != "created":
+            results.append({"index": index, "ok": False,
+                            "error": invalid_error if status == "invalid" else duplicate_error})
+            continue
+        item = items[index]
+        results.append({
+            "index": index,
+            "ok": True,
+            id_col.key: id_,
+            "category_id": category_id,
+            "category_name": item.category_name,
+            "amount": float(item.amount),
+            "date": item.date,
+            "note": item.note,
+        })
+    created = sum(1 for r in results if r["ok"])
+    return {"created": created, "failed": len(items) - created, "results": results}
+
+def create_incomes_batch(db: Session, user_id: int, items):
+    kq = _create_transactions_batch(db, Income, Income.income_id, CategoryType.income, user_id, items,
+                                    "❌ Tên danh mục và số tiền phải hợp lệ.", DUPLICATE_INCOME_ERROR)
+    if "error" not in kq:
+        kq["message"] = f"✅ Đã thêm {kq['created']}/{len(items)} khoản thu."
+    return kq
+
+def create_expenses_batch(db: Session, user_id: int, items):
+    kq = _create_transactions_batch(db, Expense, Expense.expense_id, CategoryType.expense, user_id, items,
+                                    "Tên danh mục và số tiền phải hợp lệ.", DUPLICATE_EXPENSE_ERROR)
+    if "error" not in kq:
+        kq["message"] = f"💰 Đã thêm {kq['created']}/{len(items)} khoản chi."
+    return kq
+
+#-----------------------
+#---- NHẬP SAO KÊ ----
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_MAX_ERRORS = 100
+IMPORT_MESSAGES = {
+    "duplicate": "Trùng khoản đã có trong cùng ngày và danh mục, không nhập.",
+    "invalid": "Tên danh mục và số tiền phải hợp lệ.",
+}
+
+# Nhập sao kê theo từng khối IMPORT_CHUNK_SIZE dòng, mỗi khối một giao dịch (commit riêng) nên bộ nhớ
+# không phụ thuộc kích thước file; dòng đã nhập trước đó (cùng import_hash) được bỏ qua
+def import_statement(db: Session, user_id: int, stream, fmt: str):
+    report = {"created_incomes": 0, "created_expenses": 0, "already_imported": 0,
+              "duplicates": 0, "invalid": 0, "errors": []}
+
+    def add_error(line, error):
+        if len(report["errors"]) < IMPORT_MAX_ERRORS:
+            report["errors"].append({"line": line, "error": error})
+
+    def flush(chunk):
+        for type_, model, id_col, counter in (
+            ("income", Income, Income.income_id, "created_incomes"),
+            ("expense", Expense, Expense.expense_id, "created_expenses"),
+        ):
+            rows = [r for r in chunk if r.type == type_]
+            if not rows:
+                continue
+            statuses = _insert_transactions(db, model, id_col, CategoryType(type_), user_id, rows, fetch_ids=False)
+            for row, (status, _, _) in zip(rows, statuses):
+                if status == "created":
+                    report[counter] += 1
+                elif status == "imported":
+                    report["already_imported"] += 1
+                else:
+                    report["duplicates" if status == "duplicate" else "invalid"] += 1
+                    add_error(row.line, IMPORT_MESSAGES[status])
+            # commit từng loại: nếu _insert_transactions phải rollback để thử lại thì không mất phần đã đếm
+            db.commit()
+
+    chunk = []
+    for row in parse_statement(stream, fmt):
+        if row.error:
+            report["invalid"] += 1
+            add_error(row.line, row.error)
+            continue
+        chunk.append(row)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    created = report["created_incomes"] + report["created_expenses"]
+    report["message"] = (
+        f"✅ Đã nhập {created} giao dịch ({report['created_incomes']} khoản thu, {report['created_expenses']} khoản chi), "
+        f"bỏ qua {report['already_imported']} dòng đã nhập trước đó."
+    )
+    return report
+
 #-----------------------
 #---- BUDGET ----
-def create_budget(db: Session, user_id: int, category_id: int, amount: float, month: str):
-    if amount <= 0:
-        return {"error": "⚠️ Ngân sách phải lớn hơn 0."}
+# Chuẩn hóa kỳ ngân sách: nhận "YYYY-MM", "MM-YYYY" hoặc số tháng (năm hiện tại) -> ngày đầu tháng
+def parse_period(month: str):
     try:
         if "-" in month:
             part = month.split("-")
@@ -423,23 +946,99 @@ def create_budget(db: Session, user_id: int, category_id: int, amount: float, mo
                 raise ValueError
 
             if int(part[0]) <= 12 and int(part[1]) > 12:
-                month_num, year = map(int, month.split("-"))
+                month_num, year = map(int, part)
             else:
-                year, month_num = map(int, month.split("-"))
+                year, month_num = map(int, part)
         else:
             month_num = int(month)
             year = datetime.now().year
-        if month_num < 1 or month_num > 12:
-            return {"error": "⚠️ Tháng không hợp lệ! Vui lòng nhập từ 1 đến 12."}
-
-        month_str = f"{year}-{month_num:02d}"
-
     except ValueError:
         return {"error": "⚠️ Định dạng tháng không hợp lệ! Hãy nhập theo dạng YYYY-MM hoặc số tháng (1-12)."}
+
+    if month_num < 1 or month_num > 12:
+        return {"error": "⚠️ Tháng không hợp lệ! Vui lòng nhập từ 1 đến 12."}
+    if year <= 0:
+        return {"error": "⚠️ Năm không hợp lệ! Vui lòng nhập năm dương lịch hợp lệ."}
+    return date(year, month_num, 1)
+
+# Ngày đầu tháng sau (cận trên, không gồm) của tháng bắt đầu từ period
+def _next_period(period: date) -> date:
+    return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+
+# Tổng chi của danh mục trong kỳ lấy từ rollup (chỉ dùng khi tạo/sửa ngân sách, còn lại đọc cột spent)
+def _budget_spent(db: Session, user_id: int, category_id: int, period: date):
+    return db.query(func.sum(CategoryDailyRollup.total)).filter(
+        CategoryDailyRollup.user_id == user_id,
+        CategoryDailyRollup.date >= period,
+        CategoryDailyRollup.date < _next_period(period),
+        CategoryDailyRollup.type == CategoryType.expense,
+        CategoryDailyRollup.category_id == category_id,
+    ).scalar() or 0
+
+# Cộng chênh lệch (có dấu) của một khoản chi vào budget.spent của danh mục/tháng tương ứng, trong cùng giao dịch.
+# Trả về False nếu danh mục chưa có ngân sách tháng đó
+def _apply_budget_delta(db: Session, user_id: int, category_id: int, day: date, amount) -> bool:
+    amount = Decimal(str(amount))
+    stmt = (
+        update(Budget)
+        .where(Budget.user_id == user_id, Budget.category_id == category_id, Budget.period == day.replace(day=1))
+        .values(spent=Budget.spent + amount)
+        .execution_options(synchronize_session=False)
+    )
+    return bool(amount) and db.execute(stmt).rowcount > 0
+
+# Như trên cho nhiều (danh mục, tháng) cùng lúc (thêm hàng loạt): deltas = {(category_id, ngày đầu tháng): số tiền}
+def _apply_budget_deltas(db: Session, user_id: int, deltas):
+    params = [{"u": user_id, "c": c, "p": p, "d": Decimal(str(amount))} for (c, p), amount in deltas.items() if amount]
+    if not params:
+        return
+    table = Budget.__table__
+    db.execute(
+        update(table)
+        .where(table.c.user_id == bindparam("u"), table.c.category_id == bindparam("c"), table.c.period == bindparam("p"))
+        .values({table.c.spent: table.c.spent + bindparam("d")}),
+        params,
+    )
+
+# Trạng thái ngân sách từ (amount, spent) của ngân sách đầu tiên trong kỳ (None = chưa đặt ngân sách)
+def _budget_status(category_name: str, period: date, budget):
+    label = f"{period.month:02d}/{period.year}"
+    if budget is None:
+        return {
+            "exceeded": False,
+            "message": f"⚠️ Bạn chưa đặt ngân sách cho danh mục {category_name} tháng {label}."
+        }
+    amount, spent = budget
+    kq = {"budget": float(amount), "spent": float(spent)}
+    if spent > amount:
+        kq.update(exceeded=True, message=f"🚨 Bạn đã vượt ngân sách {category_name} {spent - amount:,.0f}₫ trong tháng {label}!")
+    else:
+        kq.update(exceeded=False, message=f"✅ Bạn còn {amount - spent:,.0f}₫ trong ngân sách {category_name} tháng {label}.")
+    return kq
+
+def _find_budget(db: Session, user_id: int, category_id: int, period: date):
+    return db.query(Budget.amount, Budget.spent).filter(
+        Budget.user_id == user_id,
+        Budget.category_id == category_id,
+        Budget.period == period
+    ).order_by(Budget.budget_id).first()
+
+# Trạng thái ngân sách sau khi ghi khoản chi: không có ngân sách thì không cần đọc lại
+def _budget_status_after_write(db: Session, user_id: int, category, day: date, has_budget: bool):
+    period = day.replace(day=1)
+    budget = _find_budget(db, user_id, category.category_id, period) if has_budget else None
+    return _budget_status(category.name, period, budget)
+
+def create_budget(db: Session, user_id: int, category_id: int, amount: float, month: str):
+    if amount <= 0:
+        return {"error": "⚠️ Ngân sách phải lớn hơn 0."}
+    period = parse_period(month)
+    if isinstance(period, dict):
+        return period
     existing_budget = db.query(Budget).filter(
         Budget.user_id == user_id,
         Budget.category_id == category_id,
-        Budget.month == month
+        Budget.period == period
     ).first()
 
     if existing_budget:
@@ -450,7 +1049,8 @@ def create_budget(db: Session, user_id: int, category_id: int, amount: float, mo
         user_id=user_id,
         category_id=category_id,
         amount=amount,
-        month=month_str,
+        period=period,
+        spent=_budget_spent(db, user_id, category_id, period),
     )
     db.add(budget)
     db.commit()
@@ -460,37 +1060,20 @@ def create_budget(db: Session, user_id: int, category_id: int, amount: float, mo
     return budget
 
 def get_budgets_by_user_and_month(db: Session, user_id: int, month: str):
-    try:
-        if "-" in month:
-            part = month.split("-")
-            if len(part) != 2:
-                raise ValueError
-
-            if int(part[0]) <= 12 and int(part[1]) > 12:
-                month_num, year = map(int, month.split("-"))
-            else:
-                year, month_num = map(int, month.split("-"))
-        else:
-            month_num = int(month)
-            year = datetime.now().year
-        if month_num < 1 or month_num > 12:
-            return {"error": "⚠️ Tháng không hợp lệ! Vui lòng nhập từ 1 đến 12."}
-
-        month_str = f"{year}-{month_num:02d}"
-
-    except ValueError:
-        return {"error": "⚠️ Định dạng tháng không hợp lệ! Hãy nhập theo dạng YYYY-MM hoặc số tháng (1-12)."}
+    period = parse_period(month)
+    if isinstance(period, dict):
+        return period
 
     return (
         db.query(
             Budget.budget_id,
             Budget.category_id,
             Budget.amount,
-            Budget.month,
+            Budget.period,
             Category.name.label("category_name")
         )
         .join(Category, Budget.category_id == Category.category_id, isouter=True)
-        .filter(Budget.user_id == user_id, Budget.month == month_str)
+        .filter(Budget.user_id == user_id, Budget.period == period)
         .all()
     )
 
@@ -504,26 +1087,14 @@ def update_budget(db: Session, budget_id: int, category_id, amount: float = None
             return {"error": "⚠️ Ngân sách phải lớn hơn 0."}
         budget.amount = amount
     if month is not None:
-        try:
-            if "-" in month:
-                part = month.split("-")
-                if len(part) != 2:
-                    raise ValueError
-                if int(part[0]) <= 12 and int(part[1]) > 12:
-                    month_num, year = map(int, month.split("-"))
-                else:
-                    year, month_num = map(int, month.split("-"))
-            else:
-                month_num = int(month)
-                year = datetime.now().year
-            if month_num < 1 or month_num > 12:
-                return {"error": "⚠️ Tháng không hợp lệ! Vui lòng nhập từ 1 đến 12."}
-
-            budget.month = f"{year}-{month_num:02d}"
-        except ValueError:
-            return {"error": "⚠️ Định dạng tháng không hợp lệ! Hãy nhập theo dạng YYYY-MM hoặc số tháng (1-12)."}
+        period = parse_period(month)
+        if isinstance(period, dict):
+            return period
+        budget.period = period
     if category_id is not None:
         budget.category_id = category_id
+    if month is not None or category_id is not None:
+        budget.spent = _budget_spent(db, budget.user_id, budget.category_id, budget.period)
 
     db.commit()
     db.refresh(budget)
@@ -557,51 +1128,12 @@ def check_budget_exceeded(db: Session, user_id: int, category_id: int, year: int
     if year <= 0:
         return {"error": "⚠️ Năm không hợp lệ! Vui lòng nhập năm dương lịch hợp lệ."}
 
-    start_date = date(year, month, 1)
-    if month == 12:
-        end_date = date(year + 1, 1, 1)
-    else:
-        end_date = date(year, month + 1, 1)
-
-    total_expense = (
-            db.query(func.sum(Expense.amount))
-            .filter(
-                Expense.user_id == user_id,
-                Expense.category_id == category_id,
-                Expense.date >= start_date,
-                Expense.date < end_date,
-            )
-            .scalar()  # để lấy giá trị duy nhất
-            or 0
-    )
-    month_str = f"{year}-{month:02d}"
-    budget = db.query(Budget).filter(
-        Budget.user_id == user_id,
-        Budget.category_id == category_id,
-        Budget.month == month_str
-    ).first()
-
-    category = db.query(Category).filter(
-        Category.category_id == category_id,
-    ).first()
+    # Tổng chi đã được cộng dồn vào budget.spent khi ghi khoản chi, không cần SUM lại
+    period = date(year, month, 1)
+    budget = _find_budget(db, user_id, category_id, period)
+    category = db.query(Category.name).filter(Category.category_id == category_id).first()
     category_name = category.name if category else "Không xác định"
-    if not budget:
-        return {
-            "exceeded": False,
-            "message": f"⚠️ Bạn chưa đặt ngân sách cho danh mục {category_name} tháng {month:02d}/{year}."
-        }
-    if total_expense > budget.amount:
-        over = total_expense - budget.amount
-        return {
-            "exceeded": True,
-            "message": f"🚨 Bạn đã vượt ngân sách {category_name} {over:,.0f}₫ trong tháng {month:02d}/{year}!"
-        }
-    remaining = budget.amount - total_expense
-    return {
-        "exceeded": False,
-        "message": f"✅ Bạn còn {remaining:,.0f}₫ trong ngân sách {category_name} tháng {month:02d}/{year}."
-    }
-
+    return _budget_status(category_name, period, budget)
 
 def get_budget_summary_for_month(db: Session, user_id: int, year: int, month: int):
     if not (1 <= month <= 12):
@@ -610,49 +1142,56 @@ def get_budget_summary_for_month(db: Session, user_id: int, year: int, month: in
         return {"error": "⚠️ Năm không hợp lệ! Vui lòng nhập năm dương lịch hợp lệ."}
 
     start_date = date(year, month, 1)
-    if month == 12:
-        end_date = date(year + 1, 1, 1)
-    else:
-        end_date = date(year, month + 1, 1)
-    month_str = f"{year}-{month:02d}"
 
-    # Lấy TẤT CẢ category
-    categories = db.query(Category).filter(Category.type == CategoryType.expense).all()
-
-    kq = []
-    for category in categories:
-        category_name = category.name
-
-        # Lấy tổng chi tiêu
-        total_expense = (
-                db.query(func.sum(Expense.amount))
-                .filter(
-                    Expense.user_id == user_id,
-                    Expense.category_id == category.category_id,
-                    Expense.date >= start_date,
-                    Expense.date < end_date,
-                )
-                .scalar() or 0
-        )
-
-        # Lấy ngân sách
-        budget = (
-            db.query(Budget)
-            .filter(
-                Budget.user_id == user_id,
-                Budget.category_id == category.category_id,
-                Budget.month == month_str
-            )
-            .first()
+    # Tổng chi tiêu theo danh mục trong tháng, cộng từ rollup theo ngày (tối đa 31 dòng mỗi danh mục)
+    spent = (
+        db.query(CategoryDailyRollup.category_id, func.sum(CategoryDailyRollup.total).label("total"))
+        .filter(
+            CategoryDailyRollup.user_id == user_id,
+            CategoryDailyRollup.date >= start_date,
+            CategoryDailyRollup.date < _next_period(start_date),
+            CategoryDailyRollup.type == CategoryType.expense,
+            CategoryDailyRollup.count > 0,
         )
+        .group_by(CategoryDailyRollup.category_id)
+        .subquery()
+    )
+    # Ngân sách của tháng (nếu trùng thì lấy bản ghi tạo trước, như .first() trước đây)
+    first_budget_ids = (
+        db.query(func.min(Budget.budget_id))
+        .filter(Budget.user_id == user_id, Budget.period == start_date)
+        .group_by(Budget.category_id)
+    )
+    budgets = (
+        db.query(Budget.category_id, Budget.amount)
+        .filter(Budget.budget_id.in_(first_budget_ids))
+        .subquery()
+    )
+    # Chỉ các danh mục có ngân sách HOẶC có chi tiêu -> không quét toàn bộ bảng categories
+    category_ids = union(
+        select(spent.c.category_id),
+        select(budgets.c.category_id),
+    ).subquery()
+
+    rows = (
+        db.query(Category.category_id, Category.name, spent.c.total, budgets.c.amount)
+        .join(category_ids, Category.category_id == category_ids.c.category_id)
+        .outerjoin(spent, Category.category_id == spent.c.category_id)
+        .outerjoin(budgets, Category.category_id == budgets.c.category_id)
+        .filter(Category.type == CategoryType.expense)
+        .order_by(Category.category_id)
+        .all()
+    )
 
-        # Chỉ thêm vào kết quả NẾU có ngân sách HOẶC có chi tiêu
-        if not budget and total_expense == 0:
-            continue
+    kq = []
+    for row in rows:
+        category_name = row.name
+        total_expense = row.total or 0
+        budget = row.amount
 
-        if not budget:
+        if budget is None:
             kq.append({
-                "category_id": category.category_id,
+                "category_id": row.category_id,
                 "category_name": category_name,
                 "budget": 0,
                 "expense": total_expense,
@@ -661,22 +1200,22 @@ def get_budget_summary_for_month(db: Session, user_id: int, year: int, month: in
             })
             continue
 
-        if total_expense > budget.amount:
-            over = total_expense - budget.amount
+        if total_expense > budget:
+            over = total_expense - budget
             kq.append({
-                "category_id": category.category_id,
+                "category_id": row.category_id,
                 "category_name": category_name,
-                "budget": budget.amount,
+                "budget": budget,
                 "expense": total_expense,
                 "trang_thai": f"🚨 Vượt ngân sách {over:,.0f}₫",
                 "Canh_bao": True
             })
         else:
-            remaining = budget.amount - total_expense
+            remaining = budget - total_expense
             kq.append({
-                "category_id": category.category_id,
+                "category_id": row.category_id,
                 "category_name": category_name,
-                "budget": budget.amount,
+                "budget": budget,
                 "expense": total_expense,
                 "trang_thai": f"✅ Còn lại {remaining:,.0f}₫",
                 "Canh_bao": False
@@ -728,32 +1267,167 @@ def delete_setting(db: Session, setting_id: int):
 
 #---------------------
 #---- MONTHLY SUMMARY ----
-def create_monthly_summary(db: Session, user_id: int, year: int, month: int):
-    start_date = date(year, month, 1)
-    if month == 12:
-        end_date = date(year+1, 1, 1)
-    else:
-        end_date = date(year, month+1, 1)
-    total_income = (
-        db.query(func.sum(Income.amount)).filter(
-            Income.user_id == user_id,
-            Income.date >= start_date,
-            Income.date < end_date,
-        ).scalar() or 0
+# Cộng dồn chênh lệch (có dấu) vào dòng tổng kết của tháng chứa day, trong cùng giao dịch với khoản thu/chi.
+# UPDATE nguyên tử; nếu tháng chưa có dòng thì INSERT trong savepoint,
+# bị request khác chèn trước (vi phạm UNIQUE) thì UPDATE lại.
+def _apply_summary_delta(db: Session, user_id: int, day: date, income=0, expense=0):
+    income, expense = Decimal(str(income)), Decimal(str(expense))
+    if not income and not expense:
+        return
+    period = day.replace(day=1)
+    stmt = (
+        update(MonthlySummary)
+        .where(MonthlySummary.user_id == user_id, MonthlySummary.period == period)
+        .values(
+            total_income=MonthlySummary.total_income + income,
+            total_expense=MonthlySummary.total_expense + expense,
+            balance=MonthlySummary.balance + income - expense,
+        )
+        .execution_options(synchronize_session=False)
     )
-    total_expense = (
-            db.query(func.sum(Expense.amount)).filter(
-                Expense.user_id == user_id,
-                Expense.date >= start_date,
-                Expense.date < end_date,
-            ).scalar() or 0
+    if db.execute(stmt).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(MonthlySummary).values(
+                user_id=user_id,
+                period=period,
+                total_income=income,
+                total_expense=expense,
+                balance=income - expense,
+                created_at=datetime.now(),
+            ))
+    except IntegrityError as e:
+        if not _is_unique_violation(e):
+            raise
+        db.execute(stmt)
+
+# Như _apply_summary_delta cho nhiều tháng cùng lúc (nhập hàng loạt): deltas = {ngày đầu tháng: số tiền}
+# của một loại (kind = "income"/"expense"); một SELECT, một UPDATE executemany và một INSERT cho các tháng chưa có
+def _apply_summary_deltas(db: Session, user_id: int, kind: str, deltas):
+    deltas = {period: Decimal(str(amount)) for period, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    table = MonthlySummary.__table__
+    total_col = table.c.total_income if kind == "income" else table.c.total_expense
+    sign = 1 if kind == "income" else -1
+    existing = {p for (p,) in db.query(MonthlySummary.period).filter(
+        MonthlySummary.user_id == user_id,
+        MonthlySummary.period.in_(deltas),
+    ).all()}
+
+    if existing:
+        db.execute(
+            update(table)
+            .where(table.c.user_id == bindparam("u"), table.c.period == bindparam("p"))
+            .values({total_col: total_col + bindparam("d"), table.c.balance: table.c.balance + bindparam("b")}),
+            [{"u": user_id, "p": p, "d": deltas[p], "b": sign * deltas[p]} for p in existing],
+        )
+    missing = [p for p in deltas if p not in existing]
+    if not missing:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(table), [
+                {"user_id": user_id, "period": p, "total_income": deltas[p] if kind == "income" else 0,
+                 "total_expense": deltas[p] if kind == "expense" else 0, "balance": sign * deltas[p],
+                 "created_at": datetime.now()}
+                for p in missing
+            ])
+    except IntegrityError as e:
+        # Request khác vừa tạo một số tháng -> cộng lần lượt từng tháng
+        if not _is_unique_violation(e):
+            raise
+        for p in missing:
+            _apply_summary_delta(db, user_id, p, **{kind: deltas[p]})
+
+#---- ROLLUP THEO DANH MỤC/NGÀY ----
+# Cộng dồn tổng tiền và số giao dịch (có dấu) vào dòng rollup (user, ngày, loại, danh mục) trong cùng giao dịch,
+# cùng cách với _apply_summary_delta: UPDATE nguyên tử, chưa có dòng thì INSERT trong savepoint
+def _apply_rollup_delta(db: Session, user_id: int, type_: CategoryType, category_id: int, day: date, amount, count: int):
+    amount = Decimal(str(amount))
+    if not amount and not count:
+        return
+    stmt = (
+        update(CategoryDailyRollup)
+        .where(
+            CategoryDailyRollup.user_id == user_id,
+            CategoryDailyRollup.date == day,
+            CategoryDailyRollup.type == type_,
+            CategoryDailyRollup.category_id == category_id,
+        )
+        .values(total=CategoryDailyRollup.total + amount, count=CategoryDailyRollup.count + count)
+        .execution_options(synchronize_session=False)
     )
+    if db.execute(stmt).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(CategoryDailyRollup).values(
+                user_id=user_id, date=day, type=type_, category_id=category_id, total=amount, count=count,
+            ))
+    except IntegrityError as e:
+        if not _is_unique_violation(e):
+            raise
+        db.execute(stmt)
+
+# Như trên cho nhiều (danh mục, ngày) của một loại (thêm hàng loạt):
+# deltas = {(category_id, ngày): số tiền}, counts = {(category_id, ngày): số giao dịch}
+def _apply_rollup_deltas(db: Session, user_id: int, type_: CategoryType, deltas, counts):
+    if not deltas:
+        return
+    table = CategoryDailyRollup.__table__
+    existing = set(db.query(CategoryDailyRollup.category_id, CategoryDailyRollup.date).filter(
+        CategoryDailyRollup.user_id == user_id,
+        CategoryDailyRollup.type == type_,
+        CategoryDailyRollup.date.in_({p for _, p in deltas}),
+        CategoryDailyRollup.category_id.in_({c for c, _ in deltas}),
+    ).all())
+
+    if existing:
+        db.execute(
+            update(table)
+            .where(table.c.user_id == bindparam("u"), table.c.date == bindparam("p"),
+                   table.c.type == bindparam("t"), table.c.category_id == bindparam("c"))
+            .values({table.c.total: table.c.total + bindparam("d"), table.c.count: table.c.count + bindparam("n")}),
+            [{"u": user_id, "p": p, "t": type_, "c": c, "d": deltas[(c, p)], "n": counts[(c, p)]}
+             for c, p in deltas if (c, p) in existing],
+        )
+    missing = [key for key in deltas if key not in existing]
+    if not missing:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(table), [
+                {"user_id": user_id, "date": p, "type": type_, "category_id": c,
+                 "total": deltas[(c, p)], "count": counts[(c, p)]}
+                for c, p in missing
+            ])
+    except IntegrityError as e:
+        # Request khác vừa tạo một số dòng -> cộng lần lượt từng dòng
+        if not _is_unique_violation(e):
+            raise
+        for c, p in missing:
+            _apply_rollup_delta(db, user_id, type_, c, p, deltas[(c, p)], counts[(c, p)])
+
+# Tổng tiền theo loại của một tháng, cộng từ rollup (tối đa 31 dòng mỗi danh mục thay vì mọi giao dịch trong tháng)
+def _rollup_totals(db: Session, user_id: int, period: date):
+    rows = db.query(CategoryDailyRollup.type, func.sum(CategoryDailyRollup.total)).filter(
+        CategoryDailyRollup.user_id == user_id,
+        CategoryDailyRollup.date >= period,
+        CategoryDailyRollup.date < _next_period(period),
+    ).group_by(CategoryDailyRollup.type).all()
+    totals = {t: total or 0 for t, total in rows}
+    return totals.get(CategoryType.income, 0), totals.get(CategoryType.expense, 0)
+
+def create_monthly_summary(db: Session, user_id: int, year: int, month: int):
+    start_date = date(year, month, 1)
+    total_income, total_expense = _rollup_totals(db, user_id, start_date)
     balance = total_income - total_expense
-    month_str = f"{year}-{month:02d}"
     summary = (
         db.query(MonthlySummary).filter(
             MonthlySummary.user_id == user_id,
-            MonthlySummary.month == month_str,
+            MonthlySummary.period == start_date,
         ).first()
     )
 
@@ -764,7 +1438,7 @@ def create_monthly_summary(db: Session, user_id: int, year: int, month: int):
     else:
         summary=MonthlySummary(
             user_id=user_id,
-            month=month_str,
+            period=start_date,
             total_income=total_income,
             total_expense=total_expense,
             balance=balance,
@@ -775,9 +1449,184 @@ def create_monthly_summary(db: Session, user_id: int, year: int, month: int):
     db.refresh(summary)
     return summary
 
-def get_summary_by_user_and_month(db: Session, user_id: int, year: int, month: str):
-    month_str = f"{year}-{month:02d}"
+def get_summary_by_user_and_month(db: Session, user_id: int, year: int, month: int):
+    if not (1 <= month <= 12) or year <= 0:
+        return []
     return db.query(MonthlySummary).filter(
         MonthlySummary.user_id == user_id,
-        MonthlySummary.month == month_str,
-    ).all()
\ No newline at end of file
+        MonthlySummary.period == date(year, month, 1),
+    ).all()
+
+#---------------------
+#---- REPORT ----
+REPORT_BUCKETS = ("day", "week", "month", "quarter", "year")
+
+# Biểu thức SQL dùng để GROUP BY theo kích thước nhóm; quý được gộp từ tháng ở Python
+def _bucket_columns(db: Session, column, bucket: str):
+    if bucket == "day":
+        return [column]
+    if bucket == "week":
+        # Ngày thứ Hai đầu tuần (ISO)
+        if db.get_bind().dialect.name == "sqlite":
+            return [func.date(column, "weekday 0", "-6 days")]
+        return [func.subdate(column, func.weekday(column))]
+    if bucket in ("month", "quarter"):
+        return [extract("year", column), extract("month", column)]
+    return [extract("year", column)]
+
+# Ngày bắt đầu của nhóm từ giá trị các cột GROUP BY
+def _bucket_start(bucket: str, values):
+    if bucket in ("day", "week"):
+        value = values[0]
+        return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+    year = int(values[0])
+    if bucket == "month":
+        return date(year, int(values[1]), 1)
+    if bucket == "quarter":
+        return date(year, (int(values[1]) - 1) // 3 * 3 + 1, 1)
+    return date(year, 1, 1)
+
+# Tổng (SUM) và số giao dịch (COUNT) theo nhóm thời gian, tùy chọn theo danh mục, tính trong SQL
+def aggregate_transactions(db: Session, user_id: int, bucket: str = "month", start: date = None, end: date = None,
+                           type_: CategoryType = None, by_category: bool = False):
+    if bucket not in REPORT_BUCKETS:
+        return {"error": f"⚠️ Kiểu nhóm không hợp lệ! Chọn một trong: {', '.join(REPORT_BUCKETS)}."}
+    if start and end and start > end:
+        return {"error": "⚠️ Ngày bắt đầu phải trước hoặc bằng ngày kết thúc."}
+
+    types = [CategoryType(type_)] if type_ else list(CategoryType)
+    # Đọc bảng rollup theo ngày (mỗi ngày một dòng cho mỗi danh mục) cho mọi kiểu nhóm và khoảng ngày
+    date_col, category_col = CategoryDailyRollup.date, CategoryDailyRollup.category_id
+    totals = (func.sum(CategoryDailyRollup.total), func.sum(CategoryDailyRollup.count))
+
+    kq = {}
+    for t in types:
+        conditions = (CategoryDailyRollup.user_id == user_id, CategoryDailyRollup.type == t, CategoryDailyRollup.count > 0)
+        bucket_cols = _bucket_columns(db, date_col, bucket)
+        group_cols = list(bucket_cols)
+        if by_category:
+            group_cols.append(Category.name)
+
+        query = db.query(*group_cols, *totals).filter(*conditions)
+        if by_category:
+            query = query.outerjoin(Category, category_col == Category.category_id)
+        if start:
+            query = query.filter(date_col >= start)
+        if end:
+            query = query.filter(date_col <= end)
+
+        for row in query.group_by(*group_cols).all():
+            bucket_start = _bucket_start(bucket, row[:len(bucket_cols)])
+            category_name = row[len(bucket_cols)] if by_category else None
+            total, count = row[-2], row[-1]
+            key = (t.value, bucket_start, category_name)
+            item = kq.setdefault(key, {"type": t.value, "bucket": bucket_start, "total": 0.0, "count": 0})
+            if by_category:
+                item["category_name"] = category_name
+            item["total"] += float(total or 0)
+            item["count"] += count
+
+    return sorted(kq.values(), key=lambda x: (x["type"], x["bucket"], x.get("category_name") or ""))
+
+#---------------------
+#---- EXPORT ----
+EXPORT_COLUMNS = ("type", "id", "date", "category_name", "amount", "note")
+
+# Câu lệnh SELECT (cột thuần, không tạo đối tượng ORM) cho từng loại giao dịch cần xuất, sắp theo ngày
+def export_statements(user_id: int, start: date = None, end: date = None, type_: CategoryType = None):
+    models = {CategoryType.income: (Income, Income.income_id), CategoryType.expense: (Expense, Expense.expense_id)}
+    types = [CategoryType(type_)] if type_ else list(models)
+    statements = []
+    for t in types:
+        model, id_col = models[t]
+        stmt = (
+            select(id_col, model.date, Category.name, model.amount, model.note)
+            .outerjoin(Category, model.category_id == Category.category_id)
+            .where(model.user_id == user_id)
+        )
+        if start:
+            stmt = stmt.where(model.date >= start)
+        if end:
+            stmt = stmt.where(model.date <= end)
+        statements.append((t.value, stmt.order_by(model.date, id_col)))
+    return statements
+
+#---------------------
+#---- TÌM KIẾM GHI CHÚ ----
+SEARCH_LIMIT = 20
+SEARCH_MAX = 100
+SEARCH_WORD_RE = re.compile(r"\w+")
+_fulltext_note_tables = set()     # bảng có index toàn văn cho note (phát hiện khi khởi động)
+
+# Gọi khi khởi động (sau migration/phân vùng): bảng nào có index toàn văn thì dùng, còn lại tìm bằng LIKE.
+# MySQL: index ft_<bảng>_note (bị bỏ khi phân vùng theo năm); SQLite: bảng FTS5 <bảng>_fts
+def detect_note_search_indexes(bind):
+    inspector = inspect(bind)
+    found = set()
+    for table_name in NOTE_SEARCH_TABLES:
+        if bind.dialect.name == "mysql":
+            if f"ft_{table_name}_note" in {ix["name"] for ix in inspector.get_indexes(table_name)}:
+                found.add(table_name)
+        elif bind.dialect.name == "sqlite" and inspector.has_table(f"{table_name}_fts"):
+            found.add(table_name)
+    _fulltext_note_tables.clear()
+    _fulltext_note_tables.update(found)
+
+# Mỗi từ là một điều kiện AND và khớp theo tiền tố ("cà ph" khớp "cà phê");
+# chỉ giữ ký tự chữ/số nên không lọt toán tử của cú pháp FTS5 / BOOLEAN MODE
+def _search_terms(q: str):
+    return SEARCH_WORD_RE.findall(q or "")
+
+# Trả về (cột điểm, điều kiện, bảng FTS cần join hoặc None) theo backend;
+# điểm càng lớn càng liên quan, None khi phải quay về LIKE (không xếp hạng, bảng không có index toàn văn)
+def _note_match(db: Session, model, id_col, q: str, terms):
+    dialect = db.get_bind().dialect.name
+    if model.__tablename__ not in _fulltext_note_tables:
+        return None, model.note.icontains(q.strip(), autoescape=True), None
+    if dialect == "sqlite":
+        fts_name = f"{model.__tablename__}_fts"
+        fts = table(fts_name, column("rowid"))
+        fts_query = " ".join('"' + t + '"*' for t in terms)
+        fts_ref = literal_column(fts_name)
+        return -func.bm25(fts_ref), fts_ref.op("MATCH")(fts_query), (fts, fts.c.rowid == id_col)
+    score = match(model.note, against=" ".join("+" + t + "*" for t in terms)).in_boolean_mode()
+    return score, score, None
+
+# Tìm trong ghi chú thu/chi của user bằng index toàn văn, xếp theo độ liên quan rồi ngày mới nhất
+def search_notes(db: Session, user_id: int, q: str, type_: CategoryType = None, limit: int = SEARCH_LIMIT):
+    terms = _search_terms(q)
+    if not terms:
+        return {"error": "⚠️ Vui lòng nhập từ khóa tìm kiếm!"}
+    limit = max(1, min(limit, SEARCH_MAX))
+
+    models = {CategoryType.income: (Income, Income.income_id), CategoryType.expense: (Expense, Expense.expense_id)}
+    types = [CategoryType(type_)] if type_ else list(models)
+    kq = []
+    for t in types:
+        model, id_col = models[t]
+        score, condition, fts_join = _note_match(db, model, id_col, q, terms)
+        score_col = (score if score is not None else literal(None)).label("score")
+        query = db.query(id_col.label("id"), model.date, Category.name.label("category_name"),
+                         model.amount, model.note, score_col)
+        if fts_join is not None:
+            query = query.select_from(fts_join[0]).join(model, fts_join[1])
+        query = (
+            query.outerjoin(Category, model.category_id == Category.category_id)
+            .filter(model.user_id == user_id, condition)
+        )
+        order = [model.date.desc(), id_col.desc()]
+        if score is not None:
+            order.insert(0, score_col.desc())
+        for row in query.order_by(*order).limit(limit):
+            kq.append({
+                "type": t.value,
+                "id": row.id,
+                "date": row.date,
+                "category_name": row.category_name,
+                "amount": float(row.amount),
+                "note": row.note,
+                "score": round(float(row.score), 4) if row.score is not None else None,
+            })
+
+    kq.sort(key=lambda x: (x["score"] or 0, x["date"], x["id"]), reverse=True)
+    return kq[:limit]
@@ -0,0 +1,87 @@
+from functools import wraps
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+import crud
+
+
+# Bọc hàm CRUD đồng bộ thành coroutine: logic ORM giữ nguyên trong crud.py,
+# chạy trên AsyncSession qua run_sync (greenlet) nên không chiếm luồng của threadpool
+def _async(fn):
+    @wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+    return wrapper
+
+# Các hàm băm/kiểm tra mật khẩu bằng bcrypt tốn CPU nên không chạy trên event loop:
+# đưa vào threadpool với phiên đồng bộ riêng (tham số db async được bỏ qua)
+def _in_threadpool(fn):
+    @wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        def call():
+            with SessionLocal() as sync_db:
+                return fn(sync_db, *args, **kwargs)
+        return await run_in_threadpool(call)
+    return wrapper
+
+
+#---- USER ----
+get_user_by_username = _async(crud.get_user_by_username)
+get_user_by_email = _async(crud.get_user_by_email)
+create_user = _in_threadpool(crud.create_user)
+verify_login = _in_threadpool(crud.verify_login)
+logout_user = _async(crud.logout_user)
+delete_user = _async(crud.delete_user)
+get_data_version = _async(crud.get_data_version)
+
+#---- CATEGORY ----
+get_categories = _async(crud.get_categories)
+
+#---- INCOME ----
+create_income = _async(crud.create_income)
+get_incomes_by_user = _async(crud.get_incomes_by_user)
+get_incomes_by_month = _async(crud.get_incomes_by_month)
+get_incomes_by_year = _async(crud.get_incomes_by_year)
+update_income = _async(crud.update_income)
+delete_income = _async(crud.delete_income)
+create_incomes_batch = _async(crud.create_incomes_batch)
+
+#---- EXPENSE ----
+create_expense = _async(crud.create_expense)
+get_expenses_by_user = _async(crud.get_expenses_by_user)
+get_expenses_by_month = _async(crud.get_expenses_by_month)
+get_expenses_by_year = _async(crud.get_expenses_by_year)
+update_expense = _async(crud.update_expense)
+delete_expense = _async(crud.delete_expense)
+create_expenses_batch = _async(crud.create_expenses_batch)
+
+#---- THU + CHI ----
+get_transactions_by_user = _async(crud.get_transactions_by_user)
+
+#---- NHẬP SAO KÊ ----
+# Đọc/phân tích file upload và INSERT hàng loạt tốn CPU + I/O đồng bộ -> chạy trong threadpool
+import_statement = _in_threadpool(crud.import_statement)
+
+#---- BUDGET ----
+create_budget = _async(crud.create_budget)
+get_budgets_by_user_and_month = _async(crud.get_budgets_by_user_and_month)
+update_budget = _async(crud.update_budget)
+delete_budget = _async(crud.delete_budget)
+check_budget_exceeded = _async(crud.check_budget_exceeded)
+get_budget_summary_for_month = _async(crud.get_budget_summary_for_month)
+
+#---- SETTINGS ----
+create_setting = _async(crud.create_setting)
+get_setting_by_user = _async(crud.get_setting_by_user)
+update_setting = _async(crud.update_setting)
+delete_setting = _async(crud.delete_setting)
+
+#---- MONTHLY SUMMARY ----
+create_monthly_summary = _async(crud.create_monthly_summary)
+get_summary_by_user_and_month = _async(crud.get_summary_by_user_and_month)
+
+#---- REPORT ----
+aggregate_transactions = _async(crud.aggregate_transactions)
+
+#---- TÌM KIẾM ----
+search_notes = _async(crud.search_notes)
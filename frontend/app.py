@@ -5,6 +5,7 @@ import requests
 import time
 
 from style import load_custom_css
+from etag_cache import conditional_get
 
 # Gọi CSS toàn cục
 load_custom_css()
@@ -55,21 +56,53 @@ if st.sidebar.button("🚪 Đăng xuất"):
 # 🔧 HÀM GỌI API
 # ===============================
 
-def fetch_transactions():
-    """Lấy danh sách thu & chi từ backend"""
+def fetch_all_pages(endpoint, filters=None, page_size=1000):
+    """Đọc lần lượt các trang (cursor trong header X-Next-Cursor) cho đến hết; trang chưa đổi (304) dùng lại bản đã lưu"""
+    items, cursor = [], None
+    while True:
+        params = {"limit": page_size, **(filters or {})}
+        if cursor:
+            params["cursor"] = cursor
+        res = conditional_get(f"{API_BASE}{endpoint}", params=params, headers=AUTH_HEADERS)
+        if res.status_code != 200:
+            return items
+        items.extend(res.json())
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            return items
+
+
+TYPE_LABELS = {"income": "Thu nhập", "expense": "Chi tiêu"}
+DEFAULT_CATEGORIES = {
+    "income": ["Lương", "Thưởng", "Bán hàng", "Khác"],
+    "expense": ["Ăn uống", "Hóa đơn", "Quần áo", "Mỹ phẩm"],
+}
+
+
+@st.cache_data(ttl=300)
+def fetch_categories(type_):
+    """Danh mục có sẵn ở backend (gộp với danh mục mặc định), backend cũng cache danh sách này"""
+    names = list(DEFAULT_CATEGORIES[type_])
     try:
-        res_income = requests.get(f"{API_BASE}/incomes/{USER_ID}", headers=AUTH_HEADERS)
-        res_expense = requests.get(f"{API_BASE}/expense/{USER_ID}", headers=AUTH_HEADERS)
-
-        income = res_income.json() if res_income.status_code == 200 else []
-        expense = res_expense.json() if res_expense.status_code == 200 else []
+        res = requests.get(f"{API_BASE}/categories/", params={"type": type_}, headers=AUTH_HEADERS)
+        if res.status_code == 200:
+            known = {n.casefold() for n in names}
+            names += [c["name"] for c in res.json() if c["name"].casefold() not in known]
+    except requests.RequestException:
+        pass
+    return names
 
-        for i in income:
-            i["type"] = "Thu nhập"
-        for e in expense:
-            e["type"] = "Chi tiêu"
 
-        return income + expense
+def fetch_transactions(start_date=None, end_date=None, category="", note=""):
+    """Lấy danh sách thu & chi từ backend (bộ lọc được áp dụng ở backend)"""
+    filters = {"start": start_date, "end": end_date, "category": category.strip(), "note": note.strip()}
+    filters = {k: str(v) for k, v in filters.items() if v}
+    try:
+        # Một endpoint trả về cả thu và chi, đã sắp theo ngày mới nhất
+        transactions = fetch_all_pages(f"/transactions/{USER_ID}", filters)
+        for t in transactions:
+            t["type"] = TYPE_LABELS.get(t["type"], t["type"])
+        return transactions
 
     except Exception as e:
         st.error(f"❌ Lỗi khi tải dữ liệu: {e}")
@@ -77,6 +110,15 @@ def fetch_transactions():
         return []
 
 
+def show_budget_status(result):
+    """Cảnh báo ngân sách trả về kèm khoản chi (không cần gọi /budgets/check)"""
+    status = result.get("budget_status") if isinstance(result, dict) else None
+    if status and status.get("exceeded"):
+        st.warning(status["message"])
+    elif status and "budget" in status:
+        st.info(status["message"])
+
+
 def add_transaction(type_, category, amount, note, date_):
     """Thêm giao dịch mới"""
     try:
@@ -91,6 +133,7 @@ def add_transaction(type_, category, amount, note, date_):
         res = requests.post(url, json=payload, headers=AUTH_HEADERS)
         if res.status_code == 200:
             st.success("✅ Giao dịch đã được thêm thành công!")
+            show_budget_status(res.json())
             time.sleep(4)
         else:
             st.error(f"❌ Lỗi khi thêm: {res.text}")
@@ -114,6 +157,7 @@ def update_transaction(id_, type_, category, amount, note, date_):
         res = requests.put(url, json=payload, headers=AUTH_HEADERS)
         if res.status_code == 200:
             st.success("✅ Đã cập nhật giao dịch!")
+            show_budget_status(res.json())
             time.sleep(5)
         else:
             try:
@@ -154,10 +198,6 @@ if "edit_id" not in st.session_state:
 st.sidebar.header("🔧 Chức năng")
 menu = st.sidebar.radio("Chọn thao tác:", ["Thêm giao dịch", "Danh sách giao dịch"])
 
-data = pd.DataFrame(fetch_transactions())
-if not data.empty:
-    data["date"] = pd.to_datetime(data["date"], errors="coerce")
-
 # ===============================
 # ➕ THÊM GIAO DỊCH
 # ===============================
@@ -181,10 +221,8 @@ if menu == "Thêm giao dịch":
             note = st.text_input("🗒️ Ghi chú")
         with c2:
             amount = st.number_input("💵 Số tiền", min_value=0.0)
-            if st.session_state["mode"] == "Thu nhập":
-                category = st.selectbox("📂 Danh mục", ["Lương", "Thưởng", "Bán hàng", "Khác"])
-            else:
-                category = st.selectbox("📂 Danh mục", ["Ăn uống", "Hóa đơn", "Quần áo", "Mỹ phẩm"])
+            type_ = "income" if st.session_state["mode"] == "Thu nhập" else "expense"
+            category = st.selectbox("📂 Danh mục", fetch_categories(type_))
 
         submit = st.form_submit_button("💾 Lưu giao dịch")
 
@@ -202,112 +240,100 @@ if menu == "Thêm giao dịch":
 elif menu == "Danh sách giao dịch":
     st.header("📋 Danh sách Thu - Chi")
 
-    if not data.empty:
-        with st.expander("🔍 Bộ lọc nâng cao", expanded=True):
-            col1, col2 = st.columns(2)
-            with col1:
-                category_filter = st.text_input("📂 Tìm theo danh mục", "")
-                note_filter = st.text_input("🗒️ Tìm theo ghi chú", "")
-            with col2:
-                today = datetime.date.today()
-                first_day = today.replace(day=1)
-                last_day = (first_day + datetime.timedelta(days=31)).replace(day=1) - datetime.timedelta(days=1)
-                start_date = st.date_input("📅 Từ ngày", value=first_day)
-                end_date = st.date_input("📅 Đến ngày", value=last_day)
-
-            filtered_data = data.copy()
+    with st.expander("🔍 Bộ lọc nâng cao", expanded=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            category_filter = st.text_input("📂 Tìm theo danh mục", "")
+            note_filter = st.text_input("🗒️ Tìm theo ghi chú", "")
+        with col2:
+            today = datetime.date.today()
+            first_day = today.replace(day=1)
+            last_day = (first_day + datetime.timedelta(days=31)).replace(day=1) - datetime.timedelta(days=1)
+            start_date = st.date_input("📅 Từ ngày", value=first_day)
+            end_date = st.date_input("📅 Đến ngày", value=last_day)
+
+    # Chỉ tải các giao dịch khớp bộ lọc (lọc trong SQL ở backend)
+    if start_date > end_date:
+        st.error("⚠️ Ngày bắt đầu phải trước hoặc bằng ngày kết thúc!")
+        time.sleep(4)
+        filtered_data = pd.DataFrame()
+    else:
+        filtered_data = pd.DataFrame(fetch_transactions(start_date, end_date, category_filter, note_filter))
+        if not filtered_data.empty:
             filtered_data["date"] = pd.to_datetime(filtered_data["date"], errors="coerce").dt.date
 
-            if start_date > end_date:
-                st.error("⚠️ Ngày bắt đầu phải trước hoặc bằng ngày kết thúc!")
-                time.sleep(4)
-                filtered_data = pd.DataFrame()
-            else:
-                filtered_data = filtered_data[
-                    (filtered_data["date"] >= start_date) & (filtered_data["date"] <= end_date)
-                ]
-
-        if category_filter.strip():
-            filtered_data = filtered_data[
-                filtered_data["category_name"].str.contains(category_filter, case=False, na=False)
-            ]
-        if note_filter.strip():
-            filtered_data = filtered_data[
-                filtered_data["note"].str.contains(note_filter, case=False, na=False)
-            ]
-
-        if filtered_data.empty:
-            st.warning("❌ Không tìm thấy giao dịch nào phù hợp!")
-            time.sleep(5)
-        else:
-            total_income = filtered_data.query("type == 'Thu nhập'")["amount"].sum()
-            total_expense = filtered_data.query("type == 'Chi tiêu'")["amount"].sum()
-            balance = total_income - total_expense
-
-            st.markdown(f"""
-            💵 **Tổng thu:** `{total_income:,.0f} đ`  
-            💸 **Tổng chi:** `{total_expense:,.0f} đ`  
-            📊 **Số dư:** `{balance:,.0f} đ`
-            """)
-            st.markdown("---")
-
-            for i, (_, row) in enumerate(filtered_data.iterrows()):
-                color = "🟢" if row["type"] == "Thu nhập" else "🔴"
-                cols = st.columns([1.2, 1.5, 2, 2, 2, 1, 1])
-                cols[0].write(f"{color} {row['type']}")
-                cols[1].write(row.get("category_name", ""))
-                cols[2].write(f"{row['amount']:,.0f} đ")
-                cols[3].write(row.get("note", ""))
-                cols[4].write(pd.to_datetime(row["date"]).strftime("%d/%m/%Y"))
-
-                if cols[5].button("✏️", key=f"edit_{i}_{row['type']}"):
-                    edit_type = row["type"]
-
-                    # Lấy ID một cách an toàn dựa trên loại
-                    if edit_type == "Thu nhập":
-                        edit_id = row.get("income_id")
-                    else:
-                        edit_id = row.get("expense_id")
-
-                    # Fallback (dự phòng) nếu backend chỉ dùng cột "id" chung
-                    if pd.isna(edit_id):
-                        edit_id = row.get("id")
-
-                    st.session_state["edit_id"] = edit_id
-                    st.session_state["edit_type"] = edit_type
-                    st.session_state["edit_row"] = row
-                    st.rerun()
-
-                if cols[6].button("❌", key=f"delete_{i}_{row['type']}"):
-                    # Lấy ID từ các cột có thể có
-                    raw_id = row.get("id") or row.get("income_id") or row.get("expense_id")
-
-                    # Kiểm tra ID hợp lệ
-                    if pd.notna(raw_id):
-                        try:
-                            delete_transaction(int(raw_id), row["type"])
-                            st.success("🗑️ Đã xóa thành công.")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"❌ Lỗi khi xóa: {e}")
-                    else:
-                        st.warning("⚠️ Không thể xóa: ID bị thiếu hoặc không hợp lệ.")
-
-        # ====== FORM SỬA ======
-        if st.session_state.get("edit_id"):
-            edit_id = st.session_state["edit_id"]
-            row = st.session_state["edit_row"]
-            st.markdown("---")
-            st.subheader("✏️ Sửa giao dịch")
-
-            with st.form(f"edit_form_{edit_id}"):
-                new_date = st.date_input("📅 Ngày", pd.to_datetime(row["date"]).date())
-                new_note = st.text_input("🗒️ Ghi chú", row.get("note", ""))
-                new_amount = st.number_input("💵 Số tiền", value=float(row["amount"]), min_value=0.0)
-                new_category = st.text_input("📂 Danh mục", row.get("category_name", ""))
-                save = st.form_submit_button("💾 Lưu thay đổi")
-
-            if save:
-                update_transaction(edit_id, row["type"], new_category, new_amount, new_note, new_date)
-                st.session_state["edit_id"] = None
+    if filtered_data.empty:
+        st.warning("❌ Không tìm thấy giao dịch nào phù hợp!")
+        time.sleep(5)
+    else:
+        total_income = filtered_data.query("type == 'Thu nhập'")["amount"].sum()
+        total_expense = filtered_data.query("type == 'Chi tiêu'")["amount"].sum()
+        balance = total_income - total_expense
+
+        st.markdown(f"""
+        💵 **Tổng thu:** `{total_income:,.0f} đ`  
+        💸 **Tổng chi:** `{total_expense:,.0f} đ`  
+        📊 **Số dư:** `{balance:,.0f} đ`
+        """)
+        st.markdown("---")
+
+        for i, (_, row) in enumerate(filtered_data.iterrows()):
+            color = "🟢" if row["type"] == "Thu nhập" else "🔴"
+            cols = st.columns([1.2, 1.5, 2, 2, 2, 1, 1])
+            cols[0].write(f"{color} {row['type']}")
+            cols[1].write(row.get("category_name", ""))
+            cols[2].write(f"{row['amount']:,.0f} đ")
+            cols[3].write(row.get("note", ""))
+            cols[4].write(pd.to_datetime(row["date"]).strftime("%d/%m/%Y"))
+
+            if cols[5].button("✏️", key=f"edit_{i}_{row['type']}"):
+                edit_type = row["type"]
+
+                # Lấy ID một cách an toàn dựa trên loại
+                if edit_type == "Thu nhập":
+                    edit_id = row.get("income_id")
+                else:
+                    edit_id = row.get("expense_id")
+
+                # Fallback (dự phòng) nếu backend chỉ dùng cột "id" chung
+                if pd.isna(edit_id):
+                    edit_id = row.get("id")
+
+                st.session_state["edit_id"] = edit_id
+                st.session_state["edit_type"] = edit_type
+                st.session_state["edit_row"] = row
                 st.rerun()
+
+            if cols[6].button("❌", key=f"delete_{i}_{row['type']}"):
+                # Lấy ID từ các cột có thể có
+                raw_id = row.get("id") or row.get("income_id") or row.get("expense_id")
+
+                # Kiểm tra ID hợp lệ
+                if pd.notna(raw_id):
+                    try:
+                        delete_transaction(int(raw_id), row["type"])
+                        st.success("🗑️ Đã xóa thành công.")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Lỗi khi xóa: {e}")
+                else:
+                    st.warning("⚠️ Không thể xóa: ID bị thiếu hoặc không hợp lệ.")
+
+    # ====== FORM SỬA ======
+    if st.session_state.get("edit_id"):
+        edit_id = st.session_state["edit_id"]
+        row = st.session_state["edit_row"]
+        st.markdown("---")
+        st.subheader("✏️ Sửa giao dịch")
+
+        with st.form(f"edit_form_{edit_id}"):
+            new_date = st.date_input("📅 Ngày", pd.to_datetime(row["date"]).date())
+            new_note = st.text_input("🗒️ Ghi chú", row.get("note", ""))
+            new_amount = st.number_input("💵 Số tiền", value=float(row["amount"]), min_value=0.0)
+            new_category = st.text_input("📂 Danh mục", row.get("category_name", ""))
+            save = st.form_submit_button("💾 Lưu thay đổi")
+
+        if save:
+            update_transaction(edit_id, row["type"], new_category, new_amount, new_note, new_date)
+            st.session_state["edit_id"] = None
+            st.rerun()
@@ -0,0 +1,23 @@
+# Tên file: etag_cache.py
+import requests
+import streamlit as st
+
+
+def conditional_get(url, params=None, headers=None):
+    """
+    GET có điều kiện: gửi lại ETag đã nhận (If-None-Match) cho cùng URL + tham số.
+    Backend trả 304 khi dữ liệu của user chưa đổi -> dùng lại response đã lưu thay vì tải lại toàn bộ body.
+    Lưu trong st.session_state nên mỗi phiên trình duyệt có bản riêng.
+    """
+    store = st.session_state.setdefault("etag_cache", {})
+    key = (url, tuple(sorted((params or {}).items())))
+    cached = store.get(key)
+    headers = dict(headers or {})
+    if cached:
+        headers["If-None-Match"] = cached[0]
+    res = requests.get(url, params=params, headers=headers)
+    if res.status_code == 304 and cached:
+        return cached[1]
+    if res.status_code == 200 and res.headers.get("ETag"):
+        store[key] = (res.headers["ETag"], res)
+    return res
@@ -3,6 +3,7 @@ import streamlit as st
 import pandas as pd
 import datetime
 import requests
+from frontend.etag_cache import conditional_get
 
 API_URL = "http://127.0.0.1:8000"  # 🔧 URL backend của bạn
 
@@ -23,7 +24,7 @@ if st.sidebar.button("🚪 Đăng xuất"):
 
 # ====== HÀM GỌI API ======
 def get_budgets(user_id, month):
-    r = requests.get(f"{API_URL}/budgets1/{user_id}/{month}")
+    r = conditional_get(f"{API_URL}/budgets1/{user_id}/{month}")
     return r.json()
 
 def add_budget(user_id, month, category, amount):
@@ -5,6 +5,7 @@ import pandas as pd
 from datetime import datetime, timedelta
 import requests
 from frontend.style import load_custom_css
+from frontend.etag_cache import conditional_get
 
 load_custom_css()
 #-- 1. CẤU HÌNH TRANG ---
@@ -31,7 +32,7 @@ AUTH_HEADERS = {'Authorization': f'Bearer {TOKEN}'}
 def fetch_data(endpoint: str) -> pd.DataFrame:
     full_url = f"{BACKEND_URL}{endpoint}"
     try:
-        response = requests.get(full_url, headers=AUTH_HEADERS)
+        response = conditional_get(full_url, headers=AUTH_HEADERS)
         if response.status_code == 200:
             return pd.DataFrame(response.json())
         elif response.status_code == 401:
@@ -50,7 +51,7 @@ def fetch_data(endpoint: str) -> pd.DataFrame:
 def fetch_budget_data(endpoint: str) -> pd.DataFrame:
     full_url = f"{BACKEND_URL}{endpoint}"
     try:
-        response = requests.get(full_url, headers=AUTH_HEADERS)
+        response = conditional_get(full_url, headers=AUTH_HEADERS)
         if response.status_code == 200:
             return pd.DataFrame(response.json().get("data", []))
         elif response.status_code == 401:
@@ -66,39 +67,6 @@ def fetch_budget_data(endpoint: str) -> pd.DataFrame:
     return pd.DataFrame()
 
 
-# --- 4. TẢI DỮ LIỆU  ---
-# du lieu thu nhap
-income_data_raw = fetch_data(f"/incomes/{USER_ID}")
-if not income_data_raw.empty:
-    income_data = income_data_raw.rename(columns={
-        "date": "Ngày",
-        "category_name": "Nguồn thu",
-        "amount": "Thu nhập (VND)"
-    })
-    income_data["Ngày"] = pd.to_datetime(income_data["Ngày"])
-else:
-    income_data = pd.DataFrame({
-        "Ngày": pd.Series(dtype='datetime64[ns]'),
-        "Nguồn thu": pd.Series(dtype='object'),
-        "Thu nhập (VND)": pd.Series(dtype='float')
-    })
-    st.info("Chưa có dữ liệu thu nhập.")
-# Phần này định nghĩa expense_data
-expense_data_raw = fetch_data(f"/expense/{USER_ID}")
-if not expense_data_raw.empty:
-    expense_data = expense_data_raw.rename(columns={
-        "date": "Ngày",
-        "category_name": "Danh mục",
-        "amount": "Chi tiêu (VND)"
-    })
-    expense_data["Ngày"] = pd.to_datetime(expense_data["Ngày"])
-else:
-    expense_data = pd.DataFrame({
-        "Ngày": pd.Series(dtype='datetime64[ns]'),
-        "Danh mục": pd.Series(dtype='object'),
-        "Chi tiêu (VND)": pd.Series(dtype='float')
-    })
-    st.info("Chưa có dữ liệu chi tiêu.")
 # Ngày hiện tại
 today = datetime.now().date()
 current_year = today.year
@@ -106,6 +74,41 @@ current_month = today.month
 this_week_start = today - timedelta(days=today.weekday())
 this_month_start = today.replace(day=1)
 
+# --- 4. TẢI DỮ LIỆU  ---
+# Backend cộng sẵn theo ngày/danh mục (/reports/.../aggregate) nên không phải tải toàn bộ lịch sử giao dịch
+def fetch_aggregate(type_: str, bucket: str, start, by_category: bool = False) -> pd.DataFrame:
+    endpoint = f"/reports/{USER_ID}/aggregate?bucket={bucket}&type={type_}&start={start}"
+    if by_category:
+        endpoint += "&by_category=true"
+    data = fetch_data(endpoint)
+    if data.empty:
+        return pd.DataFrame({
+            "bucket": pd.Series(dtype='datetime64[ns]'),
+            "category_name": pd.Series(dtype='object'),
+            "total": pd.Series(dtype='float')
+        })
+    data["bucket"] = pd.to_datetime(data["bucket"])
+    return data
+
+# du lieu thu nhap theo nguon trong thang
+month_income = fetch_aggregate("income", "month", this_month_start, by_category=True).rename(columns={
+    "category_name": "Nguồn thu",
+    "total": "Thu nhập (VND)"
+})
+if month_income.empty:
+    st.info("Chưa có dữ liệu thu nhập.")
+# du lieu chi tieu theo ngay (tu dau tuan/dau thang) va theo danh muc trong thang
+expense_by_day = fetch_aggregate("expense", "day", min(this_week_start, this_month_start)).rename(columns={
+    "bucket": "Ngày",
+    "total": "Chi tiêu (VND)"
+})
+month_expense = fetch_aggregate("expense", "month", this_month_start, by_category=True).rename(columns={
+    "category_name": "Danh mục",
+    "total": "Chi tiêu (VND)"
+})
+if expense_by_day.empty and month_expense.empty:
+    st.info("Chưa có dữ liệu chi tiêu.")
+
 # --- 5. MENU CHÍNH (SỬA STYLE) ---
 selected = option_menu(
     menu_title=None,
@@ -136,8 +139,7 @@ selected = option_menu(
 
 # --- 6. HIỂN THỊ CÁC TAB (SỬA LẠI HTML) ---
 if selected == "Danh mục thu nhập":
-    month_income = income_data[income_data["Ngày"].dt.date >= this_month_start]
-    total_month = income_data.loc[income_data["Ngày"].dt.date >= this_month_start, "Thu nhập (VND)"].sum()
+    total_month = month_income["Thu nhập (VND)"].sum()
 
     # SỬA LẠI: Dùng class CSS mới 'metric-income'
     st.markdown(f"""
@@ -160,9 +162,9 @@ if selected == "Danh mục thu nhập":
 
 # --- Chi tiêu ---
 elif selected == "Danh mục chi tiêu":
-    total_today = expense_data.loc[expense_data["Ngày"].dt.date == today, "Chi tiêu (VND)"].sum()
-    total_week = expense_data.loc[expense_data["Ngày"].dt.date >= this_week_start, "Chi tiêu (VND)"].sum()
-    total_month = expense_data.loc[expense_data["Ngày"].dt.date >= this_month_start, "Chi tiêu (VND)"].sum()
+    total_today = expense_by_day.loc[expense_by_day["Ngày"].dt.date == today, "Chi tiêu (VND)"].sum()
+    total_week = expense_by_day.loc[expense_by_day["Ngày"].dt.date >= this_week_start, "Chi tiêu (VND)"].sum()
+    total_month = month_expense["Chi tiêu (VND)"].sum()
 
     st.subheader("Tổng chi tiêu")
     col1, col2, col3 = st.columns(3)
@@ -196,7 +198,6 @@ elif selected == "Danh mục chi tiêu":
     )
 
     # Biểu đồ
-    month_expense = expense_data[expense_data["Ngày"].dt.date >= this_month_start]
     category_summary = month_expense.groupby("Danh mục")["Chi tiêu (VND)"].sum().reset_index()
 
     fig = px.pie(
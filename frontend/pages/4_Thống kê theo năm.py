@@ -5,6 +5,7 @@ import plotly.express as px
 import requests
 from streamlit_option_menu import option_menu
 from frontend.style import load_custom_css
+from frontend.etag_cache import conditional_get
 
 load_custom_css()
 # Cấu hình
@@ -30,7 +31,7 @@ def fetch_data(endpoint: str) -> pd.DataFrame:
     """Hàm chung để gọi API và trả về DataFrame."""
     full_url = f"{BACKEND_URL}{endpoint}"
     try:
-        response = requests.get(full_url, headers=AUTH_HEADERS)
+        response = conditional_get(full_url, headers=AUTH_HEADERS)
         if response.status_code == 200:
             data = response.json()
             return pd.DataFrame(data)
@@ -75,78 +76,33 @@ selected = option_menu(
     },
 )
 
-# Lấy dữ liệu thu nhập từ API
-income_data_raw = fetch_data(f"/incomes/{USER_ID}")
-if not income_data_raw.empty:
-    income_data = income_data_raw.rename(columns={
-        "date": "Ngày",
-        "category_name": "Nguồn thu",
-        "amount": "Thu nhập (VND)"
-    })
-    income_data["Ngày"] = pd.to_datetime(income_data["Ngày"])
-else:
-    income_data = pd.DataFrame({
-        "Ngày": pd.Series(dtype='datetime64[ns]'),
-        "Nguồn thu": pd.Series(dtype='object'),
-        "Thu nhập (VND)": pd.Series(dtype='float')
-    })
-    st.info("Chưa có dữ liệu thu nhập.")
-
-# Lấy dữ liệu chi tiêu từ API
-expense_data_raw = fetch_data(f"/expense/{USER_ID}")
-if not expense_data_raw.empty:
-    expense_data = expense_data_raw.rename(columns={
-        "date": "Ngày",
-        "category_name": "Danh mục",
-        "amount": "Chi tiêu (VND)"
-    })
-    expense_data["Ngày"] = pd.to_datetime(expense_data["Ngày"])
-else:
-    expense_data = pd.DataFrame({
-        "Ngày": pd.Series(dtype='datetime64[ns]'),
-        "Danh mục": pd.Series(dtype='object'),
-        "Chi tiêu (VND)": pd.Series(dtype='float')
-    })
-    st.info("Chưa có dữ liệu chi tiêu.")
-
-
-# --- Các hàm tính toán (Giữ nguyên) ---
-def thu_nhap_theo_thang(df, nam):
-    # Lọc các bản ghi rỗng (nếu có)
-    df = df.dropna(subset=["Ngày"])
-    df = df[df["Ngày"].dt.year == nam]
-    if df.empty:
-        return pd.DataFrame({"Tháng": [f"Tháng {i}" for i in range(1, 13)], "Thu nhập (VND)": [0] * 12})
-
-    df["Tháng"] = df["Ngày"].dt.month
-    monthly = df.groupby("Tháng")["Thu nhập (VND)"].sum().reset_index()
+# --- Các hàm tính toán ---
+# Tổng theo tháng được tính sẵn ở backend (/reports/.../aggregate), chỉ tải tối đa 12 dòng mỗi năm
+def tong_theo_thang(user_id, nam, loai, cot):
+    monthly = fetch_data(
+        f"/reports/{user_id}/aggregate?bucket=month&type={loai}&start={nam}-01-01&end={nam}-12-31"
+    )
+    full_months = pd.DataFrame({"Tháng": range(1, 13)})
+    if monthly.empty:
+        monthly = pd.DataFrame({"Tháng": pd.Series(dtype='int'), cot: pd.Series(dtype='float')})
+    else:
+        monthly["Tháng"] = pd.to_datetime(monthly["bucket"]).dt.month
+        monthly = monthly.rename(columns={"total": cot})[["Tháng", cot]]
 
     # Tạo khung 12 tháng
-    full_months = pd.DataFrame({"Tháng": range(1, 13)})
     monthly_full = full_months.merge(monthly, on="Tháng", how="left").fillna(0)
-    monthly_full["Thu nhập (VND)"] = monthly_full["Thu nhập (VND)"].astype(int)
+    monthly_full[cot] = monthly_full[cot].astype(int)
     monthly_full["Tháng"] = monthly_full["Tháng"].apply(lambda x: f"Tháng {x}")
 
     return monthly_full
 
 
-def chi_tieu_theo_thang(df, nam):
-    # Lọc các bản ghi rỗng (nếu có)
-    df = df.dropna(subset=["Ngày"])
-    df = df[df["Ngày"].dt.year == nam]
-    if df.empty:
-        return pd.DataFrame({"Tháng": [f"Tháng {i}" for i in range(1, 13)], "Chi tiêu (VND)": [0] * 12})
+def thu_nhap_theo_thang(user_id, nam):
+    return tong_theo_thang(user_id, nam, "income", "Thu nhập (VND)")
 
-    df["Tháng"] = df["Ngày"].dt.month
-    monthly = df.groupby("Tháng")["Chi tiêu (VND)"].sum().reset_index()
 
-    # Tạo khung 12 tháng
-    full_months = pd.DataFrame({"Tháng": range(1, 13)})
-    monthly_full = full_months.merge(monthly, on="Tháng", how="left").fillna(0)
-    monthly_full["Chi tiêu (VND)"] = monthly_full["Chi tiêu (VND)"].astype(int)
-    monthly_full["Tháng"] = monthly_full["Tháng"].apply(lambda x: f"Tháng {x}")
-
-    return monthly_full
+def chi_tieu_theo_thang(user_id, nam):
+    return tong_theo_thang(user_id, nam, "expense", "Chi tiêu (VND)")
 
 
 # --- CHỌN NĂM ---
@@ -164,7 +120,7 @@ st.divider()
 # --- Logic vẽ biểu đồ ---
 if selected == "Thu nhập":
 
-    monthly_income = thu_nhap_theo_thang(income_data, nam_chon)
+    monthly_income = thu_nhap_theo_thang(USER_ID, nam_chon)
     max_value = monthly_income["Thu nhập (VND)"].max()
 
     fig = px.bar(
@@ -181,7 +137,7 @@ if selected == "Thu nhập":
     st.plotly_chart(fig, use_container_width=True)
 
 elif selected == "Chi tiêu":
-    monthly_expense = chi_tieu_theo_thang(expense_data, nam_chon)
+    monthly_expense = chi_tieu_theo_thang(USER_ID, nam_chon)
     max_value = monthly_expense["Chi tiêu (VND)"].max()
     fig = px.bar(
         monthly_expense,
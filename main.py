@@ -1,11 +1,25 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from database import Base, engine
-from routers import users, incomes, expense, budgets, budgets1,settings, summaries
+from fastapi.responses import JSONResponse, Response
+from database import (Base, engine, start_query_stats, stop_query_stats, start_write_tracking, stop_write_tracking,
+                      READ_YOUR_WRITES_COOKIE, READ_YOUR_WRITES_SECONDS)
+from migrations import run_migrations, ensure_year_partitions, DB_PARTITION_BY_YEAR
+from crud import detect_note_search_indexes
+from routers import users, incomes, expense, budgets, budgets1,settings, summaries, reports, imports, search, transactions, categories
+from routers.pagination import NEXT_CURSOR_HEADER
+import json
+import os
+import time
 import traceback
 
+# Bật để chèn thêm khóa "_debug" (số truy vấn, thời gian DB) vào cuối các response JSON dạng object
+DB_TIMING_DEBUG = os.getenv("DB_TIMING_DEBUG", "false").lower() in ("1", "true", "yes")
+
+run_migrations(engine)
 Base.metadata.create_all(engine)
+if DB_PARTITION_BY_YEAR:
+    ensure_year_partitions(engine)
+detect_note_search_indexes(engine)
 app = FastAPI(
     title="Quản lý chi tiêu cá nhân",
     version="1.0",
@@ -17,13 +31,52 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+# Đếm số câu lệnh SQL và thời gian DB của từng request, trả về qua header Server-Timing;
+# đồng thời ghi nhận user có dữ liệu được commit trong request để đặt cookie ghim đọc từ primary
+@app.middleware("http")
+async def db_timing_middleware(request: Request, call_next):
+    stats, token = start_query_stats()
+    written, write_token = start_write_tracking()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        stop_query_stats(token)
+        stop_write_tracking(write_token)
+    total_ms = (time.perf_counter() - started) * 1000
+    db_ms = stats.duration * 1000
+
+    if DB_TIMING_DEBUG and response.headers.get("content-type", "").startswith("application/json"):
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        payload = json.loads(body) if body else None
+        if isinstance(payload, dict):
+            payload["_debug"] = {"db_queries": stats.count, "db_ms": round(db_ms, 2), "total_ms": round(total_ms, 2)}
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+        response = Response(content=body, status_code=response.status_code, headers=headers, media_type="application/json")
+
+    response.headers["Server-Timing"] = (
+        f'db;dur={db_ms:.2f};desc="{stats.count} queries", app;dur={total_ms:.2f}'
+    )
+    # Ghim đọc từ primary dùng chung giữa các worker (xem database.READ_YOUR_WRITES_COOKIE)
+    for user_id in written:
+        response.set_cookie(READ_YOUR_WRITES_COOKIE.format(user_id), "1",
+                            max_age=max(1, round(READ_YOUR_WRITES_SECONDS)), httponly=True, samesite="lax")
+    return response
+
 app.include_router(users.router)
+app.include_router(categories.router)
 app.include_router(incomes.router)
 app.include_router(expense.router)
+app.include_router(transactions.router)
 app.include_router(settings.router)
 app.include_router(summaries.router)
+app.include_router(reports.router)
+app.include_router(imports.router)
+app.include_router(search.router)
 
 app.include_router(budgets.router)
 app.include_router(budgets1.router)
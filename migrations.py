@@ -0,0 +1,548 @@
+import argparse
+import os
+import sys
+from datetime import date, datetime
+from sqlalchemy import (Column, Date, DateTime, DECIMAL, Enum, Index, Integer, MetaData, String, Table,
+                        bindparam, column, delete, event, func, inspect, literal, select, table, text)
+from sqlalchemy.orm import Session
+from database import engine
+from sqlalchemy.exc import IntegrityError
+from models import CategoryType, normalize_category_name, NOTE_SEARCH_TABLES, note_search_ddl
+
+# Nâng cấp CSDL đã tồn tại (create_all không sửa bảng cũ).
+# Mỗi bước là một hàm idempotent nhận connection, tên bước đã chạy được lưu trong schema_migrations.
+# Các bước chỉ dùng tên bảng/cột cố định (không dùng model) vì model sẽ còn thay đổi về sau.
+DB_PARTITION_BY_YEAR = os.getenv("DB_PARTITION_BY_YEAR", "false").lower() in ("1", "true", "yes")
+PARTITIONED_TABLES = {"incomes": "income_id", "expenses": "expense_id"}
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", migration_metadata,
+    Column("name", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+def migration(fn):
+    MIGRATIONS.append(fn)
+    return fn
+
+
+#---- HÀM HỖ TRỢ DDL ----
+def _quote(conn, name):
+    return conn.dialect.identifier_preparer.quote(name)
+
+def _column_names(conn, table):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+def _index_names(conn, table):
+    return {ix["name"] for ix in inspect(conn).get_indexes(table)}
+
+def _create_index(conn, table, name, columns, unique=False):
+    if name in _index_names(conn, table):
+        return
+    cols = ", ".join(_quote(conn, c) for c in columns)
+    conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({cols})"))
+
+def _drop_index(conn, table, name):
+    if name not in _index_names(conn, table):
+        return
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"DROP INDEX {name} ON {table}"))
+    else:
+        conn.execute(text(f"DROP INDEX {name}"))
+
+
+#---- CÁC BƯỚC MIGRATION ----
+@migration
+def add_composite_indexes(conn):
+    for table in ("incomes", "expenses"):
+        _create_index(conn, table, f"ix_{table}_user_date", ("user_id", "date"))
+        _create_index(conn, table, f"ix_{table}_user_category_date", ("user_id", "category_id", "date"))
+    _create_index(conn, "budget", "ix_budget_user_month_category", ("user_id", "month", "category_id"))
+    _create_index(conn, "monthly_summary", "ix_monthly_summary_user_month", ("user_id", "month"))
+
+
+# Cột month dạng chuỗi -> cột period kiểu DATE (ngày đầu tháng)
+@migration
+def convert_month_to_period(conn):
+    from crud import parse_period
+
+    for table, pk, old_index, new_index, index_columns in (
+        ("budget", "budget_id", "ix_budget_user_month_category",
+         "ix_budget_user_period_category", ("user_id", "period", "category_id")),
+        ("monthly_summary", "summary_id", "ix_monthly_summary_user_month",
+         "ix_monthly_summary_user_period", ("user_id", "period")),
+    ):
+        columns = _column_names(conn, table)
+        if "period" not in columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN period DATE NULL"))
+        if "month" in columns:
+            invalid = []
+            rows = conn.execute(text(f"SELECT {pk}, month FROM {table} WHERE period IS NULL")).all()
+            for row_id, month in rows:
+                period = parse_period(month)
+                if isinstance(period, dict):
+                    invalid.append(row_id)
+                    continue
+                conn.execute(text(f"UPDATE {table} SET period = :period WHERE {pk} = :id"),
+                             {"period": period, "id": row_id})
+            if invalid:
+                raise RuntimeError(f"Không đọc được cột month của {table} với {pk} = {invalid}, hãy sửa tay rồi chạy lại.")
+            _create_index(conn, table, new_index, index_columns)
+            _drop_index(conn, table, old_index)
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN month"))
+        _create_index(conn, table, new_index, index_columns)
+        # SQLite không đổi được ràng buộc NOT NULL của cột đã có
+        if conn.dialect.name == "mysql":
+            conn.execute(text(f"ALTER TABLE {table} MODIFY period DATE NOT NULL"))
+
+
+# Quy tắc "một khoản thu/chi cho mỗi danh mục mỗi ngày" do CSDL đảm bảo
+@migration
+def add_unique_transaction_keys(conn):
+    for table in ("incomes", "expenses"):
+        duplicates = conn.execute(text(
+            f"SELECT user_id, category_id, {_quote(conn, 'date')}, COUNT(*) FROM {table} "
+            f"GROUP BY user_id, category_id, {_quote(conn, 'date')} HAVING COUNT(*) > 1"
+        )).all()
+        if duplicates:
+            raise RuntimeError(
+                f"Bảng {table} có bản ghi trùng (user_id, category_id, date): {[tuple(r) for r in duplicates[:20]]}"
+                ", hãy gộp/xóa bản ghi trùng rồi chạy lại."
+            )
+        _create_index(conn, table, f"uq_{table}_user_category_date", ("user_id", "category_id", "date"), unique=True)
+        _drop_index(conn, table, f"ix_{table}_user_category_date")
+
+
+# Cột normalized_name + index UNIQUE (normalized_name, type) cho danh mục.
+# Các danh mục trùng tên sau khi chuẩn hóa (vd "Ăn uống"/"ăn uống") được gộp vào danh mục có id nhỏ nhất.
+@migration
+def add_category_normalized_name(conn):
+    if "normalized_name" not in _column_names(conn, "categories"):
+        conn.execute(text("ALTER TABLE categories ADD COLUMN normalized_name VARCHAR(100) NULL"))
+
+    keep = {}       # (normalized_name, type) -> category_id giữ lại
+    merged = {}     # category_id bị gộp -> category_id giữ lại
+    rows = conn.execute(text("SELECT category_id, name, type FROM categories ORDER BY category_id")).all()
+    for category_id, name, type_ in rows:
+        normalized = normalize_category_name(name)
+        if (normalized, type_) in keep:
+            merged[category_id] = keep[(normalized, type_)]
+            continue
+        keep[(normalized, type_)] = category_id
+        conn.execute(text("UPDATE categories SET normalized_name = :n WHERE category_id = :id"),
+                     {"n": normalized, "id": category_id})
+
+    for old_id, new_id in merged.items():
+        for table in ("incomes", "expenses", "budget"):
+            try:
+                conn.execute(text(f"UPDATE {table} SET category_id = :new WHERE category_id = :old"),
+                             {"new": new_id, "old": old_id})
+            except IntegrityError:
+                raise RuntimeError(
+                    f"Không gộp được danh mục {old_id} vào {new_id}: bảng {table} có bản ghi trùng ngày "
+                    "ở cả hai danh mục, hãy gộp/xóa bản ghi trùng rồi chạy lại."
+                )
+        conn.execute(text("DELETE FROM categories WHERE category_id = :id"), {"id": old_id})
+
+    _create_index(conn, "categories", "uq_categories_normalized_name_type", ("normalized_name", "type"), unique=True)
+    if conn.dialect.name == "mysql":
+        conn.execute(text("ALTER TABLE categories MODIFY normalized_name VARCHAR(100) NOT NULL"))
+
+
+# MonthlySummary được cộng dồn khi ghi thu/chi: gộp các dòng trùng (user_id, period),
+# tính lại toàn bộ từ incomes/expenses rồi thay index thường bằng index UNIQUE
+@migration
+def maintain_monthly_summaries(conn):
+    date_col = _quote(conn, "date")
+    totals = {}     # (user_id, ngày đầu tháng) -> [tổng thu, tổng chi]
+    for index, table in enumerate(("incomes", "expenses")):
+        rows = conn.execute(text(
+            f"SELECT user_id, {date_col}, SUM(amount) FROM {table} GROUP BY user_id, {date_col}"
+        )).all()
+        for user_id, day, amount in rows:
+            if isinstance(day, str):
+                day = date.fromisoformat(day[:10])
+            key = (user_id, day.replace(day=1))
+            totals.setdefault(key, [0, 0])[index] += amount or 0
+
+    keep = {}
+    for summary_id, user_id, period in conn.execute(text(
+            "SELECT summary_id, user_id, period FROM monthly_summary ORDER BY summary_id")).all():
+        if isinstance(period, str):
+            period = date.fromisoformat(period[:10])
+        if (user_id, period) in keep:
+            conn.execute(text("DELETE FROM monthly_summary WHERE summary_id = :id"), {"id": summary_id})
+        else:
+            keep[(user_id, period)] = summary_id
+
+    for (user_id, period), summary_id in keep.items():
+        total_income, total_expense = totals.pop((user_id, period), (0, 0))
+        conn.execute(text(
+            "UPDATE monthly_summary SET total_income = :i, total_expense = :e, balance = :b WHERE summary_id = :id"
+        ), {"i": total_income, "e": total_expense, "b": total_income - total_expense, "id": summary_id})
+    for (user_id, period), (total_income, total_expense) in totals.items():
+        conn.execute(text(
+            "INSERT INTO monthly_summary (user_id, period, total_income, total_expense, balance, created_at) "
+            "VALUES (:u, :p, :i, :e, :b, :c)"
+        ), {"u": user_id, "p": period, "i": total_income, "e": total_expense,
+            "b": total_income - total_expense, "c": datetime.now()})
+
+    _create_index(conn, "monthly_summary", "uq_monthly_summary_user_period", ("user_id", "period"), unique=True)
+    _drop_index(conn, "monthly_summary", "ix_monthly_summary_user_period")
+
+
+# Cột import_hash để nhập sao kê ngân hàng không bị trùng (index UNIQUE do include_import_hash_in_daily_key tạo)
+@migration
+def add_import_hash(conn):
+    for table in ("incomes", "expenses"):
+        if "import_hash" not in _column_names(conn, table):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN import_hash VARCHAR(64) NULL"))
+
+
+# Index toàn văn cho cột note: FULLTEXT trên MySQL (bảng đã phân vùng không hỗ trợ -> bỏ qua, tìm kiếm
+# dùng LIKE), FTS5 + trigger trên SQLite rồi nạp lại index từ dữ liệu sẵn có
+@migration
+def add_note_search_index(conn):
+    for table, pk in NOTE_SEARCH_TABLES.items():
+        if conn.dialect.name == "mysql":
+            if f"ft_{table}_note" not in _index_names(conn, table) and not _year_partitions(conn, table):
+                conn.execute(text(f"CREATE FULLTEXT INDEX ft_{table}_note ON {table} (note)"))
+        elif conn.dialect.name == "sqlite":
+            for statement in note_search_ddl(table, pk):
+                conn.execute(text(statement))
+            conn.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+
+
+# Cột budget.spent (tổng chi của danh mục trong kỳ) được cộng dồn khi ghi khoản chi; tính lại cho ngân sách đã có
+@migration
+def add_budget_spent(conn):
+    if "spent" not in _column_names(conn, "budget"):
+        conn.execute(text("ALTER TABLE budget ADD COLUMN spent DECIMAL(12, 2) NOT NULL DEFAULT 0"))
+    date_col = _quote(conn, "date")
+    for budget_id, user_id, category_id, period in conn.execute(text(
+            "SELECT budget_id, user_id, category_id, period FROM budget")).all():
+        if isinstance(period, str):
+            period = date.fromisoformat(period[:10])
+        next_period = date(period.year + period.month // 12, period.month % 12 + 1, 1)
+        spent = conn.execute(text(
+            f"SELECT SUM(amount) FROM expenses WHERE user_id = :u AND category_id = :c "
+            f"AND {date_col} >= :start AND {date_col} < :end"
+        ), {"u": user_id, "c": category_id, "start": period, "end": next_period}).scalar()
+        conn.execute(text("UPDATE budget SET spent = :s WHERE budget_id = :id"), {"s": spent or 0, "id": budget_id})
+
+
+# Bảng rollup tổng thu/chi theo (user, tháng, loại, danh mục); được thay bằng rollup theo ngày
+# (convert_rollup_to_daily) nên không nạp dữ liệu ở bước này
+@migration
+def add_category_monthly_rollup(conn):
+    Table(
+        "category_monthly_rollup", MetaData(),
+        Column("rollup_id", Integer, primary_key=True, autoincrement=True),
+        Column("user_id", Integer, nullable=False),
+        Column("period", Date, nullable=False),
+        Column("type", Enum(CategoryType), nullable=False),
+        Column("category_id", Integer),
+        Column("total", DECIMAL(14, 2), nullable=False, default=0),
+        Column("count", Integer, nullable=False, default=0),
+        Index("uq_category_monthly_rollup_key", "user_id", "period", "type", "category_id", unique=True),
+    ).create(conn, checkfirst=True)
+
+
+# Phiên bản dữ liệu theo user (ETag cho GET có điều kiện)
+@migration
+def add_user_data_version(conn):
+    if "data_version" not in _column_names(conn, "users"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
+
+
+# Quy tắc một khoản/danh mục/ngày chỉ áp dụng cho khoản nhập tay: khóa UNIQUE gồm cả import_hash,
+# khoản nhập tay có import_hash = '' (NULL không bị so trùng trong index UNIQUE). Khoản nhập từ sao kê
+# được chống trùng bằng import_hash (chứa cả ngày và danh mục) nên không cần index (user_id, date, import_hash)
+@migration
+def include_import_hash_in_daily_key(conn):
+    for table in ("incomes", "expenses"):
+        # Bỏ index cũ trước khi ghi '': các khoản nhập tay cùng ngày (khác danh mục) sẽ trùng trong index này
+        _drop_index(conn, table, f"uq_{table}_user_date_import_hash")
+        conn.execute(text(f"UPDATE {table} SET import_hash = '' WHERE import_hash IS NULL"))
+        # SQLite không đổi được ràng buộc NOT NULL của cột đã có (các lệnh INSERT luôn ghi '')
+        if conn.dialect.name == "mysql":
+            conn.execute(text(f"ALTER TABLE {table} MODIFY import_hash VARCHAR(64) NOT NULL DEFAULT ''"))
+        _create_index(conn, table, f"uq_{table}_user_category_date_import",
+                      ("user_id", "category_id", "date", "import_hash"), unique=True)
+        _drop_index(conn, table, f"uq_{table}_user_category_date")
+
+
+# Rollup theo (user, ngày, loại, danh mục) thay cho rollup theo tháng: khoản nhập từ sao kê có thể có nhiều khoản
+# cùng danh mục/ngày, và báo cáo theo ngày/tuần cũng đọc được từ rollup. Nạp lại từ incomes/expenses
+@migration
+def convert_rollup_to_daily(conn):
+    Table(
+        "category_daily_rollup", MetaData(),
+        Column("rollup_id", Integer, primary_key=True, autoincrement=True),
+        Column("user_id", Integer, nullable=False),
+        Column("date", Date, nullable=False),
+        Column("type", Enum(CategoryType), nullable=False),
+        Column("category_id", Integer),
+        Column("total", DECIMAL(14, 2), nullable=False, default=0),
+        Column("count", Integer, nullable=False, default=0),
+        Index("uq_category_daily_rollup_key", "user_id", "date", "type", "category_id", unique=True),
+    ).create(conn, checkfirst=True)
+    rebuild_category_rollups(conn)
+    if inspect(conn).has_table("category_monthly_rollup"):
+        conn.execute(text("DROP TABLE category_monthly_rollup"))
+
+
+#---- ROLLUP BÁO CÁO ----
+# Tính lại category_daily_rollup từ incomes/expenses (toàn bộ hoặc một user) ngay trong SQL, dùng khi nghi
+# rollup bị lệch; tăng data_version để cache/ETag response đã tính từ rollup cũ hết hiệu lực
+rollup_table = table("category_daily_rollup", column("user_id"), column("date"), column("type"),
+                     column("category_id"), column("total"), column("count"))
+users_table = table("users", column("user_id"), column("data_version"))
+
+def rebuild_category_rollups(conn, user_id=None):
+    cleanup = delete(rollup_table)
+    if user_id is not None:
+        cleanup = cleanup.where(rollup_table.c.user_id == user_id)
+    conn.execute(cleanup)
+    for type_, source in (("income", "incomes"), ("expense", "expenses")):
+        t = table(source, column("user_id"), column("category_id"), column("date"), column("amount"))
+        stmt = select(t.c.user_id, t.c.date, literal(type_), t.c.category_id, func.sum(t.c.amount), func.count())
+        if user_id is not None:
+            stmt = stmt.where(t.c.user_id == user_id)
+        stmt = stmt.group_by(t.c.user_id, t.c.date, t.c.category_id)
+        conn.execute(rollup_table.insert().from_select(
+            ["user_id", "date", "type", "category_id", "total", "count"], stmt,
+        ))
+    bump = users_table.update().values(data_version=users_table.c.data_version + 1)
+    if user_id is not None:
+        bump = bump.where(users_table.c.user_id == user_id)
+    conn.execute(bump)
+
+
+#---- CHẠY MIGRATION ----
+# Gọi trước create_all: CSDL mới (chưa có bảng) chỉ đánh dấu mọi bước là đã chạy,
+# create_all sau đó sẽ tạo lược đồ mới nhất
+def run_migrations(bind=engine):
+    with bind.begin() as conn:
+        fresh = not inspect(conn).has_table("users")
+        migration_metadata.create_all(conn)
+        applied = set(conn.execute(select(schema_migrations.c.name)).scalars())
+        for step in MIGRATIONS:
+            if step.__name__ in applied:
+                continue
+            if not fresh:
+                print(f">>> Migration: {step.__name__}")
+                step(conn)
+            conn.execute(schema_migrations.insert().values(name=step.__name__, applied_at=datetime.now()))
+
+
+#---- PHÂN VÙNG THEO NĂM (chỉ MySQL) ----
+# incomes/expenses được chia RANGE theo YEAR(date): truy vấn theo tháng/năm chỉ đọc đúng phân vùng,
+# xóa/lưu trữ cả một năm là thao tác trên metadata.
+# Lưu ý giới hạn của MySQL: bảng phân vùng không có khóa ngoại và mọi khóa UNIQUE (kể cả khóa chính)
+# phải chứa cột date -> khóa chính đổi thành (id, date), các khóa ngoại của hai bảng bị bỏ;
+# cũng không hỗ trợ FULLTEXT -> index ft_*_note bị bỏ, tìm kiếm ghi chú quay về LIKE.
+def _partition_name(year):
+    return f"p{year}"
+
+def _year_partitions(conn, table):
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"
+    ), {"table": table}).scalars()
+    return {int(name[1:]) for name in rows if name != "pmax"}
+
+def _partition_clause(years):
+    parts = [f"PARTITION {_partition_name(y)} VALUES LESS THAN ({y + 1})" for y in years]
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ", ".join(parts)
+
+def partition_by_year(conn, through_year=None):
+    through_year = through_year or date.today().year + 1
+    for table, pk in PARTITIONED_TABLES.items():
+        existing = _year_partitions(conn, table)
+        if existing:
+            for year in range(max(existing) + 1, through_year + 1):
+                add_year_partition(conn, table, year)
+            continue
+
+        for fk in inspect(conn).get_foreign_keys(table):
+            conn.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {fk['name']}"))
+        _drop_index(conn, table, f"ft_{table}_note")
+        conn.execute(text(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY ({pk}, `date`)"))
+        first_year = conn.execute(text(f"SELECT MIN(YEAR(`date`)) FROM {table}")).scalar() or date.today().year
+        years = range(min(first_year, through_year), through_year + 1)
+        conn.execute(text(f"ALTER TABLE {table} PARTITION BY RANGE (YEAR(`date`)) ({_partition_clause(years)})"))
+
+def add_year_partition(conn, table, year):
+    if year in _year_partitions(conn, table):
+        return
+    conn.execute(text(
+        f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({_partition_clause([year])})"
+    ))
+
+# User có dữ liệu trong phân vùng một năm (đọc trước khi xóa/lưu trữ phân vùng)
+def _partition_users(conn, table, year):
+    return set(conn.execute(text(
+        f"SELECT DISTINCT user_id FROM {table} PARTITION ({_partition_name(year)})"
+    )).scalars())
+
+# Dữ liệu một năm của bảng không còn trong incomes/expenses: bỏ phần rollup tương ứng, trừ khỏi
+# monthly_summary và budget.spent, tăng data_version để cache/ETag response của các user đó hết hiệu lực.
+# (DDL phân vùng tự commit trên MySQL nên bước này chạy ngay sau trong giao dịch của conn;
+# nếu bị gián đoạn, chạy lại drop-year/archive-year hoặc rebuild-rollup)
+def _forget_year(conn, table, year, user_ids):
+    params = {"start": date(year, 1, 1), "end": date(year + 1, 1, 1)}
+    in_year = "period >= :start AND period < :end"
+    type_ = "income" if table == "incomes" else "expense"
+    date_col = _quote(conn, "date")
+    conn.execute(text(
+        f"DELETE FROM category_daily_rollup WHERE type = :type AND {date_col} >= :start AND {date_col} < :end"
+    ), {**params, "type": type_})
+    if table == "incomes":
+        conn.execute(text(f"UPDATE monthly_summary SET total_income = 0, balance = 0 - total_expense WHERE {in_year}"), params)
+    else:
+        conn.execute(text(f"UPDATE monthly_summary SET total_expense = 0, balance = total_income WHERE {in_year}"), params)
+        conn.execute(text(f"UPDATE budget SET spent = 0 WHERE {in_year}"), params)
+    if user_ids:
+        conn.execute(
+            text("UPDATE users SET data_version = data_version + 1 WHERE user_id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            {"ids": sorted(user_ids)},
+        )
+
+# Xóa hẳn dữ liệu một năm (không quét bảng)
+def drop_year_partition(conn, table, year):
+    if year in _year_partitions(conn, table):
+        user_ids = _partition_users(conn, table, year)
+        conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {_partition_name(year)}"))
+        _forget_year(conn, table, year, user_ids)
+
+# Chuyển dữ liệu một năm sang bảng riêng {table}_archive_{year} rồi bỏ phân vùng rỗng
+def archive_year_partition(conn, table, year):
+    if year not in _year_partitions(conn, table):
+        return
+    archive = f"{table}_archive_{year}"
+    user_ids = _partition_users(conn, table, year)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {archive} LIKE {table}"))
+    conn.execute(text(f"ALTER TABLE {archive} REMOVE PARTITIONING"))
+    conn.execute(text(f"ALTER TABLE {table} EXCHANGE PARTITION {_partition_name(year)} WITH TABLE {archive}"))
+    conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {_partition_name(year)}"))
+    _forget_year(conn, table, year, user_ids)
+
+# Gọi khi khởi động nếu bật DB_PARTITION_BY_YEAR: phân vùng lần đầu và luôn có sẵn phân vùng năm sau
+def ensure_year_partitions(bind=engine):
+    if bind.dialect.name != "mysql":
+        print("⚠️ Phân vùng theo năm chỉ hỗ trợ MySQL, bỏ qua.")
+        return
+    with bind.begin() as conn:
+        partition_by_year(conn)
+
+
+#---- KIỂM TRA TRUY VẤN NÓNG CÓ DÙNG INDEX ----
+# (tên truy vấn, hàm gọi đúng hàm crud với một Session, index mong đợi hoặc tuple các index đều chấp nhận được).
+# Câu lệnh được lấy từ chính các hàm crud (kể cả JOIN, cursor/LIMIT phân trang) rồi EXPLAIN nguyên văn
+def hot_queries():
+    import crud
+
+    start = date(2024, 1, 1)
+    cursor = crud.encode_cursor(date(2024, 1, 31), 2 ** 31 - 1)     # trang thứ hai: có điều kiện keyset
+    return [
+        ("get_incomes_by_month", lambda db: crud.get_incomes_by_month(db, 1, 2024, 1, cursor=cursor),
+         "ix_incomes_user_date"),
+        ("get_expenses_by_month", lambda db: crud.get_expenses_by_month(db, 1, 2024, 1, cursor=cursor),
+         "ix_expenses_user_date"),
+        ("create_budget (spent)", lambda db: crud._budget_spent(db, 1, 1, start),
+         "uq_category_daily_rollup_key"),
+        ("create_monthly_summary", lambda db: crud._rollup_totals(db, 1, start),
+         "uq_category_daily_rollup_key"),
+        ("aggregate_transactions (month)", lambda db: crud.aggregate_transactions(db, 1, "month", start, date(2024, 3, 31)),
+         "uq_category_daily_rollup_key"),
+        ("aggregate_transactions (week)", lambda db: crud.aggregate_transactions(db, 1, "week", start, date(2024, 1, 20)),
+         "uq_category_daily_rollup_key"),
+        ("get_category_by_name", lambda db: crud.get_category_by_name(db, "Ăn uống", CategoryType.expense),
+         "uq_categories_normalized_name_type"),
+        ("get_budgets_by_user_and_month", lambda db: crud.get_budgets_by_user_and_month(db, 1, "2024-01"),
+         "ix_budget_user_period_category"),
+        ("get_summary_by_user_and_month", lambda db: crud.get_summary_by_user_and_month(db, 1, 2024, 1),
+         "uq_monthly_summary_user_period"),
+    ]
+
+# Chạy hàm crud trong giao dịch (rollback ngay sau đó), ghi lại các câu SELECT nó gửi xuống driver
+def _captured_selects(conn, run):
+    captured = []
+
+    def capture(conn_, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", capture)
+    try:
+        with Session(bind=conn) as db:
+            run(db)
+    finally:
+        event.remove(conn, "before_cursor_execute", capture)
+        conn.rollback()
+    return captured
+
+def explain_hot_queries(bind=engine):
+    dialect = bind.dialect.name
+    prefix = "EXPLAIN QUERY PLAN" if dialect == "sqlite" else "EXPLAIN"
+    results = []
+    with bind.connect() as conn:
+        for name, run, expected_index in hot_queries():
+            expected = (expected_index,) if isinstance(expected_index, str) else expected_index
+            plan = []
+            for statement, parameters in _captured_selects(conn, run):
+                plan += [dict(row._mapping) for row in conn.exec_driver_sql(f"{prefix} {statement}", parameters)]
+            if dialect == "mysql":
+                used = any(row.get("key") in expected for row in plan)
+            else:
+                used = any(ix in str(row.get("detail", "")) for ix in expected for row in plan)
+            results.append((name, expected_index, used, plan))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nâng cấp và kiểm tra CSDL")
+    parser.add_argument("command", choices=["upgrade", "explain", "rebuild-rollup", "partition", "drop-year", "archive-year"])
+    parser.add_argument("year", type=int, nargs="?", help="năm cho drop-year/archive-year")
+    parser.add_argument("--user-id", type=int, help="chỉ tính lại rollup của một user (rebuild-rollup)")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        run_migrations()
+        print("✅ CSDL đã được nâng cấp.")
+    elif args.command == "rebuild-rollup":
+        with engine.begin() as conn:
+            rebuild_category_rollups(conn, args.user_id)
+        print("✅ Đã tính lại bảng rollup báo cáo.")
+    elif args.command == "explain":
+        ok = True
+        for name, expected_index, used, plan in explain_hot_queries():
+            ok = ok and used
+            expected = expected_index if isinstance(expected_index, str) else " / ".join(expected_index)
+            print(f"{'✅' if used else '🚨'} {name}: {expected} {'được dùng' if used else 'KHÔNG được dùng'}")
+            partitions = {row.get("partitions") for row in plan if row.get("partitions")}
+            if partitions:
+                print("     phân vùng:", ", ".join(sorted(partitions)))
+            if not used:
+                for row in plan:
+                    print("    ", row)
+        sys.exit(0 if ok else 1)
+    else:
+        if engine.dialect.name != "mysql":
+            sys.exit("⚠️ Phân vùng theo năm chỉ hỗ trợ MySQL.")
+        if args.command == "partition":
+            ensure_year_partitions()
+            print("✅ Đã phân vùng incomes/expenses theo năm (index ft_*_note đã bị bỏ, khởi động lại API để tìm kiếm chuyển sang LIKE).")
+        else:
+            if args.year is None:
+                parser.error("cần chỉ định năm")
+            action = drop_year_partition if args.command == "drop-year" else archive_year_partition
+            with engine.begin() as conn:
+                for table in PARTITIONED_TABLES:
+                    action(conn, table, args.year)
+            print(f"✅ Đã {'xóa' if args.command == 'drop-year' else 'lưu trữ'} dữ liệu năm {args.year}.")
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DECIMAL, Date, DateTime, Enum, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DECIMAL, Date, DateTime, Enum, ForeignKey, Text, Index, DDL, event
+from sqlalchemy.orm import relationship, validates
 from database import Base
 import enum
+import unicodedata
 from datetime import datetime
 
 class CategoryType(enum.Enum):
@@ -31,19 +32,27 @@ class User(Base):
     username = Column(String(100), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     email = Column(String(255), unique=True, nullable=False)
+    # Tăng 1 mỗi lần dữ liệu của user được commit (database._bump_data_versions), dùng làm ETag cho các route GET
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     incomes = relationship('Income', back_populates='user', cascade='all, delete-orphan')
     expenses = relationship('Expense', back_populates='user', cascade='all, delete-orphan')
     budget = relationship('Budget', back_populates='user', cascade='all, delete-orphan')
     settings = relationship('Settings', back_populates='user', uselist=False, cascade='all, delete-orphan')
     summaries = relationship("MonthlySummary", back_populates="user", cascade="all, delete-orphan")
+    rollups = relationship("CategoryDailyRollup", back_populates="user", cascade="all, delete-orphan")
 
 
 #---- CATEGORIES ----
+# Tên danh mục dùng để so khớp: chuẩn Unicode NFC, bỏ khoảng trắng thừa, casefold ("  Ăn  Uống" -> "ăn uống")
+def normalize_category_name(name: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", name).split()).casefold()
+
 class Category(Base):
     __tablename__ = 'categories'
     category_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(100), nullable=False)
+    normalized_name = Column(String(100), nullable=False)
     type = Column(Enum(CategoryType), nullable=False)
     description = Column(Text)
 
@@ -51,6 +60,16 @@ class Category(Base):
     expenses = relationship("Expense", back_populates='category')
     budget = relationship("Budget", back_populates='category')
 
+    # Tra cứu danh mục theo tên là tra cứu điểm trên index, không cần func.lower() trên cột
+    __table_args__ = (
+        Index('uq_categories_normalized_name_type', 'normalized_name', 'type', unique=True),
+    )
+
+    @validates('name')
+    def _set_normalized_name(self, key, name):
+        self.normalized_name = normalize_category_name(name)
+        return name
+
 #---- INCOME ----
 class Income(Base):
     __tablename__ = 'incomes'
@@ -60,10 +79,22 @@ class Income(Base):
     amount = Column(DECIMAL(12, 2), nullable=False)
     date = Column(Date, nullable=False)
     note = Column(Text)
+    # sha256 nội dung dòng sao kê đã nhập; '' nếu nhập tay (không dùng NULL vì index UNIQUE không so trùng NULL)
+    import_hash = Column(String(64), nullable=False, default="", server_default="")
 
     user = relationship('User', back_populates='incomes')
     category = relationship('Category', back_populates='incomes')
 
+    # Các truy vấn theo tháng/năm/ngân sách đều lọc user_id + khoảng ngày (và có thể category_id);
+    # index thứ hai là UNIQUE: mỗi user chỉ có một khoản thu cho mỗi danh mục trong một ngày;
+    # index thứ ba chống nhập trùng một dòng sao kê (có cột date để dùng được với bảng phân vùng theo năm)
+    __table_args__ = (
+        Index('ix_incomes_user_date', 'user_id', 'date'),
+        # Một khoản nhập tay (import_hash = '') cho mỗi danh mục mỗi ngày; khoản nhập từ sao kê chỉ không được trùng import_hash
+        Index('uq_incomes_user_category_date_import', 'user_id', 'category_id', 'date', 'import_hash', unique=True),
+        Index('ft_incomes_note', 'note', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
 
 # ---- EXPENSE ----
 class Expense(Base):
@@ -74,10 +105,44 @@ class Expense(Base):
     amount = Column(DECIMAL(12, 2), nullable=False)
     date = Column(Date, nullable=False)
     note = Column(Text)
+    # sha256 nội dung dòng sao kê đã nhập; '' nếu nhập tay (không dùng NULL vì index UNIQUE không so trùng NULL)
+    import_hash = Column(String(64), nullable=False, default="", server_default="")
 
     user = relationship('User', back_populates='expenses')
     category = relationship('Category', back_populates='expenses')
 
+    __table_args__ = (
+        Index('ix_expenses_user_date', 'user_id', 'date'),
+        # Một khoản nhập tay (import_hash = '') cho mỗi danh mục mỗi ngày; khoản nhập từ sao kê chỉ không được trùng import_hash
+        Index('uq_expenses_user_category_date_import', 'user_id', 'category_id', 'date', 'import_hash', unique=True),
+        Index('ft_expenses_note', 'note', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
+
+#---- TÌM KIẾM GHI CHÚ ----
+# MySQL: index FULLTEXT ft_<bảng>_note (khai báo trong __table_args__ ở trên).
+# SQLite: bảng ảo FTS5 <bảng>_fts (external content, chỉ lưu index) được trigger đồng bộ khi thêm/sửa/xóa;
+# remove_diacritics để tìm "an sang" cũng khớp "ăn sáng"
+NOTE_SEARCH_TABLES = {"incomes": "income_id", "expenses": "expense_id"}
+
+def note_search_ddl(table, pk):
+    fts = f"{table}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(note, content='{table}', content_rowid='{pk}', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, note) VALUES (new.{pk}, new.note); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, note) VALUES ('delete', old.{pk}, old.note); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF note ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, note) VALUES ('delete', old.{pk}, old.note); "
+        f"INSERT INTO {fts}(rowid, note) VALUES (new.{pk}, new.note); END",
+    ]
+
+for _model in (Income, Expense):
+    for _statement in note_search_ddl(_model.__tablename__, NOTE_SEARCH_TABLES[_model.__tablename__]):
+        event.listen(_model.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
 #---- BUDGETS ----
 class Budget(Base):
     __tablename__ = 'budget'
@@ -85,11 +150,21 @@ class Budget(Base):
     user_id = Column(Integer, ForeignKey('users.user_id'))
     category_id = Column(Integer, ForeignKey('categories.category_id'))
     amount = Column(DECIMAL(12, 2), nullable=False)
-    month = Column(String(20), nullable=False)
+    period = Column(Date, nullable=False)   # ngày đầu tháng của kỳ ngân sách
+    spent = Column(DECIMAL(12, 2), default=0, nullable=False)   # tổng chi của danh mục trong kỳ, cộng dồn khi ghi khoản chi
 
     user = relationship('User', back_populates='budget')
     category = relationship('Category', back_populates='budget')
 
+    __table_args__ = (
+        Index('ix_budget_user_period_category', 'user_id', 'period', 'category_id'),
+    )
+
+    # Chuỗi "YYYY-MM" như trước, dùng cho thông báo và response
+    @property
+    def month(self):
+        return self.period.strftime("%Y-%m")
+
 #---- SETTINGS ----
 class Settings(Base):
     __tablename__ = 'settings'
@@ -108,7 +183,7 @@ class MonthlySummary(Base):
     __tablename__ = 'monthly_summary'
     summary_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.user_id'))
-    month = Column(String(20), nullable=False)
+    period = Column(Date, nullable=False)   # ngày đầu tháng
     total_income = Column(DECIMAL(12, 2), default=0, nullable=False)
     total_expense = Column(DECIMAL(12, 2), default=0, nullable=False)
     balance = Column(DECIMAL(12, 2), default=0, nullable=False)
@@ -116,3 +191,32 @@ class MonthlySummary(Base):
 
     user = relationship('User', back_populates='summaries')
 
+    # Mỗi user chỉ có một dòng tổng kết cho mỗi tháng (được cộng dồn khi ghi thu/chi)
+    __table_args__ = (
+        Index('uq_monthly_summary_user_period', 'user_id', 'period', unique=True),
+    )
+
+    @property
+    def month(self):
+        return self.period.strftime("%Y-%m")
+
+#---- ROLLUP THEO DANH MỤC/NGÀY (dùng cho báo cáo) ----
+# Tổng tiền và số giao dịch theo (user, ngày, loại, danh mục), cộng dồn trong cùng giao dịch với khoản thu/chi.
+# Khoản nhập từ sao kê không bị giới hạn một khoản/danh mục/ngày nên một dòng rollup có thể gộp nhiều giao dịch;
+# báo cáo theo ngày/tuần/tháng/quý/năm và tổng theo tháng đều cộng từ bảng này
+class CategoryDailyRollup(Base):
+    __tablename__ = 'category_daily_rollup'
+    rollup_id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
+    date = Column(Date, nullable=False)
+    type = Column(Enum(CategoryType), nullable=False)
+    category_id = Column(Integer, ForeignKey('categories.category_id'))
+    total = Column(DECIMAL(14, 2), default=0, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+
+    user = relationship('User', back_populates='rollups')
+
+    __table_args__ = (
+        Index('uq_category_daily_rollup_key', 'user_id', 'date', 'type', 'category_id', unique=True),
+    )
+
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database import get_db
-import crud
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_async_read_db
+import crud, crud_async
+from routers.cache import cached_response, is_past_month, is_past_period
 
 
 router = APIRouter(
@@ -11,24 +11,14 @@ router = APIRouter(
 )
 
 @router.get("/{user_id}/{month}")
-def get_budgets_summary(user_id: int, month: str, db: Session = Depends(get_db)):
+@cached_response(past=lambda p: is_past_period(p["month"]))
+async def get_budgets_summary(user_id: int, month: str, db: AsyncSession = Depends(get_async_read_db)):
     # 1. Xử lý tháng/năm
-    try:
-        if "-" in month:
-            part = month.split("-")
-            if len(part) != 2: raise ValueError
-            year, month_num = map(int, part)
-        else:
-            month_num = int(month)
-            year = datetime.now().year
+    period = crud.parse_period(month)
+    if isinstance(period, dict):
+        return {"message": period["error"], "data": []}
 
-        if not (1 <= month_num <= 12):
-            raise ValueError("Tháng không hợp lệ")
-
-    except ValueError as e:
-        return {"message": f"⚠️ Định dạng tháng không hợp lệ: {e}", "data": []}
-
-    kq = crud.get_budget_summary_for_month(db, user_id, year, month_num)
+    kq = await crud_async.get_budget_summary_for_month(db, user_id, period.year, period.month)
 
     if isinstance(kq, dict) and "error" in kq:
         return {"message": kq["error"], "data": []}
@@ -38,6 +28,7 @@ def get_budgets_summary(user_id: int, month: str, db: Session = Depends(get_db))
     return {"data": kq}
 
 @router.get("/check/{user_id}/{category_id}/{year}/{month}")
-def check_budget(user_id: int, category_id: int, year: int, month: int, db: Session = Depends(get_db)):
-    kq = crud.check_budget_exceeded(db, user_id, category_id, year, month)
+@cached_response(past=lambda p: is_past_month(p["year"], p["month"]))
+async def check_budget(user_id: int, category_id: int, year: int, month: int, db: AsyncSession = Depends(get_async_read_db)):
+    kq = await crud_async.check_budget_exceeded(db, user_id, category_id, year, month)
     return kq
\ No newline at end of file
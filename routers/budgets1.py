@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database import get_db
-import crud, schemas
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_async_read_db
+import crud_async, schemas
 from datetime import datetime
+from routers.cache import cached_response, is_past_period
 
 router = APIRouter(
     prefix="/budgets1",
@@ -10,8 +11,8 @@ router = APIRouter(
 )
 
 @router.post("/")
-def create_budget(user_id: int, budget: schemas.BudgetCreate, db: Session = Depends(get_db)):
-    kq = crud.create_budget(db, user_id, budget.category_id, budget.amount, budget.month)
+async def create_budget(user_id: int, budget: schemas.BudgetCreate, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.create_budget(db, user_id, budget.category_id, budget.amount, budget.month)
     if isinstance(kq, dict) and "error" in kq:
         return {"message": kq["error"]}
     return {
@@ -25,24 +26,25 @@ def create_budget(user_id: int, budget: schemas.BudgetCreate, db: Session = Depe
     }
 
 @router.put("/{budget_id}/")
-def update_budget(budget_id: int, budget: schemas.BudgetBase, db: Session = Depends(get_db)):
-    kq = crud.update_budget(db, budget_id, budget.category_id, budget.amount, budget.month)
+async def update_budget(budget_id: int, budget: schemas.BudgetBase, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.update_budget(db, budget_id, budget.category_id, budget.amount, budget.month)
     if not kq:
         return {"message": "⚠️ Ngân sách không tồn tại."}
     return kq
 
 
 @router.delete("/{budget_id}")
-def delete_budget(budget_id: int, category_id: int, db: Session = Depends(get_db)):
-    kq = crud.delete_budget(db, budget_id, category_id)
+async def delete_budget(budget_id: int, category_id: int, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.delete_budget(db, budget_id, category_id)
     if not kq:
         return {"message": "⚠️ Ngân sách không tồn tại."}
     return {"message": f"🗑️ Ngân sách cho danh mục {kq.category_name} của tháng {kq.month} đã bị xóa."}
 
 
 @router.get("/{user_id}/{month}")
-def get_budgets_by_month(user_id: int, month: str, db: Session = Depends(get_db)):
-    budgets = crud.get_budgets_by_user_and_month(db, user_id, month)
+@cached_response(past=lambda p: is_past_period(p["month"]))
+async def get_budgets_by_month(user_id: int, month: str, db: AsyncSession = Depends(get_async_read_db)):
+    budgets = await crud_async.get_budgets_by_user_and_month(db, user_id, month)
     if isinstance(budgets, dict) and "error" in budgets:
         return {"message": budgets["error"], "data": []}
 
@@ -55,7 +57,7 @@ def get_budgets_by_month(user_id: int, month: str, db: Session = Depends(get_db)
             "category_id": b.category_id,
             "category_name": b.category_name,
             "amount": b.amount,
-            "month": b.month
+            "month": b.period.strftime("%Y-%m")
         }
         for b in budgets
     ]
@@ -0,0 +1,220 @@
+import hashlib
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from enum import Enum
+from functools import wraps
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud_async
+from crud import parse_period
+from database import user_write_listeners
+from routers.pagination import NEXT_CURSOR_HEADER
+
+# Cache kết quả các route GET theo (route, user, tham số). Mọi ghi thu/chi/ngân sách/cài đặt của user
+# (xem database.user_write_listeners) xóa toàn bộ mục của user đó trong tiến trình hiện tại;
+# key còn gồm users.data_version nên worker khác ghi dữ liệu cũng làm mục cũ không còn được dùng.
+# Tháng/năm đã qua gần như không đổi nên TTL dài hơn.
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")     # "memory" hoặc "none"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+RESPONSE_CACHE_PAST_TTL = float(os.getenv("RESPONSE_CACHE_PAST_TTL_SECONDS", "86400"))
+
+
+# LRU trong bộ nhớ: vượt quá max_entries thì bỏ mục ít dùng nhất
+class MemoryLRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()     # key -> (user_id, hết hạn, giá trị)
+        self._user_keys = {}              # user_id -> các key của user
+        self._generations = {}            # user_id -> số lần bị xóa cache
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    # Bỏ qua nếu user vừa ghi dữ liệu trong lúc đang tính kết quả (generation đã đổi)
+    def set(self, user_id, key, value, ttl: float, generation: int):
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._remove(key)
+            self._entries[key] = (user_id, time.monotonic() + ttl, value)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in self._user_keys.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._user_keys.get(entry[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._user_keys[entry[0]]
+
+
+# Tắt cache (RESPONSE_CACHE_BACKEND=none)
+class NullCache:
+    def generation(self, user_id):
+        return 0
+
+    def get(self, key):
+        return None
+
+    def set(self, user_id, key, value, ttl: float, generation: int):
+        pass
+
+    def invalidate_user(self, user_id):
+        pass
+
+    def clear(self):
+        pass
+
+
+CACHE_BACKENDS = {
+    "memory": lambda: MemoryLRUCache(RESPONSE_CACHE_MAX_ENTRIES),
+    "none": NullCache,
+}
+
+response_cache = CACHE_BACKENDS.get(RESPONSE_CACHE_BACKEND, CACHE_BACKENDS["memory"])()
+
+# Thay backend (vd. một cache dùng chung giữa các worker có cùng các hàm get/set/invalidate_user)
+def set_response_cache(cache):
+    global response_cache
+    response_cache = cache
+
+def _invalidate_user(user_id):
+    response_cache.invalidate_user(int(user_id))
+
+user_write_listeners.append(_invalidate_user)
+
+
+def is_past_month(year: int, month: int) -> bool:
+    today = date.today()
+    return (year, month) < (today.year, today.month)
+
+def is_past_year(year: int) -> bool:
+    return year < date.today().year
+
+# Kỳ ngân sách dạng chuỗi ("YYYY-MM", ...) như tham số month của /budgets
+def is_past_period(month: str) -> bool:
+    period = parse_period(month)
+    return not isinstance(period, dict) and is_past_month(period.year, period.month)
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+_NOT_PARAMS = (AsyncSession, Request, Response)
+
+# Header trả về cùng ETag: client phải hỏi lại server (If-None-Match) trước khi dùng bản đã lưu
+CACHE_CONTROL = "private, no-cache"
+
+# ETag mạnh: băm (route, tham số, data_version) bằng sha1 nên giống nhau giữa các worker/tiến trình
+def make_etag(key) -> str:
+    return '"' + hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + '"'
+
+# If-None-Match có thể chứa nhiều ETag cách nhau bởi dấu phẩy, dạng W/"..." hoặc "*"
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+# Tên tham số Request/Response của route; thêm vào chữ ký của wrapper nếu route không khai báo
+# (FastAPI chỉ truyền Response cho một tham số nên dùng lại tham số sẵn có của route)
+def _request_params(fn):
+    signature = inspect.signature(fn)
+    params = list(signature.parameters.values())
+    names = {}
+    for cls, default_name in ((Request, "cache_request"), (Response, "cache_response")):
+        name = next((p.name for p in params if p.annotation is cls), None)
+        if name is None:
+            name = default_name
+            params.append(inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=cls))
+        names[cls] = name
+    return signature.replace(parameters=params), names[Request], names[Response]
+
+# Decorator đặt dưới @router.get(...) của route có tham số user_id.
+# past(params) -> True nếu kết quả thuộc tháng/năm đã qua (dùng TTL dài);
+# model: kiểu pydantic để chuyển kết quả là đối tượng ORM (như response_model của route).
+# Trả ETag theo data_version của user; If-None-Match khớp -> 304 mà không chạy route/serialize kết quả.
+# Lưu kết quả đã chuyển sang JSON cùng header X-Next-Cursor; lỗi (HTTPException) không được cache
+def cached_response(past=None, model=None):
+    adapter = TypeAdapter(model) if model is not None else None
+
+    def decorator(fn):
+        signature, request_name, response_name = _request_params(fn)
+        fn_params = inspect.signature(fn).parameters
+
+        @wraps(fn)
+        async def wrapper(**kwargs):
+            request, response = kwargs[request_name], kwargs[response_name]
+            kwargs = {name: value for name, value in kwargs.items() if name in fn_params}
+            user_id = int(kwargs["user_id"])
+            db = next(v for v in kwargs.values() if isinstance(v, AsyncSession))
+            params = {name: value for name, value in kwargs.items() if not isinstance(value, _NOT_PARAMS)}
+            version = await crud_async.get_data_version(db, user_id)
+            key = (fn.__module__, fn.__name__, _freeze(params), version)
+            etag = make_etag(key)
+            validators = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=validators)
+            response.headers.update(validators)
+
+            hit = response_cache.get(key)
+            if hit is not None:
+                body, headers = hit
+                response.headers.update(headers)
+                return body
+
+            generation = response_cache.generation(user_id)
+            result = await fn(**kwargs)
+            headers = {}
+            if NEXT_CURSOR_HEADER in response.headers:
+                headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+            ttl = RESPONSE_CACHE_PAST_TTL if past and past(params) else RESPONSE_CACHE_TTL
+            if adapter is not None:
+                result = adapter.validate_python(result, from_attributes=True)
+            body = jsonable_encoder(result)
+            response_cache.set(user_id, key, (body, headers), ttl, generation)
+            return body
+        wrapper.__signature__ = signature
+        return wrapper
+    return decorator
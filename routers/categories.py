@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import crud_async, schemas
+from database import get_async_read_db
+
+router = APIRouter(
+    prefix="/categories",
+    tags=["Categories"]
+)
+
+# Danh sách danh mục (tùy chọn lọc theo loại thu/chi), được cache trong tiến trình
+@router.get("/")
+async def get_categories(type: Optional[schemas.CategoryType] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return await crud_async.get_categories(db, type)
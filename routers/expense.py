@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-import crud, schemas
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud, crud_async, schemas
+from database import get_async_db, get_async_read_db
+from routers.pagination import page_response
+from routers.filters import transaction_filters
 from auth import verify_token
+from routers.cache import cached_response, is_past_month, is_past_year
 
 router = APIRouter(
     prefix="/expense",
@@ -11,34 +14,62 @@ router = APIRouter(
 
 # Tạo khoản chi
 @router.post("/")
-def create_expense(expense: schemas.ExpenseCreate, user_id: int, db: Session = Depends(get_db)):
-    kq = crud.create_expense(db, user_id, expense.category_name, expense.amount, expense.date, expense.note)
+async def create_expense(expense: schemas.ExpenseCreate, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.create_expense(db, user_id, expense.category_name, expense.amount, expense.date, expense.note)
     if isinstance(kq, dict) and "error" in kq:
         raise HTTPException(status_code=404, detail=kq["error"])
     return kq
 
-# Lấy tất cả khoản chi của 1 user
+# Thêm nhiều khoản chi trong một lần gọi; kết quả báo riêng cho từng phần tử
+@router.post("/batch")
+async def create_expenses_batch(items: list[schemas.ExpenseCreate], user_id: int, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.create_expenses_batch(db, user_id, items)
+    if "error" in kq:
+        raise HTTPException(status_code=400, detail=kq["error"])
+    return kq
+
+# Lấy tất cả khoản chi của 1 user (phân trang theo cursor, lọc theo ngày/danh mục/ghi chú)
 @router.get("/{user_id}")
-def get_all_expenses(user_id: int, db: Session = Depends(get_db)):
-    return crud.get_expenses_by_user(db, user_id)
+@cached_response()
+async def get_all_expenses(user_id: int, response: Response, cursor: str = None,
+                    limit: int = Query(crud.TRANSACTION_PAGE_SIZE, ge=1, le=crud.TRANSACTION_PAGE_MAX),
+                    filters: dict = Depends(transaction_filters),
+                    db: AsyncSession = Depends(get_async_read_db)):
+    page = await crud_async.get_expenses_by_user(db, user_id, cursor, limit, **filters)
+    return page_response(page, response)
 
 # Lấy khoản chi theo tháng
 @router.get("/{user_id}/month/{year}/{month}")
-def get_expense_by_month(user_id: int, year: int, month: int, db: Session = Depends(get_db)):
-    return crud.get_expenses_by_month(db, user_id, year, month)
+@cached_response(past=lambda p: is_past_month(p["year"], p["month"]))
+async def get_expense_by_month(user_id: int, year: int, month: int, response: Response, cursor: str = None,
+                    limit: int = Query(crud.TRANSACTION_PAGE_SIZE, ge=1, le=crud.TRANSACTION_PAGE_MAX),
+                    filters: dict = Depends(transaction_filters),
+                    db: AsyncSession = Depends(get_async_read_db)):
+    page = await crud_async.get_expenses_by_month(db, user_id, year, month, cursor, limit, **filters)
+    return page_response(page, response)
+
+# Lấy khoản chi theo năm
+@router.get("/{user_id}/year/{year}")
+@cached_response(past=lambda p: is_past_year(p["year"]))
+async def get_expense_by_year(user_id: int, year: int, response: Response, cursor: str = None,
+                    limit: int = Query(crud.TRANSACTION_PAGE_SIZE, ge=1, le=crud.TRANSACTION_PAGE_MAX),
+                    filters: dict = Depends(transaction_filters),
+                    db: AsyncSession = Depends(get_async_read_db)):
+    page = await crud_async.get_expenses_by_year(db, user_id, year, cursor, limit, **filters)
+    return page_response(page, response)
 
 # Cập nhật khoản chi
 @router.put("/{expense_id}")
-def update_expense(expense_id: int, update_data: schemas.ExpenseUpdate, db: Session = Depends(get_db)):
-    kq = crud.update_expense(db, expense_id, update_data.category_name, update_data.amount, update_data.date, update_data.note)
+async def update_expense(expense_id: int, update_data: schemas.ExpenseUpdate, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.update_expense(db, expense_id, update_data.category_name, update_data.amount, update_data.date, update_data.note)
     if not kq:
         return {"error": "⚠️ Khoản chi không tồn tại."}
     return kq
 
 # Xóa khoản chi
 @router.delete("/{expense_id}")
-def delete_expense(expense_id: int, db: Session = Depends(get_db)):
-    kq = crud.delete_expense(db, expense_id)
+async def delete_expense(expense_id: int, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.delete_expense(db, expense_id)
     if not kq:
         return {"error": "⚠️ Khoản chi không tồn tại."}
     return {"message": "🗑️ Xóa khoản chi thành công!"}
\ No newline at end of file
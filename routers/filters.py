@@ -0,0 +1,7 @@
+from datetime import date
+from typing import Optional
+
+# Tham số lọc dùng chung cho các route danh sách giao dịch (được áp dụng trong SQL, xem crud._filter_transactions)
+def transaction_filters(start: Optional[date] = None, end: Optional[date] = None,
+                        category: Optional[str] = None, note: Optional[str] = None):
+    return {"start": start, "end": end, "category": category, "note": note}
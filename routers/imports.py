@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
+import crud_async
+from database import get_async_db
+from utils.importer import detect_format
+
+router = APIRouter(
+    prefix="/imports",
+    tags=["Imports"]
+)
+
+# Nhập sao kê ngân hàng (CSV hoặc OFX) thành các khoản thu/chi; nhập lại cùng file không tạo bản ghi trùng
+@router.post("/{user_id}")
+async def import_statement(user_id: int, file: UploadFile = File(...),
+                           format: Optional[Literal["csv", "ofx"]] = None,
+                           db: AsyncSession = Depends(get_async_db)):
+    fmt = format or detect_format(file.filename)
+    if not fmt:
+        raise HTTPException(status_code=400, detail="⚠️ Không nhận diện được định dạng file, hãy chọn csv hoặc ofx.")
+    return await crud_async.import_statement(db, user_id, file.file, fmt)
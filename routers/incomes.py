@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-import crud, schemas
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud, crud_async, schemas
+from database import get_async_db, get_async_read_db
+from routers.pagination import page_response
+from routers.filters import transaction_filters
+from routers.cache import cached_response, is_past_month, is_past_year
 
 router = APIRouter(
     prefix="/incomes",
@@ -9,35 +12,63 @@ router = APIRouter(
 )
 # Tạo khoản thu
 @router.post("/")
-def create_income(income: schemas.IncomeCreate, user_id: int, db: Session = Depends(get_db)):
-    kq = crud.create_income(db, user_id, income.category_name, income.amount, income.date, income.note)
+async def create_income(income: schemas.IncomeCreate, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.create_income(db, user_id, income.category_name, income.amount, income.date, income.note)
     print(">>> Kết quả CRUD:", kq)
     if isinstance(kq, dict) and "error" in kq:
         raise HTTPException(status_code=404, detail=kq["error"])
     return kq
 
-# Lấy tất cả khoản thu của 1 user
+# Thêm nhiều khoản thu trong một lần gọi; kết quả báo riêng cho từng phần tử
+@router.post("/batch")
+async def create_incomes_batch(items: list[schemas.IncomeCreate], user_id: int, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.create_incomes_batch(db, user_id, items)
+    if "error" in kq:
+        raise HTTPException(status_code=400, detail=kq["error"])
+    return kq
+
+# Lấy tất cả khoản thu của 1 user (phân trang theo cursor, lọc theo ngày/danh mục/ghi chú)
 @router.get("/{user_id}")
-def get_all_incomes(user_id: int, db: Session = Depends(get_db)):
-    return crud.get_incomes_by_user(db, user_id)
+@cached_response()
+async def get_all_incomes(user_id: int, response: Response, cursor: str = None,
+                    limit: int = Query(crud.TRANSACTION_PAGE_SIZE, ge=1, le=crud.TRANSACTION_PAGE_MAX),
+                    filters: dict = Depends(transaction_filters),
+                    db: AsyncSession = Depends(get_async_read_db)):
+    page = await crud_async.get_incomes_by_user(db, user_id, cursor, limit, **filters)
+    return page_response(page, response)
 
 # Lấy khoản thu theo tháng
 @router.get("/{user_id}/month/{year}/{month}")
-def get_income_by_month(user_id: int, year: int, month: int, db: Session = Depends(get_db)):
-    return crud.get_incomes_by_month(db, user_id, year, month)
+@cached_response(past=lambda p: is_past_month(p["year"], p["month"]))
+async def get_income_by_month(user_id: int, year: int, month: int, response: Response, cursor: str = None,
+                    limit: int = Query(crud.TRANSACTION_PAGE_SIZE, ge=1, le=crud.TRANSACTION_PAGE_MAX),
+                    filters: dict = Depends(transaction_filters),
+                    db: AsyncSession = Depends(get_async_read_db)):
+    page = await crud_async.get_incomes_by_month(db, user_id, year, month, cursor, limit, **filters)
+    return page_response(page, response)
+
+# Lấy khoản thu theo năm
+@router.get("/{user_id}/year/{year}")
+@cached_response(past=lambda p: is_past_year(p["year"]))
+async def get_income_by_year(user_id: int, year: int, response: Response, cursor: str = None,
+                    limit: int = Query(crud.TRANSACTION_PAGE_SIZE, ge=1, le=crud.TRANSACTION_PAGE_MAX),
+                    filters: dict = Depends(transaction_filters),
+                    db: AsyncSession = Depends(get_async_read_db)):
+    page = await crud_async.get_incomes_by_year(db, user_id, year, cursor, limit, **filters)
+    return page_response(page, response)
 
 # Cập nhật khoản thu
 @router.put("/{income_id}")
-def update_income(income_id: int, update_data: schemas.IncomeUpdate, db: Session = Depends(get_db)):
-    kq = crud.update_income(db, income_id, update_data.category_name, update_data.amount, update_data.date, update_data.note)
+async def update_income(income_id: int, update_data: schemas.IncomeUpdate, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.update_income(db, income_id, update_data.category_name, update_data.amount, update_data.date, update_data.note)
     if not kq:
         return {"error": "⚠️ Khoản thu không tồn tại."}
     return kq
 
 # Xóa khoản thu
 @router.delete("/{income_id}")
-def delete_income(income_id: int, db: Session = Depends(get_db)):
-    kq = crud.delete_income(db, income_id)
+async def delete_income(income_id: int, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.delete_income(db, income_id)
     if not kq:
         return {"error": "⚠️ Khoản thu không tồn tại."}
     return {"message": "🗑️ Xóa khoản thu thành công!"}
\ No newline at end of file
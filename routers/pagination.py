@@ -0,0 +1,12 @@
+from fastapi import HTTPException, Response
+
+# Header chứa cursor của trang tiếp theo (không có header = đã hết dữ liệu)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Body vẫn là danh sách như trước để client cũ không phải đổi, cursor đi kèm qua header
+def page_response(page, response: Response):
+    if "error" in page:
+        raise HTTPException(status_code=400, detail=page["error"])
+    if page["next_cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+    return page["items"]
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import Literal, Optional
+import crud_async, schemas
+from database import get_async_read_db, async_read_session_factory
+from utils.export import EXPORT_FORMATS, stream_transactions
+from routers.cache import cached_response, is_past_month
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["Reports"]
+)
+
+# Tổng thu/chi theo ngày/tuần/tháng/quý/năm (tùy chọn theo danh mục) trong khoảng [start, end]
+@router.get("/{user_id}/aggregate")
+@cached_response(past=lambda p: p["end"] is not None and is_past_month(p["end"].year, p["end"].month))
+async def aggregate(user_id: int, bucket: schemas.ReportBucket = schemas.ReportBucket.month,
+                    start: Optional[date] = None, end: Optional[date] = None,
+                    type: Optional[schemas.CategoryType] = None, by_category: bool = False,
+                    db: AsyncSession = Depends(get_async_read_db)):
+    kq = await crud_async.aggregate_transactions(db, user_id, bucket.value, start, end, type, by_category)
+    if isinstance(kq, dict) and "error" in kq:
+        raise HTTPException(status_code=400, detail=kq["error"])
+    return kq
+
+# Xuất thu/chi của user dạng CSV hoặc NDJSON (truyền dạng luồng, không tải hết vào bộ nhớ)
+@router.get("/{user_id}/export")
+async def export(request: Request, user_id: int, format: Literal["csv", "ndjson"] = "csv",
+                 start: Optional[date] = None, end: Optional[date] = None,
+                 type: Optional[schemas.CategoryType] = None):
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="⚠️ Ngày bắt đầu phải trước hoặc bằng ngày kết thúc.")
+    return StreamingResponse(
+        stream_transactions(async_read_session_factory(request), format, user_id, start, end, type),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions_{user_id}.{format}"'},
+    )
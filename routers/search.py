@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import crud_async, schemas
+from crud import SEARCH_LIMIT, SEARCH_MAX
+from database import get_async_read_db
+
+router = APIRouter(
+    prefix="/search",
+    tags=["Search"]
+)
+
+# Tìm kiếm toàn văn trong ghi chú thu/chi, kết quả xếp theo độ liên quan
+@router.get("/{user_id}")
+async def search_notes(user_id: int, q: str = Query(..., min_length=1),
+                       type: Optional[schemas.CategoryType] = None,
+                       limit: int = Query(SEARCH_LIMIT, ge=1, le=SEARCH_MAX),
+                       db: AsyncSession = Depends(get_async_read_db)):
+    kq = await crud_async.search_notes(db, user_id, q, type, limit)
+    if isinstance(kq, dict) and "error" in kq:
+        raise HTTPException(status_code=400, detail=kq["error"])
+    return kq
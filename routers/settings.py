@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-import crud, schemas
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_async_read_db
+import crud_async, schemas
+from routers.cache import cached_response
 
 router = APIRouter(
     prefix="/settings",
@@ -9,15 +10,16 @@ router = APIRouter(
 )
 
 @router.get("/{user_id}")
-def get_setting(user_id: int, db: Session = Depends(get_db)):
-    setting = crud.get_setting_by_user(db, user_id)
+@cached_response()
+async def get_setting(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    setting = await crud_async.get_setting_by_user(db, user_id)
     if not setting:
         raise HTTPException(status_code=404, detail="⚠️ Cài đặt không tồn tại.")
     return {"message": "✅ Đã cài đặt thành công."}
 
 @router.put("/{setting_id}")
-def update_setting(setting_id: int, data: schemas.SettingsUpdate, db: Session = Depends(get_db)):
-    kq = crud.update_setting(
+async def update_setting(setting_id: int, data: schemas.SettingsUpdate, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.update_setting(
         db,
         setting_id,
         currency=data.currency,
@@ -31,8 +33,8 @@ def update_setting(setting_id: int, data: schemas.SettingsUpdate, db: Session =
     return {"message": "✅ Cập nhật cài đặt thành công."}
 
 @router.delete("/{setting_id}")
-def delete_setting(setting_id: int, db: Session = Depends(get_db)):
-    kq = crud.delete_setting(db, setting_id)
+async def delete_setting(setting_id: int, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.delete_setting(db, setting_id)
     if not kq:
         raise HTTPException(status_code=404, detail="⚠️ Cài đặt không tồn tại.")
     return {"message": "🗑️ Đã xóa thành công cài đặt."}
\ No newline at end of file
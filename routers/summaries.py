@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-import crud, schemas
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud_async, schemas
+from database import get_async_db, get_async_read_db
+from routers.cache import cached_response, is_past_month
 
 router = APIRouter(
     prefix="/summaries",
@@ -9,16 +10,17 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=schemas.MonthlySummaryResponse)
-def create_summary(user_id: int, year: int, month: int, db: Session = Depends(get_db)):
-    summary = crud.create_monthly_summary(db, user_id, year, month)
+async def create_summary(user_id: int, year: int, month: int, db: AsyncSession = Depends(get_async_db)):
+    summary = await crud_async.create_monthly_summary(db, user_id, year, month)
     if not summary:
         raise HTTPException(status_code=400, detail="⚠️ Không thể tạo tổng kết.")
     return summary
 
 
 @router.get("/{user_id}/{year}/{month}", response_model=list[schemas.MonthlySummaryResponse])
-def get_summary(user_id: int, year: int, month: int, db: Session = Depends(get_db)):
-    summary = crud.get_summary_by_user_and_month(db, user_id, year, month)
+@cached_response(past=lambda p: is_past_month(p["year"], p["month"]), model=list[schemas.MonthlySummaryResponse])
+async def get_summary(user_id: int, year: int, month: int, db: AsyncSession = Depends(get_async_read_db)):
+    summary = await crud_async.get_summary_by_user_and_month(db, user_id, year, month)
     if not summary:
         raise HTTPException(status_code=404, detail="⚠️ Không có dữ liệu tổng kết cho tháng này.")
     return summary
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import crud, crud_async, schemas
+from database import get_async_read_db
+from routers.pagination import page_response
+from routers.filters import transaction_filters
+from routers.cache import cached_response
+
+router = APIRouter(
+    prefix="/transactions",
+    tags=["Transactions"]
+)
+
+# Thu và chi của user trong một danh sách (mới nhất trước), mỗi dòng có "type" là income/expense
+@router.get("/{user_id}")
+@cached_response()
+async def get_transactions(user_id: int, response: Response, cursor: str = None,
+                           limit: int = Query(crud.TRANSACTION_PAGE_SIZE, ge=1, le=crud.TRANSACTION_PAGE_MAX),
+                           type: Optional[schemas.CategoryType] = None,
+                           filters: dict = Depends(transaction_filters),
+                           db: AsyncSession = Depends(get_async_read_db)):
+    page = await crud_async.get_transactions_by_user(db, user_id, cursor, limit, type, **filters)
+    return page_response(page, response)
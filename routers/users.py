@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-import crud, models, schemas
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+import crud_async, models, schemas
 from auth import verify_token
 
 router = APIRouter(
@@ -10,15 +10,15 @@ router = APIRouter(
 )
 
 @router.post("/register", response_model=schemas.UserResponse)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    kq = crud.create_user(db, user.username, user.email, user.password, user.confirm_password)
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.create_user(db, user.username, user.email, user.password, user.confirm_password)
     if isinstance(kq, dict) and "error" in kq:
         raise HTTPException(status_code=400, detail=f"⚠️ {kq['error']}")
     return kq
 
 @router.post("/login")
-def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    kq = crud.verify_login(db, user.email, user.password)
+async def login_user(user: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.verify_login(db, user.email, user.password)
     if not kq:
         raise HTTPException(status_code=401, detail="🔒 Email hoặc password không đúng.")
     user_data = kq["user"]
@@ -32,15 +32,15 @@ def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
-    kq = crud.delete_user(db, user_id)
+async def delete_user(user_id: int = Depends(verify_token), db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.delete_user(db, user_id)
     if not kq:
         raise HTTPException(status_code=404, detail="🚫 Không tìm thấy người dùng!")
     return {"message": "🗑️ Xóa người dùng thành công!"}
 
 @router.post("/logout", response_model=schemas.UserLogout)
-def logout_user(user_id: int = Depends(verify_token), db: Session = Depends(get_db)):
-    kq = crud.logout_user(db, user_id)
+async def logout_user(user_id: int = Depends(verify_token), db: AsyncSession = Depends(get_async_db)):
+    kq = await crud_async.logout_user(db, user_id)
     if isinstance(kq, dict) and "error" in kq:
         raise HTTPException(status_code=404, detail=kq["error"])
     return {"message": kq["message"]}
\ No newline at end of file
@@ -23,6 +23,13 @@ class ChartType(str, Enum):
     pie = "pie"
     bar = "bar"
 
+class ReportBucket(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+    quarter = "quarter"
+    year = "year"
+
 #---- USER ----
 class UserBase(BaseModel):
     username: str = Field(..., min_length=3, max_length=100)
@@ -0,0 +1,126 @@
+# Đo bộ nhớ (RSS) khi xuất /reports/{user_id}/export dạng luồng.
+# Tạo CSDL SQLite với --rows khoản chi rồi gọi thẳng ứng dụng ASGI trong cùng tiến trình: các khối body
+# chỉ được đếm rồi bỏ đi (như gửi ra socket), nên RSS đo được chính là bộ nhớ phía server.
+# Nếu xuất thật sự theo luồng (yield_per) thì RSS đỉnh gần như không đổi khi tăng số dòng.
+# Đọc VmRSS từ /proc/self/status (Linux).
+#
+#   python scripts/bench_export.py --rows 1000000
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORIES = 1000       # mỗi (user, danh mục, ngày) chỉ có một khoản chi
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def seed(db_path: str, rows: int):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (user_id, username, email, password_hash) VALUES (1, 'bench', 'bench@example.com', 'x')")
+    conn.executemany(
+        "INSERT INTO categories (category_id, name, normalized_name, type) VALUES (?, ?, ?, 'expense')",
+        [(i + 1, f"Danh mục {i}", f"danh mục {i}") for i in range(CATEGORIES)],
+    )
+    start = date(2000, 1, 1)
+    batch = 50_000
+    for offset in range(0, rows, batch):
+        conn.executemany(
+            "INSERT INTO expenses (user_id, category_id, amount, date, note) VALUES (1, ?, ?, ?, ?)",
+            [
+                (i % CATEGORIES + 1, 1000 + i % 100_000, (start + timedelta(days=i // CATEGORIES)).isoformat(), f"khoản chi {i}")
+                for i in range(offset, min(offset + batch, rows))
+            ],
+        )
+        conn.commit()
+    conn.close()
+
+
+# Gửi một request GET tới ứng dụng ASGI, trả về (status, số byte, số dòng) của body
+async def stream_get(app, path: str, query: str):
+    status, received, lines = None, 0, 0
+    request_sent, finished = False, asyncio.Event()
+
+    # Lần đầu trả body rỗng của request; sau đó chờ tới khi response gửi xong (như client còn kết nối)
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, received, lines
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            received += len(body)
+            lines += body.count(b"\n")
+            if not message.get("more_body", False):
+                finished.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    return status, received, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo RSS khi xuất giao dịch dạng luồng")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="/tmp/bench_export.db")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    sys.path.insert(0, ROOT)
+    import main as app_main     # tạo bảng/migration như khi server khởi động
+
+    started = time.perf_counter()
+    seed(args.db, args.rows)
+    print(f"Đã tạo {args.rows:,} khoản chi trong {time.perf_counter() - started:.1f}s")
+
+    baseline = rss_mb()
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], rss_mb())
+            time.sleep(0.02)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    status, received, lines = asyncio.run(stream_get(app_main.app, "/reports/1/export", f"format={args.format}"))
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+
+    if status != 200:
+        raise SystemExit(f"Export trả về {status}")
+    print(f"Xuất {lines - (args.format == 'csv'):,} dòng ({received / 2**20:.1f} MB) trong {elapsed:.1f}s")
+    print(f"RSS: trước {baseline:.1f} MB, đỉnh {peak[0]:.1f} MB, tăng {peak[0] - baseline:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
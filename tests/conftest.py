@@ -0,0 +1,36 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# CSDL SQLite tạm cho cả phiên test: phải đặt trước khi import database/main (engine tạo lúc import);
+# URL async tự suy ra sqlite+aiosqlite nên route chạy qua toàn bộ tầng async
+_db_dir = tempfile.mkdtemp(prefix="expense-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+_user_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(main.app)
+
+
+# Mỗi test dùng một user mới nên không phụ thuộc dữ liệu của test khác
+@pytest.fixture
+def user_id(client):
+    n = next(_user_numbers)
+    res = client.post("/users/register", json={
+        "username": f"user{n}", "email": f"user{n}@example.com",
+        "password": "abc123", "confirm_password": "abc123",
+    })
+    assert res.status_code == 200, res.text
+    return res.json()["user_id"]
@@ -0,0 +1,30 @@
+import database
+from database import get_async_db, get_async_read_db
+from routers import expense
+
+
+def _dependencies(path, method):
+    route = next(r for r in expense.router.routes if r.path == path and method in r.methods)
+    return {d.call for d in route.dependant.dependencies}
+
+
+def test_routes_use_async_sessions_on_aiosqlite():
+    assert database.async_engine.url.drivername == "sqlite+aiosqlite"
+    assert get_async_db in _dependencies("/expense/", "POST")
+    assert get_async_read_db in _dependencies("/expense/{user_id}", "GET")
+
+
+def test_create_then_list_round_trip(client, user_id):
+    res = client.post(f"/expense/?user_id={user_id}", json={
+        "category_name": "Ăn uống", "amount": 45000, "date": "2024-03-05", "note": "ăn trưa",
+    })
+    assert res.status_code == 200, res.text
+    expense_id = res.json()["expense_id"]
+
+    res = client.get(f"/expense/{user_id}")
+    assert res.status_code == 200, res.text
+    rows = res.json()
+    assert [r["expense_id"] for r in rows] == [expense_id]
+    assert rows[0]["category_name"] == "Ăn uống"
+    assert rows[0]["amount"] == 45000
+    assert rows[0]["note"] == "ăn trưa"
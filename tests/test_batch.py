@@ -0,0 +1,33 @@
+from crud import BATCH_MAX_ITEMS
+
+
+def test_batch_reports_each_item(client, user_id):
+    client.post(f"/expense/?user_id={user_id}", json={"category_name": "Đi lại", "amount": 30000, "date": "2024-04-01"})
+    items = [
+        {"category_name": "Ăn uống", "amount": 50000, "date": "2024-04-01", "note": "trưa"},
+        {"category_name": "Ăn uống", "amount": -1, "date": "2024-04-02"},           # số tiền không hợp lệ
+        {"category_name": "Đi lại", "amount": 20000, "date": "2024-04-01"},         # trùng khoản đã có
+        {"category_name": "ăn uống ", "amount": 60000, "date": "2024-04-01"},       # trùng phần tử 0 trong batch
+        {"category_name": "Giải trí", "amount": 70000, "date": "2024-04-01"},
+    ]
+    res = client.post(f"/expense/batch?user_id={user_id}", json=items)
+    assert res.status_code == 200, res.text
+    kq = res.json()
+    assert (kq["created"], kq["failed"]) == (2, 3)
+    results = kq["results"]
+    assert [r["index"] for r in results] == list(range(len(items)))
+    assert [r["ok"] for r in results] == [True, False, False, False, True]
+    assert all(r["error"] for r in results if not r["ok"])
+    assert results[0]["note"] == "trưa" and results[0]["expense_id"]
+
+    rows = client.get(f"/expense/{user_id}/month/2024/4").json()
+    created = {r["expense_id"] for r in results if r["ok"]}
+    assert created <= {r["expense_id"] for r in rows}
+    assert len(rows) == 3
+
+
+def test_batch_rejects_too_many_items(client, user_id):
+    items = [{"category_name": "Lương", "amount": 1, "date": "2024-04-01"}] * (BATCH_MAX_ITEMS + 1)
+    res = client.post(f"/incomes/batch?user_id={user_id}", json=items)
+    assert res.status_code == 400
+    assert client.get(f"/incomes/{user_id}").json() == []
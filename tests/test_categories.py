@@ -0,0 +1,51 @@
+import crud
+from database import SessionLocal
+from models import Category, CategoryType
+
+
+# Mô phỏng tranh chấp: request khác đã commit danh mục nhưng SELECT đầu tiên (snapshot cũ) không thấy
+def _stale_first_lookup(monkeypatch):
+    real_lookup = crud.get_category_by_name
+    calls = []
+
+    def lookup(db, category_name, type_, locking=False):
+        calls.append(locking)
+        if len(calls) == 1:
+            return None
+        return real_lookup(db, category_name, type_, locking=locking)
+
+    monkeypatch.setattr(crud, "get_category_by_name", lookup)
+    return calls
+
+
+def test_get_or_create_category_reuses_row_created_concurrently(monkeypatch):
+    with SessionLocal() as other:
+        other.add(Category(name="Tranh chấp", type=CategoryType.expense, description="Danh mục tự thêm"))
+        other.commit()
+        existing_id = other.query(Category.category_id).filter(Category.name == "Tranh chấp").scalar()
+
+    calls = _stale_first_lookup(monkeypatch)
+    with SessionLocal() as db:
+        ref = crud.get_or_create_category(db, "  tranh CHẤP ", CategoryType.expense)
+        db.commit()
+    assert ref.category_id == existing_id
+    assert calls == [False, True]
+
+
+
+# Savepoint được release (vd tạo danh mục thứ hai) rồi giao dịch ngoài rollback: danh mục chưa commit không được vào cache
+def test_rolled_back_category_is_not_cached_after_savepoint_release():
+    with SessionLocal() as db:
+        crud.get_or_create_category(db, "Chưa commit 1", CategoryType.expense)
+        crud.get_or_create_category(db, "Chưa commit 2", CategoryType.expense)
+        with db.begin_nested():
+            pass
+        db.rollback()
+    for name in ("Chưa commit 1", "Chưa commit 2"):
+        assert crud._cached_category(crud.normalize_category_name(name), CategoryType.expense) is None
+
+    with SessionLocal() as db:
+        again = crud.get_or_create_category(db, "Chưa commit 1", CategoryType.expense)
+        db.commit()
+        assert db.get(Category, again.category_id) is not None
+    assert crud._cached_category(crud.normalize_category_name("Chưa commit 1"), CategoryType.expense) == again
@@ -0,0 +1,28 @@
+from sqlalchemy import event, text
+
+from database import async_engine, engine
+
+
+def test_write_bumps_data_version_once_per_commit(client, user_id):
+    def version():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT data_version FROM users WHERE user_id = :u"), {"u": user_id}).scalar()
+
+    bumps = []
+
+    def count_bumps(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE users SET data_version"):
+            bumps.append(statement)
+
+    before = version()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_bumps)
+    try:
+        # Danh mục mới và dòng tổng hợp tháng mới đều được tạo trong savepoint (begin_nested) trước khi commit
+        res = client.post(f"/expense/?user_id={user_id}", json={
+            "category_name": "Danh mục savepoint", "amount": 1000, "date": "2024-06-01",
+        })
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_bumps)
+    assert res.status_code == 200, res.text
+    assert version() == before + 1
+    assert len(bumps) == 1
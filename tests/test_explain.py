@@ -0,0 +1,9 @@
+import migrations
+from database import engine
+
+
+def test_hot_queries_use_expected_indexes(client):
+    results = migrations.explain_hot_queries(engine)
+    assert results
+    missing = [(name, expected, plan) for name, expected, used, plan in results if not used]
+    assert missing == []
@@ -0,0 +1,50 @@
+STATEMENT = (
+    "date,amount,note\n"
+    "2024-03-05,-50000,Coffee\n"
+    "2024-03-05,-120000,Lunch\n"
+).encode("utf-8")
+
+
+def _import(client, user_id, content, filename="statement.csv"):
+    res = client.post(f"/imports/{user_id}", files={"file": (filename, content, "text/csv")})
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def test_same_day_statement_rows_are_all_imported(client, user_id):
+    report = _import(client, user_id, STATEMENT)
+    assert report["created_expenses"] == 2
+    assert report["duplicates"] == 0
+    assert report["errors"] == []
+
+    rows = client.get(f"/expense/{user_id}/month/2024/3").json()
+    assert sorted(r["note"] for r in rows) == ["Coffee", "Lunch"]
+    assert sum(r["amount"] for r in rows) == 170000
+
+    # Nhập lại cùng sao kê: chỉ các dòng trùng import_hash được báo là đã nhập
+    report = _import(client, user_id, STATEMENT)
+    assert report["created_expenses"] == 0
+    assert report["already_imported"] == 2
+    assert report["duplicates"] == 0
+
+
+def test_manual_entries_keep_one_per_category_per_day(client, user_id):
+    _import(client, user_id, STATEMENT)
+    expense = {"category_name": "Sao kê ngân hàng", "amount": 1000, "date": "2024-03-05"}
+    assert client.post(f"/expense/?user_id={user_id}", json=expense).status_code == 200
+    assert client.post(f"/expense/?user_id={user_id}", json=expense).status_code == 404
+
+
+def test_identical_statement_rows_are_separate_transactions(client, user_id):
+    coffee = "2024-03-06,-45000,Coffee\n"
+    report = _import(client, user_id, ("date,amount,note\n" + coffee * 2).encode("utf-8"))
+    assert report["created_expenses"] == 2
+    assert report["already_imported"] == 0
+
+    # Sao kê chồng lấn có thêm một ly nữa: chỉ dòng thứ ba là mới
+    report = _import(client, user_id, ("date,amount,note\n" + coffee * 3).encode("utf-8"))
+    assert report["created_expenses"] == 1
+    assert report["already_imported"] == 2
+
+    rows = client.get(f"/expense/{user_id}/month/2024/3").json()
+    assert [r["amount"] for r in rows] == [45000] * 3
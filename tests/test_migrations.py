@@ -0,0 +1,76 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import MIGRATIONS, run_migrations
+
+# Lược đồ ban đầu (trước mọi migration) như create_all của models cũ tạo trên SQLite
+BASELINE_DDL = (
+    "CREATE TABLE users (user_id INTEGER PRIMARY KEY, username VARCHAR(100) NOT NULL UNIQUE, "
+    "password_hash VARCHAR(255) NOT NULL, email VARCHAR(255) NOT NULL UNIQUE, created_at DATETIME)",
+    "CREATE TABLE categories (category_id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, "
+    "type VARCHAR(7) NOT NULL, description TEXT)",
+    "CREATE TABLE incomes (income_id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (user_id), "
+    "category_id INTEGER REFERENCES categories (category_id), amount NUMERIC(12, 2) NOT NULL, "
+    "date DATE NOT NULL, note TEXT)",
+    "CREATE TABLE expenses (expense_id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (user_id), "
+    "category_id INTEGER REFERENCES categories (category_id), amount NUMERIC(12, 2) NOT NULL, "
+    "date DATE NOT NULL, note TEXT)",
+    "CREATE TABLE budget (budget_id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (user_id), "
+    "category_id INTEGER REFERENCES categories (category_id), amount NUMERIC(12, 2) NOT NULL, "
+    "month VARCHAR(20) NOT NULL)",
+    "CREATE TABLE monthly_summary (summary_id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (user_id), "
+    "month VARCHAR(20) NOT NULL, total_income NUMERIC(12, 2) NOT NULL, total_expense NUMERIC(12, 2) NOT NULL, "
+    "balance NUMERIC(12, 2) NOT NULL, created_at DATETIME)",
+)
+
+# Nhiều khoản trong cùng một ngày ở các danh mục khác nhau
+SEED = (
+    "INSERT INTO users (user_id, username, password_hash, email) VALUES (1, 'abc', 'x', 'a@b.com')",
+    "INSERT INTO categories (category_id, name, type) VALUES (1, 'Lương', 'income'), (2, 'Thưởng', 'income'), "
+    "(3, 'Ăn uống', 'expense'), (4, 'Đi lại', 'expense'), (5, 'Giải trí', 'expense')",
+    "INSERT INTO incomes (user_id, category_id, amount, date, note) VALUES "
+    "(1, 1, 1000, '2024-01-05', 'lương'), (1, 2, 200, '2024-01-05', 'thưởng')",
+    "INSERT INTO expenses (user_id, category_id, amount, date, note) VALUES "
+    "(1, 3, 30, '2024-01-05', 'phở'), (1, 4, 20, '2024-01-05', 'xe buýt'), "
+    "(1, 5, 50, '2024-01-05', 'phim'), (1, 3, 40, '2024-01-06', 'bún')",
+    "INSERT INTO budget (user_id, category_id, amount, month) VALUES (1, 3, 100, '01-2024')",
+    "INSERT INTO monthly_summary (user_id, month, total_income, total_expense, balance) VALUES (1, '01-2024', 0, 0, 0)",
+)
+
+
+def test_baseline_database_upgrades_with_same_day_transactions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/baseline.db")
+    with engine.begin() as conn:
+        for statement in BASELINE_DDL + SEED:
+            conn.execute(text(statement))
+
+    run_migrations(engine)
+
+    with engine.connect() as conn:
+        applied = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+        assert applied == {step.__name__ for step in MIGRATIONS}
+        for table in ("incomes", "expenses"):
+            assert set(conn.execute(text(f"SELECT import_hash FROM {table}")).scalars()) == {""}
+            indexes = {ix["name"] for ix in inspect(conn).get_indexes(table)}
+            assert f"uq_{table}_user_category_date_import" in indexes
+            assert not indexes & {f"uq_{table}_user_category_date", f"uq_{table}_user_date_import_hash"}
+        assert conn.execute(text("SELECT COUNT(*) FROM expenses")).scalar() == 4
+        summary = conn.execute(text("SELECT total_income, total_expense, balance FROM monthly_summary")).one()
+        assert [Decimal(str(v)) for v in summary] == [1200, 140, 1060]
+        assert Decimal(str(conn.execute(text("SELECT spent FROM budget")).scalar())) == 70
+        period = conn.execute(text("SELECT period FROM budget")).scalar()
+        assert date.fromisoformat(str(period)[:10]) == date(2024, 1, 1)
+        # Rollup theo ngày được nạp từ dữ liệu cũ, bảng rollup theo tháng đã bị bỏ
+        rollup = conn.execute(text(
+            "SELECT date, type, SUM(total), SUM(count) FROM category_daily_rollup GROUP BY date, type ORDER BY date, type"
+        )).all()
+        assert [(str(d)[:10], t, Decimal(str(total)), n) for d, t, total, n in rollup] == [
+            ("2024-01-05", "expense", 100, 3), ("2024-01-05", "income", 1200, 2), ("2024-01-06", "expense", 40, 1),
+        ]
+        assert not inspect(conn).has_table("category_monthly_rollup")
+
+    # Chạy lại không làm gì (mọi bước đã được ghi nhận)
+    run_migrations(engine)
+    engine.dispose()
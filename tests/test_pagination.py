@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+from routers.pagination import NEXT_CURSOR_HEADER
+
+ROWS = 23
+PAGE = 5
+
+
+# Nhiều khoản cùng ngày (khác danh mục) để cursor phải phân biệt theo cả ngày lẫn id
+def _add_expenses(client, user_id, rows, first_day=date(2024, 2, 1)):
+    ids = []
+    for i in range(rows):
+        res = client.post(f"/expense/?user_id={user_id}", json={
+            "category_name": f"Danh mục {i % 4}", "amount": 1000 + i,
+            "date": (first_day + timedelta(days=i // 4)).isoformat(),
+        })
+        assert res.status_code == 200, res.text
+        ids.append(res.json()["expense_id"])
+    return ids
+
+
+def _walk(client, url, on_page=None):
+    rows, cursor = [], None
+    while True:
+        params = {"limit": PAGE}
+        if cursor:
+            params["cursor"] = cursor
+        res = client.get(url, params=params)
+        assert res.status_code == 200, res.text
+        page = res.json()
+        assert len(page) <= PAGE
+        rows.extend(page)
+        cursor = res.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return rows
+        if on_page:
+            on_page()
+
+
+def test_cursor_pages_cover_every_row_once(client, user_id):
+    ids = _add_expenses(client, user_id, ROWS)
+    for url in (f"/expense/{user_id}", f"/expense/{user_id}/month/2024/2", f"/expense/{user_id}/year/2024"):
+        rows = _walk(client, url)
+        assert sorted(r["expense_id"] for r in rows) == sorted(ids), url
+        keys = [(r["date"], r["expense_id"]) for r in rows]
+        assert keys == sorted(keys, reverse=True), url
+
+
+def test_new_rows_do_not_shift_later_pages(client, user_id):
+    ids = _add_expenses(client, user_id, ROWS)
+    added = []
+
+    # Thêm khoản mới nhất giữa các trang: cursor giữ vị trí nên trang sau không lặp/mất dòng cũ
+    def add_newer():
+        added.extend(_add_expenses(client, user_id, 1, first_day=date(2024, 3, 1) + timedelta(days=len(added))))
+
+    rows = _walk(client, f"/expense/{user_id}", on_page=add_newer)
+    assert added
+    assert sorted(r["expense_id"] for r in rows) == sorted(ids)
+
+
+def test_invalid_cursor_is_rejected(client, user_id):
+    res = client.get(f"/expense/{user_id}", params={"cursor": "không-hợp-lệ"})
+    assert res.status_code == 400
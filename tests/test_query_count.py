@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+
+import pytest
+
+import crud
+from database import SessionLocal, start_query_stats, stop_query_stats
+from models import CategoryType, Expense, Income
+
+N = 20
+CATEGORIES = 10
+
+
+# Mỗi (danh mục, ngày) chỉ có một khoản nên rải đều rows khoản vào 10 danh mục, cùng tháng 01/2024
+def _seed(db, model, user_id, type_, rows):
+    categories = [crud.get_or_create_category(db, f"Danh mục {i}", type_).category_id for i in range(CATEGORIES)]
+    db.add_all(
+        model(user_id=user_id, category_id=categories[i % CATEGORIES],
+              amount=1000 + i, date=date(2024, 1, 1) + timedelta(days=i // CATEGORIES), note=f"khoản {i}")
+        for i in range(rows)
+    )
+    db.commit()
+
+
+def _count_queries(fn, *args, **kwargs):
+    stats, token = start_query_stats()
+    try:
+        with SessionLocal() as db:
+            result = fn(db, *args, **kwargs)
+    finally:
+        stop_query_stats(token)
+    return stats.count, result
+
+
+@pytest.mark.parametrize("model,type_,list_functions", [
+    (Income, CategoryType.income,
+     (crud.get_incomes_by_user, crud.get_incomes_by_month, crud.get_incomes_by_year)),
+    (Expense, CategoryType.expense,
+     (crud.get_expenses_by_user, crud.get_expenses_by_month, crud.get_expenses_by_year)),
+])
+def test_list_query_count_does_not_grow_with_rows(client, model, type_, list_functions):
+    user_ids = []
+    for rows in (N, 10 * N):
+        user_id = client.post("/users/register", json={
+            "username": f"count{type_.value}{rows}", "email": f"count{type_.value}{rows}@example.com",
+            "password": "abc123", "confirm_password": "abc123",
+        }).json()["user_id"]
+        with SessionLocal() as db:
+            _seed(db, model, user_id, type_, rows)
+        user_ids.append(user_id)
+
+    get_by_user, get_by_month, get_by_year = list_functions
+    calls = (
+        (get_by_user, ()),
+        (get_by_month, (2024, 1)),
+        (get_by_year, (2024,)),
+    )
+    for fn, args in calls:
+        small_count, small = _count_queries(fn, user_ids[0], *args, limit=10 * N)
+        large_count, large = _count_queries(fn, user_ids[1], *args, limit=10 * N)
+        assert (len(small["items"]), len(large["items"])) == (N, 10 * N)
+        assert small_count == large_count, fn.__name__
+
+
+# Tóm tắt ngân sách: 1 hay nhiều danh mục (có ngân sách và chi tiêu) đều cùng số truy vấn
+def test_budget_summary_query_count_does_not_grow_with_categories(client):
+    user_ids = []
+    for categories in (1, CATEGORIES):
+        user_id = client.post("/users/register", json={
+            "username": f"budgetcount{categories}", "email": f"budgetcount{categories}@example.com",
+            "password": "abc123", "confirm_password": "abc123",
+        }).json()["user_id"]
+        with SessionLocal() as db:
+            for i in range(categories):
+                expense = crud.create_expense(db, user_id, f"Ngân sách {i}", 1000 + i, date(2024, 1, 5))
+                crud.create_budget(db, user_id, expense["category_id"], 5000, "2024-01")
+        user_ids.append(user_id)
+
+    small_count, small = _count_queries(crud.get_budget_summary_for_month, user_ids[0], 2024, 1)
+    large_count, large = _count_queries(crud.get_budget_summary_for_month, user_ids[1], 2024, 1)
+    assert (len(small), len(large)) == (1, CATEGORIES)
+    assert all(row["expense"] > 0 and row["budget"] == 5000 for row in small + large)
+    assert small_count == large_count
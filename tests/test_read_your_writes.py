@@ -0,0 +1,31 @@
+from starlette.requests import Request
+
+import database
+
+
+def _read_request(user_id, cookies):
+    cookie = "; ".join(f"{k}={v}" for k, v in cookies.items())
+    return Request({
+        "type": "http", "method": "GET", "path": f"/expense/{user_id}", "query_string": b"",
+        "headers": [(b"cookie", cookie.encode())] if cookie else [], "path_params": {"user_id": str(user_id)},
+    })
+
+
+def test_write_response_pins_reads_to_primary_across_workers(client, user_id):
+    res = client.post(f"/expense/?user_id={user_id}", json={
+        "category_name": "Ăn uống", "amount": 1000, "date": "2024-05-01",
+    })
+    assert res.status_code == 200, res.text
+    cookie = database.READ_YOUR_WRITES_COOKIE.format(user_id)
+    assert cookie in res.cookies
+
+    # Request đọc tiếp theo rơi vào worker khác: không có ghim trong tiến trình, chỉ còn cookie
+    database._recent_writes.clear()
+    assert database._use_primary_for(_read_request(user_id, {cookie: res.cookies[cookie]}))
+    assert not database._use_primary_for(_read_request(user_id, {}))
+
+
+def test_read_only_request_sets_no_pin(client, user_id):
+    res = client.get(f"/expense/{user_id}")
+    assert res.status_code == 200
+    assert database.READ_YOUR_WRITES_COOKIE.format(user_id) not in res.cookies
@@ -0,0 +1,64 @@
+import crud_async
+import routers.cache as cache
+from routers.cache import MemoryLRUCache
+
+
+def _add_expense(client, user_id, day):
+    res = client.post(f"/expense/?user_id={user_id}", json={"category_name": "Ăn uống", "amount": 1000, "date": day})
+    assert res.status_code == 200, res.text
+
+
+def _cached_keys(user_id):
+    return set(cache.response_cache._user_keys.get(user_id, ()))
+
+
+def test_write_through_api_evicts_only_that_users_entries(client, user_id):
+    other = client.post("/users/register", json={
+        "username": f"cacheother{user_id}", "email": f"cacheother{user_id}@example.com",
+        "password": "abc123", "confirm_password": "abc123",
+    }).json()["user_id"]
+    _add_expense(client, user_id, "2024-08-01")
+    for u in (user_id, other):
+        assert client.get(f"/expense/{u}").status_code == 200
+    assert _cached_keys(user_id) and _cached_keys(other)
+    other_keys = _cached_keys(other)
+
+    _add_expense(client, user_id, "2024-08-02")
+    assert not _cached_keys(user_id)
+    assert _cached_keys(other) == other_keys
+    assert len(client.get(f"/expense/{user_id}").json()) == 2
+
+
+# Ghi dữ liệu xảy ra trong lúc route đang tính kết quả: kết quả (có thể đã cũ) không được lưu vào cache
+def test_result_computed_during_a_write_is_not_cached(client, user_id, monkeypatch):
+    _add_expense(client, user_id, "2024-08-01")
+    real = crud_async.get_expenses_by_user
+
+    async def concurrent_write(db, uid, *args, **kwargs):
+        page = await real(db, uid, *args, **kwargs)
+        cache.response_cache.invalidate_user(uid)
+        return page
+
+    monkeypatch.setattr(crud_async, "get_expenses_by_user", concurrent_write)
+    assert len(client.get(f"/expense/{user_id}").json()) == 1
+    assert not _cached_keys(user_id)
+
+    monkeypatch.setattr(crud_async, "get_expenses_by_user", real)
+    client.get(f"/expense/{user_id}")
+    assert _cached_keys(user_id)
+
+
+def test_lru_evicts_least_recently_used_entry():
+    lru = MemoryLRUCache(max_entries=2)
+    lru.set(1, "a", "A", 60, lru.generation(1))
+    lru.set(1, "b", "B", 60, lru.generation(1))
+    assert lru.get("a") == "A"           # "a" vừa được dùng -> "b" là mục ít dùng nhất
+    lru.set(2, "c", "C", 60, lru.generation(2))
+    assert (lru.get("a"), lru.get("b"), lru.get("c")) == ("A", None, "C")
+    assert lru._user_keys == {1: {"a"}, 2: {"c"}}
+
+    # generation lấy trước khi user bị xóa cache -> set bị bỏ qua
+    generation = lru.generation(1)
+    lru.invalidate_user(1)
+    lru.set(1, "d", "D", 60, generation)
+    assert (lru.get("a"), lru.get("d")) == (None, None)
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import text
+
+from database import engine
+from migrations import rebuild_category_rollups
+
+# Hai khoản sao kê cùng ngày, cùng danh mục (mặc định) -> gộp vào một dòng rollup
+STATEMENT = (
+    "date,amount,note\n"
+    "2024-07-01,-30000,Coffee\n"
+    "2024-07-01,-45000,Lunch\n"
+    "2024-07-09,-20000,Bus\n"
+).encode("utf-8")
+
+
+def _seed(client, user_id):
+    res = client.post(f"/imports/{user_id}", files={"file": ("statement.csv", STATEMENT, "text/csv")})
+    assert res.json()["created_expenses"] == 3, res.text
+    for category, day in (("Ăn uống", "2024-07-01"), ("Ăn uống", "2024-07-02"), ("Đi lại", "2024-07-15")):
+        res = client.post(f"/expense/?user_id={user_id}", json={"category_name": category, "amount": 10000, "date": day})
+        assert res.status_code == 200, res.text
+    # Đổi ngày trong cùng tháng: rollup phải chuyển khoản chi sang ngày mới
+    expense_id = res.json()["expense_id"]
+    res = client.put(f"/expense/{expense_id}", json={"category_name": "Đi lại", "amount": 15000, "date": "2024-07-16"})
+    assert res.status_code == 200, res.text
+
+
+# Tổng theo nhóm tính thẳng từ danh sách khoản chi (bảng gốc)
+def _expected(client, user_id, bucket_of):
+    totals = defaultdict(lambda: [0.0, 0])
+    for row in client.get(f"/expense/{user_id}").json():
+        item = totals[bucket_of(date.fromisoformat(row["date"]))]
+        item[0] += row["amount"]
+        item[1] += 1
+    return {bucket: tuple(v) for bucket, v in totals.items()}
+
+
+def _report(client, user_id, bucket):
+    res = client.get(f"/reports/{user_id}/aggregate", params={
+        "bucket": bucket, "type": "expense", "start": "2024-07-01", "end": "2024-07-31",
+    })
+    assert res.status_code == 200, res.text
+    return {date.fromisoformat(r["bucket"]): (r["total"], r["count"]) for r in res.json()}
+
+
+def test_reports_match_raw_rows_for_every_bucket(client, user_id):
+    _seed(client, user_id)
+    buckets = {
+        "day": lambda d: d,
+        "week": lambda d: date.fromordinal(d.toordinal() - d.weekday()),
+        "month": lambda d: d.replace(day=1),
+    }
+    for bucket, bucket_of in buckets.items():
+        assert _report(client, user_id, bucket) == _expected(client, user_id, bucket_of), bucket
+    assert _report(client, user_id, "day")[date(2024, 7, 1)] == (85000, 3)
+
+    summary = client.post("/summaries/", params={"user_id": user_id, "year": 2024, "month": 7}).json()
+    assert float(summary["total_expense"]) == 30000 + 45000 + 20000 + 10000 + 10000 + 15000
+
+
+def test_rebuild_rollup_restores_totals_and_bumps_data_version(client, user_id):
+    _seed(client, user_id)
+    expected = _report(client, user_id, "day")
+    etag = client.get(f"/reports/{user_id}/aggregate", params={"bucket": "day"}).headers["ETag"]
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE category_daily_rollup SET total = 0 WHERE user_id = :u"), {"u": user_id})
+        version = conn.execute(text("SELECT data_version FROM users WHERE user_id = :u"), {"u": user_id}).scalar()
+        rebuild_category_rollups(conn, user_id)
+        assert conn.execute(text("SELECT data_version FROM users WHERE user_id = :u"), {"u": user_id}).scalar() == version + 1
+
+    # data_version mới -> ETag mới, không dùng lại response đã cache
+    res = client.get(f"/reports/{user_id}/aggregate", params={"bucket": "day"}, headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert _report(client, user_id, "day") == expected
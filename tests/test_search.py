@@ -0,0 +1,25 @@
+import crud
+
+
+def _add_expenses(client, user_id):
+    for category, day, note in (("Cafe", "2024-03-03", "Cà phê sáng với bạn"), ("Ăn uống", "2024-03-04", "ăn trưa")):
+        res = client.post(f"/expense/?user_id={user_id}", json={
+            "category_name": category, "amount": 10000, "date": day, "note": note,
+        })
+        assert res.status_code == 200, res.text
+
+
+def test_search_uses_fulltext_index_when_present(client, user_id):
+    assert crud._fulltext_note_tables == {"incomes", "expenses"}
+    _add_expenses(client, user_id)
+    rows = client.get(f"/search/{user_id}", params={"q": "cà ph"}).json()
+    assert [r["note"] for r in rows] == ["Cà phê sáng với bạn"]
+    assert rows[0]["score"] is not None
+
+
+def test_search_falls_back_to_like_without_fulltext_index(client, user_id, monkeypatch):
+    monkeypatch.setattr(crud, "_fulltext_note_tables", set())
+    _add_expenses(client, user_id)
+    rows = client.get(f"/search/{user_id}", params={"q": "trưa"}).json()
+    assert [r["note"] for r in rows] == ["ăn trưa"]
+    assert rows[0]["score"] is None
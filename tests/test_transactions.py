@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from routers.pagination import NEXT_CURSOR_HEADER
+
+DAYS = 6
+
+
+# Mỗi ngày một khoản thu và hai khoản chi: trang cắt giữa ngày phải nối đúng giữa hai loại
+def _seed(client, user_id):
+    expected = set()
+    for i in range(DAYS):
+        day = (date(2024, 5, 1) + timedelta(days=i)).isoformat()
+        res = client.post(f"/incomes/?user_id={user_id}", json={"category_name": "Lương", "amount": 900 + i, "date": day})
+        assert res.status_code == 200, res.text
+        expected.add(("income", res.json()["income_id"]))
+        for category in ("Ăn uống", "Đi lại"):
+            res = client.post(f"/expense/?user_id={user_id}", json={"category_name": category, "amount": 100 + i, "date": day})
+            assert res.status_code == 200, res.text
+            expected.add(("expense", res.json()["expense_id"]))
+    return expected
+
+
+def _walk(client, user_id, limit, **params):
+    rows, cursor = [], None
+    while True:
+        params["limit"] = limit
+        if cursor:
+            params["cursor"] = cursor
+        res = client.get(f"/transactions/{user_id}", params=params)
+        assert res.status_code == 200, res.text
+        rows.extend(res.json())
+        cursor = res.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return rows
+
+
+def test_transactions_merge_incomes_and_expenses(client, user_id):
+    expected = _seed(client, user_id)
+    for limit in (1, 2, 4, 100):
+        rows = _walk(client, user_id, limit)
+        keys = [(r["type"], r["id"]) for r in rows]
+        assert len(keys) == len(set(keys)) and set(keys) == expected, limit
+        # Mới nhất trước; cùng ngày thì thứ tự (loại, id) giảm dần như cursor
+        order = [(r["date"], r["type"], r["id"]) for r in rows]
+        assert order == sorted(order, reverse=True), limit
+
+
+def test_transactions_type_filter(client, user_id):
+    expected = _seed(client, user_id)
+    rows = _walk(client, user_id, 4, type="expense")
+    assert {(r["type"], r["id"]) for r in rows} == {k for k in expected if k[0] == "expense"}
+    rows = _walk(client, user_id, 4, type="income", start="2024-05-03")
+    assert [r["amount"] for r in rows] == [905, 904, 903, 902]
@@ -0,0 +1,16 @@
+def _register(client, username, email):
+    return client.post("/users/register", json={
+        "username": username, "email": email, "password": "abc123", "confirm_password": "abc123",
+    })
+
+
+def test_duplicate_username_and_email_are_reported_separately(client):
+    assert _register(client, "dupuser", "dup1@example.com").status_code == 200
+
+    res = _register(client, "dupuser", "dup2@example.com")
+    assert res.status_code == 400
+    assert "Username" in res.json()["detail"]
+
+    res = _register(client, "dupuser2", "dup1@example.com")
+    assert res.status_code == 400
+    assert "Email" in res.json()["detail"]
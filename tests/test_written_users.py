@@ -0,0 +1,28 @@
+import pytest
+
+from database import SessionLocal, user_write_listeners
+from models import User
+
+
+@pytest.fixture
+def notified():
+    calls = []
+    user_write_listeners.append(calls.append)
+    yield calls
+    user_write_listeners.remove(calls.append)
+
+
+@pytest.mark.parametrize("savepoint_fails", [False, True])
+def test_written_users_are_notified_only_after_outer_commit(user_id, notified, savepoint_fails):
+    with SessionLocal() as db:
+        db.get(User, user_id).email = f"changed{user_id}@example.com"
+        db.flush()
+        try:
+            with db.begin_nested():
+                if savepoint_fails:
+                    raise ValueError
+        except ValueError:
+            pass
+        assert notified == []
+        db.commit()
+    assert notified == [user_id]
@@ -0,0 +1,37 @@
+from sqlalchemy import text
+
+import migrations
+from database import engine
+
+
+def _post(client, path, payload):
+    res = client.post(path, json=payload)
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def test_forget_year_clears_derived_data_and_bumps_version(client, user_id):
+    _post(client, f"/incomes/?user_id={user_id}", {"category_name": "Lương", "amount": 500, "date": "2023-05-02"})
+    expense = _post(client, f"/expense/?user_id={user_id}", {"category_name": "Ăn uống", "amount": 80, "date": "2023-05-03"})
+    _post(client, f"/expense/?user_id={user_id}", {"category_name": "Ăn uống", "amount": 30, "date": "2024-01-03"})
+    _post(client, f"/budgets1/?user_id={user_id}", {"category_id": expense["category_id"], "month": "2023-05", "amount": 100})
+    client.post(f"/summaries/?user_id={user_id}&year=2023&month=5")
+    etag = client.get(f"/reports/{user_id}/aggregate", params={"bucket": "year", "type": "expense"}).headers["etag"]
+
+    # Giống DROP PARTITION p2023 của expenses: dữ liệu gốc biến mất, sau đó dọn phần dẫn xuất
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM expenses WHERE user_id = :u AND date < '2024-01-01'"), {"u": user_id})
+        migrations._forget_year(conn, "expenses", 2023, {user_id})
+
+    res = client.get(f"/reports/{user_id}/aggregate", params={"bucket": "year", "type": "expense"},
+                     headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert [(r["bucket"][:4], r["total"]) for r in res.json()] == [("2024", 30)]
+
+    summary = client.get(f"/summaries/{user_id}/2023/5").json()[0]
+    assert (summary["total_income"], summary["total_expense"], summary["balance"]) == (500, 0, 500)
+    budgets = client.get(f"/budgets/{user_id}/2023-05").json()["data"]
+    assert [b["expense"] for b in budgets] == [0]
+    with engine.connect() as conn:
+        spent = conn.execute(text("SELECT spent FROM budget WHERE user_id = :u"), {"u": user_id}).scalar()
+    assert spent == 0
@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import crud
+
+# Xuất giao dịch dạng luồng: đọc bằng server-side cursor (stream + yield_per) và ghi ra từng khối nhỏ,
+# bộ nhớ không phụ thuộc số dòng
+EXPORT_YIELD_PER = 1000
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+def _format_rows(fmt: str, rows):
+    if fmt == "ndjson":
+        return "".join(json.dumps(dict(zip(crud.EXPORT_COLUMNS, row)), ensure_ascii=False, default=float) + "\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+# Phiên DB được mở trong generator (không dùng phiên của dependency) vì body được gửi sau khi route đã trả về
+async def stream_transactions(session_factory: async_sessionmaker, fmt: str, user_id: int,
+                              start=None, end=None, type_=None):
+    if fmt == "csv":
+        yield "\ufeff" + _format_rows(fmt, [crud.EXPORT_COLUMNS])     # BOM để Excel đọc đúng tiếng Việt
+    async with session_factory() as db:
+        for type_name, stmt in crud.export_statements(user_id, start, end, type_):
+            result = await db.stream(stmt.execution_options(yield_per=EXPORT_YIELD_PER))
+            async for partition in result.partitions():
+                rows = [
+                    (type_name, id_, day.isoformat(), category_name, amount, note)
+                    for id_, day, category_name, amount, note in partition
+                ]
+                yield _format_rows(fmt, rows)
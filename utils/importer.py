@@ -0,0 +1,179 @@
+import csv
+import hashlib
+import io
+import re
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+# Đọc sao kê ngân hàng (CSV/OFX) dạng luồng: file được đọc dần từng dòng/khối,
+# mỗi giao dịch trả về một StatementRow (dòng lỗi có error khác None)
+StatementRow = namedtuple("StatementRow", "line type date amount category_name note import_hash error")
+
+IMPORT_FORMATS = ("csv", "ofx")
+IMPORT_DEFAULT_CATEGORY = "Sao kê ngân hàng"
+OFX_CHUNK_SIZE = 64 * 1024
+
+# Tên cột được chấp nhận trong dòng tiêu đề CSV (không phân biệt hoa thường)
+CSV_COLUMNS = {
+    "date": ("date", "ngày", "ngay", "ngày giao dịch", "transaction date", "posted date"),
+    "amount": ("amount", "số tiền", "so tien", "số tiền (vnd)"),
+    "type": ("type", "loại", "loai"),
+    "category": ("category", "category_name", "danh mục", "danh muc"),
+    "note": ("note", "description", "memo", "mô tả", "ghi chú", "nội dung"),
+}
+OFX_DATE_RE = re.compile(r"\d{8}")
+DATE_SEPARATORS_RE = re.compile(r"[-/.]")
+AMOUNT_JUNK_RE = re.compile(r"[^\d,.\-+]")
+AMOUNT_SEPARATORS_RE = re.compile(r"[,.]")
+INCOME_WORDS = {"income", "thu", "thu nhập", "credit", "cr", "có"}
+EXPENSE_WORDS = {"expense", "chi", "chi tiêu", "debit", "dr", "nợ"}
+
+
+def detect_format(filename: str):
+    ext = (filename or "").rsplit(".", 1)[-1].lower()
+    return ext if ext in IMPORT_FORMATS else None
+
+
+def _parse_date(value: str) -> date:
+    value = value.strip()
+    try:
+        if OFX_DATE_RE.match(value):                # OFX: YYYYMMDD[HHMMSS[.XXX][TZ]]
+            return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+        parts = DATE_SEPARATORS_RE.split(value[:10])
+        if len(parts) == 3:
+            if len(parts[0]) == 4:                  # YYYY-MM-DD, YYYY/MM/DD
+                return date(int(parts[0]), int(parts[1]), int(parts[2]))
+            if len(parts[2]) == 4:                  # DD/MM/YYYY, DD-MM-YYYY
+                return date(int(parts[2]), int(parts[1]), int(parts[0]))
+    except ValueError:
+        pass
+    raise ValueError(f"Ngày không hợp lệ: {value!r}")
+
+
+# Hỗ trợ "1,234.56", "1.234.567", "-50000", "1 234,5 ₫": nếu có cả hai loại dấu thì dấu sau cùng là dấu thập phân;
+# nếu chỉ có một dấu duy nhất thì là dấu thập phân trừ khi theo sau đúng 3 chữ số (kiểu "50.000" VND)
+def _parse_amount(value: str) -> Decimal:
+    value = AMOUNT_JUNK_RE.sub("", value)
+    separators = [c for c in value if c in ",."]
+    last = max(value.rfind(","), value.rfind("."))
+    if separators and (len(set(separators)) == 2 or (len(separators) == 1 and len(value) - last - 1 != 3)):
+        value = AMOUNT_SEPARATORS_RE.sub("", value[:last]) + "." + value[last + 1:]
+    else:
+        value = AMOUNT_SEPARATORS_RE.sub("", value)
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"Số tiền không hợp lệ: {value!r}")
+
+
+def _row_type(type_value: str, amount: Decimal):
+    type_value = (type_value or "").strip().lower()
+    if type_value in INCOME_WORDS:
+        return "income"
+    if type_value in EXPENSE_WORDS:
+        return "expense"
+    if type_value:
+        raise ValueError(f"Loại giao dịch không hợp lệ: {type_value!r}")
+    return "expense" if amount < 0 else "income"
+
+
+# Mã băm nội dung dòng: nhập lại cùng một sao kê (hoặc sao kê chồng lấn) sẽ bỏ qua các dòng đã có
+def _import_hash(*parts) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+# seen: mã băm nội dung -> số lần đã gặp trong file. Các dòng giống hệt nhau (vd hai ly cà phê cùng giá
+# trong ngày) là các giao dịch khác nhau: lần gặp thứ n > 0 thêm n vào mã băm, lần đầu giữ mã băm nội dung
+# nên nhập lại cùng file (hoặc các dòng đã nhập trước khi có số thứ tự) vẫn được bỏ qua
+def _build_row(seen, line, type_value, date_value, amount_value, category, note, ref=""):
+    try:
+        amount = _parse_amount(amount_value)
+        type_ = _row_type(type_value, amount)
+        day = _parse_date(date_value)
+    except ValueError as e:
+        return StatementRow(line, None, None, None, None, None, None, str(e))
+    amount = abs(amount)
+    category = (category or "").strip() or IMPORT_DEFAULT_CATEGORY
+    note = (note or "").strip() or None
+    import_hash = _import_hash(type_, day.isoformat(), amount, category.casefold(), note or "", ref)
+    occurrence = seen.get(import_hash, 0)
+    seen[import_hash] = occurrence + 1
+    if occurrence:
+        import_hash = _import_hash(import_hash, occurrence)
+    return StatementRow(line, type_, day, amount, category, note, import_hash, None)
+
+
+def parse_csv(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        first_line = text.readline()
+        if not first_line.strip():
+            return
+        dialect = csv.Sniffer().sniff(first_line, delimiters=",;\t")
+        header = [h.strip().lower() for h in next(csv.reader([first_line], dialect))]
+        columns = {}
+        for key, names in CSV_COLUMNS.items():
+            for index, name in enumerate(header):
+                if name in names:
+                    columns[key] = index
+                    break
+        if "date" not in columns or "amount" not in columns:
+            yield StatementRow(1, None, None, None, None, None, None,
+                               "Thiếu cột ngày (date) hoặc số tiền (amount) trong dòng tiêu đề.")
+            return
+
+        def get(row, key):
+            index = columns.get(key)
+            return row[index] if index is not None and index < len(row) else ""
+
+        seen = {}
+        for line, row in enumerate(csv.reader(text, dialect), start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            yield _build_row(seen, line, get(row, "type"), get(row, "date"), get(row, "amount"),
+                             get(row, "category"), get(row, "note"))
+    finally:
+        text.detach()       # không đóng file upload gốc
+
+
+# OFX 1.x (SGML) thường không đóng thẻ lá nên tách theo "<" thay vì dùng XML parser
+def _ofx_tokens(text):
+    buffer = ""
+    while True:
+        chunk = text.read(OFX_CHUNK_SIZE)
+        if not chunk:
+            break
+        parts = (buffer + chunk).split("<")
+        buffer = parts.pop()
+        for part in parts:
+            yield part
+    yield buffer
+
+
+def parse_ofx(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+    try:
+        fields, index, seen = None, 0, {}
+        for token in chain(_ofx_tokens(text), ["/STMTTRN>"]):
+            tag, sep, value = token.partition(">")
+            if not sep:
+                continue
+            tag = tag.strip().upper()
+            if tag == "STMTTRN":
+                fields = {}
+            elif tag == "/STMTTRN" and fields is not None:
+                index += 1
+                name, memo = fields.get("NAME", ""), fields.get("MEMO", "")
+                yield _build_row(seen, index, "", fields.get("DTPOSTED", ""), fields.get("TRNAMT", ""),
+                                 name, memo or name, fields.get("FITID", ""))
+                fields = None
+            elif fields is not None and not tag.startswith("/"):
+                fields[tag] = value.strip()
+    finally:
+        text.detach()
+
+
+def parse_statement(stream, fmt: str):
+    return parse_ofx(stream) if fmt == "ofx" else parse_csv(stream)